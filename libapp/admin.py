@@ -1,11 +1,17 @@
+from collections import defaultdict
+
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.admin import ModelAdmin
 from django.utils import timezone
-from .models import Book, CustomUser, Payment, Fine, Librarian
+from .models import Book, CustomUser, Payment, Fine, Librarian, Loan, MobileNotification
+from .cache_service import bump_model_version
+from .response_cache import invalidate_catalog, invalidate_user
 
 # Custom admin site configuration
 class LibraryAdminSite(admin.AdminSite):
@@ -59,6 +65,7 @@ class FineAdmin(admin.ModelAdmin):
     readonly_fields = ('created_date',)
     actions = ['mark_as_paid', 'mark_as_pending', 'mark_as_cancelled']
     list_per_page = 25
+    list_select_related = ('user',)
     change_list_template = 'admin/fine_stats.html'
     
     def status_badge(self, obj):
@@ -72,7 +79,7 @@ class FineAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     
     def user_link(self, obj):
-        url = reverse('admin:libapp_customuser_change', args=[obj.user.id])
+        url = reverse('admin:libapp_customuser_change', args=[obj.user_id])
         return format_html('<a href="{}" target="_blank">View User</a>', url)
     user_link.short_description = 'User Profile'
     
@@ -99,26 +106,63 @@ class FineAdmin(admin.ModelAdmin):
         except (AttributeError, KeyError):
             qs = self.get_queryset(request)
         
-        # Calculate statistics
-        total_fines = qs.aggregate(total=Sum('amount'))['total'] or 0
-        pending_fines = qs.filter(status='pending').aggregate(total=Sum('amount'))['total'] or 0
-        paid_fines = qs.filter(status='paid').aggregate(total=Sum('amount'))['total'] or 0
-        cancelled_fines = qs.filter(status='cancelled').aggregate(total=Sum('amount'))['total'] or 0
-        
-        fine_stats = {
-            'total_fines': total_fines,
-            'pending_fines': pending_fines,
-            'paid_fines': paid_fines,
-            'cancelled_fines': cancelled_fines,
-            'total_count': qs.count(),
-            'pending_count': qs.filter(status='pending').count(),
-            'paid_count': qs.filter(status='paid').count(),
-            'cancelled_count': qs.filter(status='cancelled').count(),
-        }
+        # One conditional aggregate instead of a query per statistic
+        zero = Value(0, output_field=DecimalField(max_digits=10, decimal_places=2))
+        fine_stats = qs.order_by().aggregate(
+            total_fines=Coalesce(Sum('amount'), zero),
+            pending_fines=Coalesce(Sum('amount', filter=Q(status='pending')), zero),
+            paid_fines=Coalesce(Sum('amount', filter=Q(status='paid')), zero),
+            cancelled_fines=Coalesce(Sum('amount', filter=Q(status='cancelled')), zero),
+            total_count=Count('id'),
+            pending_count=Count('id', filter=Q(status='pending')),
+            paid_count=Count('id', filter=Q(status='paid')),
+            cancelled_count=Count('id', filter=Q(status='cancelled')),
+        )
         
         response.context_data['fine_stats'] = fine_stats
         return response
 
+BULK_BATCH_SIZE = 500
+
+
+def _selected_books(queryset):
+    """Selected books keyed by pk; copies that share a title stay separate"""
+    return {book.pk: book for book in queryset.only('id', 'title', 'quantity').order_by('pk')}
+
+
+def _active_loans(books):
+    """One query for the open loans of these books, grouped as {user_id: [loan, ...]}"""
+    loans = defaultdict(list)
+    for loan in Loan.objects.filter(returned_at__isnull=True, book_id__in=list(books)).order_by('pk'):
+        loans[loan.user_id].append(loan)
+    return loans
+
+
+def _drop_entries(user, loans):
+    """Remove the JSON entries of these loans; a Loan row is identified by (title, start_date)"""
+    keys = {(loan.title, loan.start_date) for loan in loans}
+    user.books = [
+        entry for entry in user.books
+        if (str(entry.get('title', ''))[:100], Loan.parse_date(entry.get('start_date'))) not in keys
+    ]
+
+
+def _close_loans(users, fields, loans, now):
+    """Write back the users' edited JSON lists and close the matching Loan rows"""
+    CustomUser.objects.bulk_update(users, fields, batch_size=BULK_BATCH_SIZE)
+    Loan.objects.filter(pk__in=[loan.pk for user_loans in loans.values() for loan in user_loans]).update(returned_at=now)
+    for user in users:
+        invalidate_user(user.pk)
+    _refresh_caches(CustomUser)
+
+
+def _refresh_caches(*models):
+    """Bulk writes skip model signals; retire the cached pages and fragments they would have"""
+    invalidate_catalog()
+    for model in models:
+        bump_model_version(model)
+
+
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'quantity', 'department', 'lost_books_count')
     list_filter = ('department', 'author')
@@ -127,87 +171,87 @@ class BookAdmin(admin.ModelAdmin):
     list_per_page = 25
     actions = ['mark_as_lost', 'mark_as_available', 'return_book_action']
     
+    @transaction.atomic
     def mark_as_lost(self, request, queryset):
-        for book in queryset:
-            # Create a fine for the lost book if there are users with this book
-            users_with_book = CustomUser.objects.filter(books__contains=[{'title': book.title}])
-            for user in users_with_book:
-                fine = Fine.objects.create(
+        books = _selected_books(queryset)
+        loans = _active_loans(books)
+        now = timezone.now()
+        
+        users = list(CustomUser.objects.filter(pk__in=loans).only('id', 'books', 'notifications'))
+        fines = []
+        for user in users:
+            # Create a fine for each lost copy the user had and drop it from their books list
+            _drop_entries(user, loans[user.pk])
+            if not isinstance(user.notifications, list):
+                user.notifications = []
+            for loan in loans[user.pk]:
+                fines.append(Fine(
                     user=user,
-                    book_title=book.title,
+                    book_title=loan.title,
+                    book_id=loan.book_id,
                     amount=50.00,  # Default to ₹50
-                    due_date=timezone.now(),
+                    due_date=now,
                     days_overdue=0,
                     status='pending'
-                )
-                
-                # Update user's books list
-                updated_books = []
-                for b in user.books:
-                    if b.get('title') != book.title:
-                        updated_books.append(b)
-                user.books = updated_books
-                user.save()
-                
-                # Add notification
-                if not isinstance(user.notifications, list):
-                    user.notifications = []
+                ))
                 user.notifications.append({
-                    'message': f'Book "{book.title}" has been marked as lost. A fine of ₹50.00 has been added.',
-                    'date': timezone.now().isoformat(),
+                    'message': f'Book "{loan.title}" has been marked as lost. A fine of ₹50.00 has been added.',
+                    'date': now.isoformat(),
                     'read': False
                 })
-                user.save()
+        
+        Fine.objects.bulk_create(fines, batch_size=BULK_BATCH_SIZE)
+        _close_loans(users, ['books', 'notifications'], loans, now)
         
         # Update book quantity to 0
         updated = queryset.update(quantity=0)
+        _refresh_caches(Book, Fine)
         self.message_user(request, f'{updated} books marked as lost and fines created.')
     mark_as_lost.short_description = "Mark selected books as lost"
     
+    @transaction.atomic
     def mark_as_available(self, request, queryset):
         # Reset quantity to 1 if it was 0
-        for book in queryset:
-            if book.quantity == 0:
-                book.quantity = 1
-                book.save()
+        queryset.filter(quantity=0).update(quantity=1)
+        _refresh_caches(Book)
         self.message_user(request, f'{queryset.count()} books marked as available.')
     mark_as_available.short_description = "Mark selected books as available"
     
+    @transaction.atomic
     def return_book_action(self, request, queryset):
         """Return selected books from users who have borrowed them"""
-        returned_count = 0
+        books = _selected_books(queryset.select_for_update())
+        loans = _active_loans(books)
+        now = timezone.now()
         
-        for book in queryset:
-            # Find users who have this book
-            users_with_book = CustomUser.objects.filter(books__contains=[{'title': book.title}])
-            
-            for user in users_with_book:
-                # Remove the book from user's books list
-                updated_books = []
-                for b in user.books:
-                    if b.get('title') != book.title:
-                        updated_books.append(b)
-                
-                if len(updated_books) < len(user.books):
-                    user.books = updated_books
-                    user.save()
-                    
-                    # Increase book quantity
-                    book.quantity += 1
-                    book.save()
-                    
-                    returned_count += 1
-                    
-                    # Create mobile notification
-                    notification = MobileNotification.objects.create(
-                        user=user,
-                        notification_type='BOOK_RETURNED',
-                        title=f'Book Returned: {book.title}',
-                        message=f'Your book "{book.title}" has been returned by the librarian.',
-                        book_title=book.title,
-                        book_id=book.id
-                    )
+        users = list(CustomUser.objects.filter(pk__in=loans).only('id', 'books'))
+        notifications = []
+        restocked = {}
+        for user in users:
+            _drop_entries(user, loans[user.pk])
+            for loan in loans[user.pk]:
+                # Increase book quantity, once per returned copy
+                book = restocked[loan.book_id] = books[loan.book_id]
+                book.quantity += 1
+                notifications.append(MobileNotification(
+                    user=user,
+                    notification_type='BOOK_RETURNED',
+                    title=f'Book Returned: {loan.title}',
+                    message=f'Your book "{loan.title}" has been returned by the librarian.',
+                    book_title=loan.title,
+                    book_id=book.id,
+                    # bulk_create skips MobileNotification.save(), which normally fills these
+                    expires_at=now + timezone.timedelta(hours=24),
+                ))
+        
+        for notification, bima_id in zip(notifications, MobileNotification.generate_bima_ids(len(notifications))):
+            notification.bima_id = bima_id
+        MobileNotification.objects.bulk_create(notifications, batch_size=BULK_BATCH_SIZE)
+        _close_loans(users, ['books'], loans, now)
+        Book.objects.bulk_update(restocked.values(), ['quantity'], batch_size=BULK_BATCH_SIZE)
+        _refresh_caches(Book)
         
+        returned_count = len(notifications)
         if returned_count > 0:
             self.message_user(request, f'Successfully returned {returned_count} books from users.')
         else:
@@ -215,15 +259,24 @@ class BookAdmin(admin.ModelAdmin):
     return_book_action.short_description = "Return selected books from users"
     
     def lost_books_count(self, obj):
-        lost_count = Fine.objects.filter(book_title=obj.title, status='pending').count()
+        lost_count = obj.lost_count
         if lost_count > 0:
             return format_html('<span style="color: #dc3545;">{} lost</span>', lost_count)
         return '0'
     lost_books_count.short_description = 'Lost Reports'
+    lost_books_count.admin_order_field = 'lost_count'
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs
+        # Fines reference books by title, so count them with a correlated subquery
+        lost_reports = (
+            Fine.objects.filter(book_title=OuterRef('title'), status='pending')
+            .order_by()
+            .values('book_title')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return qs.annotate(lost_count=Coalesce(Subquery(lost_reports, output_field=IntegerField()), 0))
 
 class CustomUserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_active', 'books_count', 'fines_count', 'total_fines')
@@ -236,16 +289,26 @@ class CustomUserAdmin(admin.ModelAdmin):
         return len(obj.books) if obj.books else 0
     books_count.short_description = 'Books Borrowed'
     
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        pending = Q(fines__status='pending')
+        return qs.annotate(
+            pending_fines_count=Count('fines', filter=pending),
+            pending_fines_total=Sum('fines__amount', filter=pending),
+        )
+    
     def fines_count(self, obj):
-        return obj.fines.filter(status='pending').count()
+        return obj.pending_fines_count
     fines_count.short_description = 'Pending Fines'
+    fines_count.admin_order_field = 'pending_fines_count'
     
     def total_fines(self, obj):
-        total = sum(fine.amount for fine in obj.fines.filter(status='pending'))
+        total = obj.pending_fines_total or 0
         if total > 0:
             return format_html('<span style="color: #dc3545;">₹{}</span>', total)
         return '₹0'
     total_fines.short_description = 'Total Pending Fines'
+    total_fines.admin_order_field = 'pending_fines_total'
 
 # Register models with the default admin site
 admin.site.register(Book, BookAdmin)
@@ -9,12 +9,14 @@ from datetime import timedelta
 from decimal import Decimal
 import json
 from .models import Book, CustomUser, Fine, Payment, MobileNotification
+from .db_router import read_replica
 
 
 class LibraryAnalytics:
     """Advanced analytics for library management"""
     
     @staticmethod
+    @read_replica
     def get_borrowing_trends():
         """Analyze borrowing trends and patterns"""
         users_with_books = CustomUser.objects.filter(books__isnull=False)
@@ -40,6 +42,7 @@ class LibraryAnalytics:
         }
     
     @staticmethod
+    @read_replica
     def get_overdue_analysis():
         """Analyze overdue books and fines"""
         current_date = timezone.now().date()
@@ -75,6 +78,7 @@ class LibraryAnalytics:
         }
     
     @staticmethod
+    @read_replica
     def get_library_health_score():
         """Calculate overall library health score"""
         total_books = Book.objects.count()
@@ -230,6 +234,7 @@ class UserBehaviorAnalyzer:
     """Analyze user behavior patterns"""
     
     @staticmethod
+    @read_replica
     def get_user_reading_patterns(user):
         """Analyze user's reading patterns"""
         if not hasattr(user, 'books') or not user.books:
@@ -294,6 +299,7 @@ class UserBehaviorAnalyzer:
         }
     
     @staticmethod
+    @read_replica
     def get_reading_leaderboard():
         """Get reading leaderboard of most active users"""
         users_with_books = CustomUser.objects.filter(books__isnull=False)
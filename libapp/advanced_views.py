@@ -8,15 +8,19 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
 from django.http import JsonResponse
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 from .advanced_tools import (
     LibraryAnalytics, SmartRecommendations, NotificationManager,
     BookInventoryManager, UserBehaviorAnalyzer, AdvancedSearch
 )
-from .models import Book, CustomUser, Fine, MobileNotification
+from .models import Book, CustomUser, Fine, Loan, MobileNotification
+from .db_router import read_replica
 
 
 @login_required
+@read_replica
 def analytics_dashboard(request):
     """Advanced analytics dashboard for librarians"""
     if not request.user.is_librarian:
@@ -75,6 +79,7 @@ def inventory_management(request):
 
 
 @login_required
+@read_replica
 def user_behavior_analysis(request):
     """User behavior analysis and insights"""
     user_patterns = UserBehaviorAnalyzer.get_user_reading_patterns(request.user)
@@ -188,18 +193,18 @@ def reading_insights(request):
 
 
 @login_required
+@read_replica
 def book_analytics(request, book_id):
     """Detailed analytics for a specific book"""
     book = get_object_or_404(Book, id=book_id)
     
-    # Find users who have borrowed this book
-    users_with_book = CustomUser.objects.filter(
-        books__contains=[{'title': book.title}]
+    # Calculate book popularity metrics from the loan index (loans reference books by title)
+    loan_stats = Loan.objects.filter(title=book.title).aggregate(
+        total_borrows=Count('id'),
+        current_borrowers=Count('user', filter=Q(returned_at__isnull=True), distinct=True),
     )
-    
-    # Calculate book popularity metrics
-    total_borrows = users_with_book.count()
-    current_borrowers = users_with_book.count()
+    total_borrows = loan_stats['total_borrows']
+    current_borrowers = loan_stats['current_borrowers']
     
     # Get similar books
     similar_books = AdvancedSearch.get_similar_books(book_id)
@@ -216,6 +221,7 @@ def book_analytics(request, book_id):
 
 
 @login_required
+@read_replica
 def export_user_data(request):
     """Export user's reading data as JSON"""
     user_data = {
@@ -249,18 +255,25 @@ def bulk_operations(request):
         
         elif operation == 'update_inventory':
             # Update inventory based on current borrowing status
-            updated_count = 0
-            for book in Book.objects.all():
-                # Count how many users currently have this book
-                current_borrowers = CustomUser.objects.filter(
-                    books__contains=[{'title': book.title}]
-                ).count()
+            with transaction.atomic():
+                # Count how many users currently have each book, in one grouped query
+                borrowers = dict(
+                    Loan.objects.filter(returned_at__isnull=True)
+                    .values('title')
+                    .annotate(count=Count('user', distinct=True))
+                    .values_list('title', 'count')
+                )
                 
                 # Update quantity if needed
-                if book.quantity != current_borrowers:
-                    book.quantity = max(0, book.quantity - current_borrowers)
-                    book.save()
-                    updated_count += 1
+                changed = []
+                for book in Book.objects.only('id', 'title', 'quantity'):
+                    current_borrowers = borrowers.get(book.title, 0)
+                    if book.quantity != current_borrowers:
+                        book.quantity = max(0, book.quantity - current_borrowers)
+                        changed.append(book)
+                # Book's queryset retires the cached catalog pages and version counters itself
+                Book.objects.bulk_update(changed, ['quantity'], batch_size=500)
+                updated_count = len(changed)
             
             messages.success(request, f'{updated_count} books inventory updated.')
     
@@ -0,0 +1,463 @@
+"""
+API Views for ReadOps Library Management System
+Versioned read-only JSON API for mobile and kiosk clients: sparse fieldsets,
+cursor pagination, gzip and strong ETags derived from model version counters
+and the database state they stand for, plus a change feed for keeping a local copy of the catalog in sync.
+"""
+
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+import re
+
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+
+from .cache_service import model_version
+from .fragment_cache import cached_value
+from .models import Book, CatalogChange, CustomUser, DigitalBook, Loan
+from .response_cache import normalize_query
+
+API_VERSION = 'v1'
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+# Journal entries read per change-feed page
+CHANGES_PAGE_SIZE = 500
+# How long PostgreSQL journal entries are held back from the feed; covers catalog write transactions up to this long
+CHANGES_SETTLE_SECONDS = 5
+# Bodies shorter than this are not worth compressing
+GZIP_MIN_LENGTH = 200
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Resource:
+    """
+    How a model is exposed: the public field names (model fields or the
+    keys of `annotations`), the fields sent when ?fields= is absent, the
+    models whose version counters decide the ETag, a `state` function that
+    reads the same facts from the database for a queryset, and file fields
+    that are turned into URLs.
+    """
+
+    def __init__(self, name, fields, default_fields, depends, state, annotations=None, file_fields=()):
+        self.name = name
+        self.fields = tuple(fields)
+        self.default_fields = tuple(default_fields)
+        self.depends = tuple(depends)
+        self.state = state
+        self.annotations = annotations or {}
+        self.file_fields = tuple(file_fields)
+
+    def requested_fields(self, request):
+        """Parse ?fields=a,b into a validated tuple that always includes id"""
+        raw = request.GET.get('fields')
+        if not raw:
+            return self.default_fields
+        fields = [field.strip() for field in raw.split(',') if field.strip()]
+        unknown = sorted(set(fields) - set(self.fields))
+        if unknown:
+            raise ApiError(f'Unknown fields for {self.name}: {", ".join(unknown)}. Available: {", ".join(self.fields)}')
+        return ('id', *dict.fromkeys(field for field in fields if field != 'id'))
+
+    def rows(self, queryset, fields):
+        """Serialize through values(); only the annotations the client asked for are computed"""
+        annotations = {name: self.annotations[name]() for name in fields if name in self.annotations}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        rows = list(queryset.values(*fields))
+        for field in self.file_fields:
+            if field in fields:
+                for row in rows:
+                    row[field] = default_storage.url(row[field]) if row[field] else None
+        return rows
+
+
+def _active_loan_count():
+    return Count('loan', filter=Q(loan__returned_at__isnull=True))
+
+
+def _available():
+    return ExpressionWrapper(Q(quantity__gt=0), output_field=BooleanField())
+
+
+def _overdue():
+    # Compared with the start of today so a payload, and its ETag, stay valid for the whole day
+    today = timezone.localdate()
+    start_of_today = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
+    return ExpressionWrapper(Q(returned_at__isnull=True, end_date__lt=start_of_today), output_field=BooleanField())
+
+
+def _journal_mark(changes):
+    """
+    High-water mark of the catalog journal, read from the primary key index.
+    Every book and digital book write, bulk ones included, adds a row,
+    whichever process made it.
+    """
+    return f'journal={changes.aggregate(last=Max("pk"))["last"]}'
+
+
+def _journal_state(queryset):
+    return (_journal_mark(CatalogChange.objects.all()),)
+
+
+def _availability_state(queryset):
+    # Lending and returning also write the book's quantity, so the journal covers on_loan too
+    return (*_journal_state(queryset), f'loans={Loan.objects.aggregate(last=Max("pk"))["last"]}')
+
+
+def _user_loans_state(queryset):
+    # A user has few loans; their due and return dates are the whole state
+    rows = queryset.order_by('pk').values_list('pk', 'end_date', 'returned_at')
+    return (hashlib.sha1(repr(list(rows)).encode()).hexdigest(),)
+
+
+BOOKS = Resource(
+    'books',
+    fields=('id', 'title', 'author', 'description', 'subject', 'department', 'quantity', 'image', 'updated_at'),
+    default_fields=('id', 'title', 'author', 'subject', 'department', 'quantity'),
+    depends=(Book,),
+    state=_journal_state,
+    file_fields=('image',),
+)
+
+DIGITAL_BOOKS = Resource(
+    'digital_books',
+    fields=(
+        'id', 'title', 'author', 'description', 'book_type', 'category', 'is_free',
+        'online_reading_price', 'download_price', 'cover_image', 'created_date', 'updated_date',
+    ),
+    default_fields=('id', 'title', 'author', 'book_type', 'category', 'is_free', 'online_reading_price', 'download_price'),
+    depends=(DigitalBook,),
+    state=_journal_state,
+    file_fields=('cover_image',),
+)
+
+# Loans are indexed from CustomUser.books, so every loan change bumps the CustomUser version
+AVAILABILITY = Resource(
+    'availability',
+    fields=('id', 'title', 'quantity', 'available', 'on_loan'),
+    default_fields=('id', 'quantity', 'available', 'on_loan'),
+    depends=(Book, CustomUser),
+    state=_availability_state,
+    annotations={'available': _available, 'on_loan': _active_loan_count},
+)
+
+LOANS = Resource(
+    'loans',
+    fields=('id', 'book_id', 'title', 'start_date', 'end_date', 'returned_at', 'overdue'),
+    default_fields=('id', 'book_id', 'title', 'start_date', 'end_date', 'returned_at', 'overdue'),
+    depends=(CustomUser,),
+    state=_user_loans_state,
+    annotations={'overdue': _overdue},
+)
+
+
+# Change-feed model names, with the live rows of each model and how they are serialized
+SYNCED = {
+    'book': (lambda: Book.objects.all(), BOOKS),
+    'digitalbook': (lambda: DigitalBook.objects.filter(is_active=True), DIGITAL_BOOKS),
+}
+
+
+def _error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+
+def _encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def _page_params(request, cursor_param='cursor', default_limit=API_PAGE_SIZE, max_limit=API_MAX_PAGE_SIZE):
+    """Return (after_pk, limit) from ?cursor= (or `cursor_param`) and ?limit="""
+    after = None
+    cursor = request.GET.get(cursor_param)
+    if cursor:
+        try:
+            after = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ApiError('Invalid cursor')
+    try:
+        limit = int(request.GET.get('limit', default_limit))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    return after, min(max(limit, 1), max_limit)
+
+
+def _etag(request, depends, scope=()):
+    """
+    Strong validator computed without building the payload: it is fully
+    determined by the path, the query string, the version counters of the
+    models it reads and `scope` (e.g. the user, the date and the resource's
+    database state). The counters are process-local on the locmem tier, so
+    the database state is what catches writes made by other workers and
+    management commands.
+    """
+    parts = [API_VERSION, request.path, normalize_query(request.GET), *scope]
+    parts += [f'{model._meta.label_lower}={model_version(model)}' for model in depends]
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def _wants_gzip(request):
+    return bool(ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def _matching_etag(request, etag):
+    """The client's tag that matches the current payload, in either encoding, or None"""
+    match = re.search(rf'"{etag}(?:-gzip)?"', request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return match.group(0) if match else None
+
+
+def _respond(request, etag, compute):
+    """
+    Serve `compute()` as JSON, or a 404 when it returns None. Gzip is
+    applied here rather than by GZipMiddleware, which would weaken the
+    ETag: compression is deterministic (no timestamp), and the gzip
+    representation gets its own strong tag.
+    """
+    matched = _matching_etag(request, etag)
+    if matched:
+        response = HttpResponse(status=304)
+        response['ETag'] = matched
+    else:
+        body = compute()
+        if body is None:
+            return _error(ApiError('Not found', status=404))
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = f'"{etag}"'
+        if _wants_gzip(request) and len(body) >= GZIP_MIN_LENGTH:
+            response.content = gzip.compress(body, mtime=0)
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(response.content))
+            response['ETag'] = f'"{etag}-gzip"'
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Accept-Encoding, Cookie'
+    return response
+
+
+def _list(request, resource, queryset, scope=()):
+    try:
+        fields = resource.requested_fields(request)
+        after, limit = _page_params(request)
+    except ApiError as error:
+        return _error(error)
+    scope = (*scope, *resource.state(queryset))
+
+    def compute():
+        def page():
+            rows_qs = queryset.order_by('pk')
+            if after is not None:
+                rows_qs = rows_qs.filter(pk__gt=after)
+            # One extra row tells whether another page exists without a COUNT
+            rows = resource.rows(rows_qs[:limit + 1], fields)
+            next_cursor = _encode_cursor(rows[limit - 1]['id']) if len(rows) > limit else None
+            return json.dumps(
+                {'results': rows[:limit], 'next_cursor': next_cursor},
+                cls=DjangoJSONEncoder, separators=(',', ':'),
+            ).encode()
+
+        return cached_value(
+            f'api:{API_VERSION}:{resource.name}', resource.depends, page,
+            vary=[request.path, normalize_query(request.GET), *scope],
+        )
+
+    return _respond(request, _etag(request, resource.depends, scope), compute)
+
+
+def _detail(request, resource, queryset, pk):
+    try:
+        fields = resource.requested_fields(request)
+    except ApiError as error:
+        return _error(error)
+    scope = resource.state(queryset)
+
+    def compute():
+        def row():
+            rows = resource.rows(queryset.filter(pk=pk), fields)
+            if not rows:
+                return None
+            return json.dumps(rows[0], cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+        return cached_value(
+            f'api:{API_VERSION}:{resource.name}', resource.depends, row,
+            vary=[request.path, normalize_query(request.GET), *scope],
+        )
+
+    return _respond(request, _etag(request, resource.depends, scope), compute)
+
+
+@require_safe
+def books_api(request):
+    """GET ?subject=&department=&fields=&cursor=&limit="""
+    books = Book.objects.all()
+    for name in ('subject', 'department'):
+        if request.GET.get(name):
+            books = books.filter(**{name: request.GET[name]})
+    return _list(request, BOOKS, books)
+
+
+@require_safe
+def book_detail_api(request, book_id):
+    return _detail(request, BOOKS, Book.objects.all(), book_id)
+
+
+@require_safe
+def digital_books_api(request):
+    """GET ?category=&book_type=&is_free=1|0&fields=&cursor=&limit="""
+    books = DigitalBook.objects.filter(is_active=True)
+    for name in ('category', 'book_type'):
+        if request.GET.get(name):
+            books = books.filter(**{name: request.GET[name]})
+    if request.GET.get('is_free') in ('0', '1'):
+        books = books.filter(is_free=request.GET['is_free'] == '1')
+    return _list(request, DIGITAL_BOOKS, books)
+
+
+@require_safe
+def digital_book_detail_api(request, book_id):
+    return _detail(request, DIGITAL_BOOKS, DigitalBook.objects.filter(is_active=True), book_id)
+
+
+@require_safe
+def availability_api(request):
+    """GET ?ids=1,2,3&available=1|0&fields=&cursor=&limit="""
+    books = Book.objects.all()
+    if request.GET.get('ids'):
+        try:
+            books = books.filter(pk__in=[int(pk) for pk in request.GET['ids'].split(',') if pk.strip()])
+        except ValueError:
+            return _error(ApiError('ids must be a comma-separated list of integers'))
+    if request.GET.get('available') == '1':
+        books = books.filter(quantity__gt=0)
+    elif request.GET.get('available') == '0':
+        books = books.filter(quantity=0)
+    return _list(request, AVAILABILITY, books)
+
+
+@require_safe
+def loans_api(request):
+    """GET ?status=active|returned|all&user=<id> (librarians only)&fields=&cursor=&limit="""
+    if not request.user.is_authenticated:
+        return _error(ApiError('Authentication required', status=401))
+
+    user_id = request.user.pk
+    if request.GET.get('user'):
+        if not request.user.is_librarian:
+            return _error(ApiError('Only librarians can list other users\' loans', status=403))
+        try:
+            user_id = int(request.GET['user'])
+        except ValueError:
+            return _error(ApiError('user must be an integer'))
+
+    loans = Loan.objects.filter(user_id=user_id)
+    status = request.GET.get('status', 'active')
+    if status == 'active':
+        loans = loans.filter(returned_at__isnull=True)
+    elif status == 'returned':
+        loans = loans.filter(returned_at__isnull=False)
+    elif status != 'all':
+        return _error(ApiError('status must be active, returned or all'))
+    return _list(request, LOANS, loans, scope=(f'user={user_id}', timezone.localdate().isoformat()))
+
+
+def _visible_changes():
+    """
+    Journal entries the change feed may hand out. The feed's cursor is the
+    last id a client saw, so ids must become visible in order. SQLite runs
+    one writer at a time, so they do. PostgreSQL hands out ids at insert but
+    shows rows at commit, so a lower id can appear after a client has read
+    past a higher one; entries are held back until they are
+    CATALOG_CHANGES_SETTLE_SECONDS old, which covers any catalog write
+    transaction that commits within that time.
+    """
+    changes = CatalogChange.objects.all()
+    if connections[router.db_for_read(CatalogChange)].vendor == 'postgresql':
+        settle = getattr(settings, 'CATALOG_CHANGES_SETTLE_SECONDS', CHANGES_SETTLE_SECONDS)
+        changes = changes.filter(changed_at__lte=timezone.now() - timezone.timedelta(seconds=settle))
+    return changes
+
+
+def _changes_page(journal, since, limit):
+    """
+    Collapse a page of journal entries to one change per row, carrying the
+    row's current state: rows that are gone (tombstoned, deleted or, for
+    digital books, deactivated) are deletes, rows first seen in this page
+    are inserts and the rest updates.
+    """
+    entries = list(
+        journal.filter(pk__gt=since).order_by('pk')
+        .values_list('pk', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Latest entry per row decides its place in the feed; the first decides insert vs update
+    latest = {}
+    inserted = set()
+    for pk, model, object_id, action in entries:
+        key = (model, object_id)
+        if key not in latest and action == CatalogChange.INSERT:
+            inserted.add(key)
+        latest.pop(key, None)
+        latest[key] = pk
+
+    rows = {}
+    for model, (live, resource) in SYNCED.items():
+        ids = [object_id for name, object_id in latest if name == model]
+        if ids:
+            for row in resource.rows(live().filter(pk__in=ids), resource.fields):
+                rows[(model, row['id'])] = row
+
+    changes = []
+    for key in latest:
+        model, object_id = key
+        if key not in rows:
+            changes.append({'op': CatalogChange.DELETE, 'model': model, 'id': object_id})
+        else:
+            op = CatalogChange.INSERT if key in inserted else CatalogChange.UPDATE
+            changes.append({'op': op, 'model': model, 'id': object_id, 'data': rows[key]})
+
+    cursor = entries[-1][0] if entries else since
+    return json.dumps(
+        {'changes': changes, 'cursor': _encode_cursor(cursor), 'has_more': has_more},
+        cls=DjangoJSONEncoder, separators=(',', ':'),
+    ).encode()
+
+
+@require_safe
+def catalog_changes_api(request):
+    """
+    GET ?since=<cursor>&limit=
+    Inserts, updates and deletes of books and digital books since `since`.
+    Omit `since` to receive the whole catalog; pass each reply's `cursor`
+    back to get only what changed after it, repeating while `has_more`.
+    """
+    try:
+        since, limit = _page_params(request, 'since', CHANGES_PAGE_SIZE, CHANGES_PAGE_SIZE)
+    except ApiError as error:
+        return _error(error)
+    depends = (Book, DigitalBook)
+    # One cutoff for the tag and the page, so the tag names exactly the entries served
+    journal = _visible_changes()
+    scope = (_journal_mark(journal),)
+
+    def compute():
+        return cached_value(
+            f'api:{API_VERSION}:catalog_changes', depends, lambda: _changes_page(journal, since or 0, limit),
+            vary=[normalize_query(request.GET), *scope],
+        )
+
+    return _respond(request, _etag(request, depends, scope), compute)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LibappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'libapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import sqlite_profile  # noqa: F401
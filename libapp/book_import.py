@@ -0,0 +1,266 @@
+"""
+Book Import for ReadOps Library Management System
+Streams CSV/XLSX inventory files into physical Book records in validated chunks
+"""
+
+import csv
+import hashlib
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import List, Tuple
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .catalog_loader import CatalogLoader
+from .models import Book
+
+CHUNK_SIZE = 1000
+COVER_FETCH_WORKERS = 8
+COVER_FETCH_TIMEOUT = 10
+REQUIRED_FIELDS = ('title', 'author', 'subject')
+
+# Spreadsheet headings that map onto Book fields
+HEADER_ALIASES = {
+    'book title': 'title',
+    'name': 'title',
+    'writer': 'author',
+    'qty': 'quantity',
+    'copies': 'quantity',
+    'dept': 'department',
+    'cover': 'image',
+    'cover image': 'image',
+    'cover_image': 'image',
+}
+
+
+@dataclass
+class BookImportReport:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    covers: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    ignored_columns: set = field(default_factory=set)
+
+    def as_dict(self, max_errors=200):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'covers': self.covers,
+            'error_count': len(self.errors),
+            'errors': [{'row': row, 'message': message} for row, message in self.errors[:max_errors]],
+            'ignored_columns': sorted(self.ignored_columns),
+        }
+
+    def __str__(self):
+        return (
+            f'{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, '
+            f'{self.covers} covers, {len(self.errors)} errors'
+        )
+
+
+def normalize_header(name):
+    name = (name or '').strip().lower()
+    return HEADER_ALIASES.get(name, name.replace(' ', '_'))
+
+
+def iter_csv_rows(file_obj):
+    """Yield (row_number, row) from a binary CSV stream; the header is row 1"""
+    text = io.TextIOWrapper(file_obj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = [normalize_header(name) for name in next(reader, [])]
+    for row_number, values in enumerate(reader, start=2):
+        if any(value.strip() for value in values):
+            yield row_number, dict(zip(header, values))
+
+
+def iter_xlsx_rows(file_obj):
+    """Yield (row_number, row) from the first worksheet of an XLSX file"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('XLSX import requires the openpyxl package')
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [normalize_header(str(name) if name is not None else '') for name in next(rows, ())]
+        for row_number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield row_number, {
+                    name: '' if value is None else value
+                    for name, value in zip(header, values)
+                }
+    finally:
+        workbook.close()
+
+
+def iter_book_rows(file_obj, filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(file_obj)
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(file_obj)
+    raise ValueError(f'Unsupported file type "{extension}". Upload a .csv or .xlsx file.')
+
+
+class CoverSource:
+    """
+    Resolves the image column of an import row to bytes.
+    References may be file names looked up in a local directory or a ZIP
+    archive uploaded alongside the sheet, and, when `allow_urls` is set,
+    http(s) URLs. Only the import_books command sets it: a server-side fetch
+    of any URL in an uploaded sheet could reach internal hosts.
+    """
+
+    def __init__(self, directory=None, archive=None, allow_urls=False):
+        self.directory = directory
+        self.allow_urls = allow_urls
+        self.archive = zipfile.ZipFile(archive) if archive is not None else None
+        self.archive_names = {}
+        if self.archive is not None:
+            for name in self.archive.namelist():
+                self.archive_names.setdefault(os.path.basename(name), name)
+
+    def _local_path(self, reference):
+        """The file for `reference` inside the directory, or None for absolute or '..' references"""
+        if os.path.isabs(reference) or '..' in reference.replace('\\', '/').split('/'):
+            return None
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(root, reference))
+        # Symlinks may still point elsewhere
+        return path if os.path.commonpath([root, path]) == root else None
+
+    def read(self, reference):
+        if reference.startswith(('http://', 'https://')):
+            if not self.allow_urls:
+                raise ValueError('Cover URLs are only fetched by the import_books command; upload the images in a ZIP')
+            import requests
+            response = requests.get(reference, timeout=COVER_FETCH_TIMEOUT)
+            response.raise_for_status()
+            return response.content
+        if self.archive is not None:
+            name = self.archive_names.get(os.path.basename(reference))
+            if name:
+                return self.archive.read(name)
+        if self.directory:
+            path = self._local_path(reference)
+            if path and os.path.isfile(path):
+                with open(path, 'rb') as image_file:
+                    return image_file.read()
+        raise FileNotFoundError(f'Cover image "{reference}" not found')
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _fetch_cover(job):
+    source, row_number, key, reference = job
+    try:
+        return row_number, key, reference, source.read(reference), None
+    except Exception as e:
+        return row_number, key, reference, None, str(e)
+
+
+def attach_covers(pending, source, report):
+    """
+    Side pass run after a chunk is saved: fetch the referenced images
+    concurrently, store each under a content-derived name (so re-imports
+    reuse the same file) and point the books at them with one bulk_update.
+    """
+    if not pending:
+        return
+
+    books = {}
+    titles = {title for title, author in pending}
+    for book in Book.objects.filter(title__in=titles).only('id', 'title', 'author', 'image'):
+        books[(book.title, book.author)] = book
+
+    jobs = [(source, row_number, key, reference) for key, (row_number, reference) in pending.items()]
+    changed = []
+    with ThreadPoolExecutor(max_workers=COVER_FETCH_WORKERS) as executor:
+        for row_number, key, reference, data, error in executor.map(_fetch_cover, jobs):
+            book = books.get(key)
+            if error or book is None:
+                report.errors.append((row_number, f'image: {error or "book was not saved"}'))
+                continue
+
+            digest = hashlib.sha1(data).hexdigest()[:16]
+            basename = os.path.basename(reference.split('?')[0]) or 'cover.jpg'
+            name = Book.image.field.generate_filename(book, f'{digest}_{basename}')
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            if book.image.name != name:
+                book.image.name = name
+                changed.append(book)
+            report.covers += 1
+
+    Book.objects.bulk_update(changed, ['image'], batch_size=CHUNK_SIZE)
+
+
+def import_books(rows, covers=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Import (row_number, row) pairs into Book, matching existing books on
+    (title, author). Rows are validated and written one chunk at a time so
+    memory stays flat for large files; a bad row is reported, not fatal.
+    """
+    loader = CatalogLoader(
+        Book,
+        key_fields=('title', 'author'),
+        batch_size=chunk_size,
+        required_fields=REQUIRED_FIELDS,
+    )
+    report = BookImportReport()
+    covers = covers or CoverSource()
+
+    for chunk in _chunks(rows, chunk_size):
+        first_row = chunk[0][0]
+        numbered = []
+        pending_covers = {}
+        for row_number, row in chunk:
+            row = dict(row)
+            reference = str(row.pop('image', '') or '').strip()
+            # Same default as adding a single book through save_new_book
+            if str(row.get('quantity', '')).strip() == '':
+                row['quantity'] = 1
+            numbered.append((row_number, row, reference))
+
+        # The loader numbers rows sequentially, so map its positions back to file rows
+        summary = loader.load((row for _, row, _ in numbered), start=0)
+        failed = set()
+        for position, message in summary.errors:
+            report.errors.append((numbered[position][0], message))
+            failed.add(position)
+
+        for position, (row_number, row, reference) in enumerate(numbered):
+            if reference and position not in failed:
+                key = (str(row.get('title', '')).strip(), str(row.get('author', '')).strip())
+                pending_covers[key] = (row_number, reference)
+
+        report.inserted += summary.inserted
+        report.updated += summary.updated
+        report.unchanged += summary.unchanged
+        report.ignored_columns |= summary.ignored_columns
+        attach_covers(pending_covers, covers, report)
+
+        if progress:
+            progress(first_row, report)
+
+    report.errors.sort()
+    return report
@@ -0,0 +1,175 @@
+"""
+Digital Book Indexer for ReadOps Library Management System
+Extracts per-page text from digital book PDFs and searches it through a full-text index
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, transaction
+from django.utils.html import escape
+
+from .models import DigitalBookPage
+
+FTS_TABLE = 'libapp_digitalbookpage_fts'
+SNIPPET_TOKENS = 12
+SNIPPET_CHARS = 80
+# Control-character markers survive escaping and are swapped for <mark> tags afterwards
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+def extract_pdf_pages(path):
+    """
+    Return the text of every page in a PDF, '' for pages without a text layer.
+    Does no database work; index_books stores the pages from the parent process.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [page.extract_text() or '' for page in reader.pages]
+
+
+def _extract_for_pool(job):
+    book_id, path = job
+    try:
+        return book_id, extract_pdf_pages(path), None
+    except Exception as e:
+        return book_id, None, str(e)
+
+
+def store_pages(book_id, page_texts):
+    """Replace the stored pages of a book in one transaction"""
+    with transaction.atomic():
+        DigitalBookPage.objects.filter(digital_book_id=book_id).delete()
+        DigitalBookPage.objects.bulk_create(
+            [
+                DigitalBookPage(digital_book_id=book_id, page_number=number, text=text)
+                for number, text in enumerate(page_texts, start=1)
+            ],
+            batch_size=500,
+        )
+    return len(page_texts)
+
+
+def index_book(book):
+    """Extract and store the pages of a single book in the current process"""
+    if not book.pdf_file or not os.path.exists(book.pdf_file.path):
+        return 0
+    return store_pages(book.id, extract_pdf_pages(book.pdf_file.path))
+
+
+def index_book_in_background(book):
+    """
+    Index a freshly uploaded book without blocking the request.
+    Runs after the surrounding transaction commits so the thread sees the saved file.
+    """
+    def run():
+        try:
+            index_book(book)
+        except Exception as e:
+            print(f"Error indexing {book.title}: {str(e)}")
+        finally:
+            connection.close()
+
+    transaction.on_commit(lambda: threading.Thread(target=run, daemon=True).start())
+
+
+def index_books(books, workers=None, progress=None):
+    """
+    Extract PDFs in a process pool and store their pages from the parent.
+    Returns (indexed_books, indexed_pages, errors).
+    """
+    jobs = [
+        (book.id, book.pdf_file.path)
+        for book in books
+        if book.pdf_file and os.path.exists(book.pdf_file.path)
+    ]
+    indexed_books = indexed_pages = 0
+    errors = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for book_id, page_texts, error in executor.map(_extract_for_pool, jobs):
+            if error:
+                errors.append((book_id, error))
+            else:
+                indexed_pages += store_pages(book_id, page_texts)
+                indexed_books += 1
+            if progress:
+                progress(book_id, error)
+
+    return indexed_books, indexed_pages, errors
+
+
+def fts_available():
+    """Check once per connection whether the SQLite full-text index exists"""
+    if connection.vendor != 'sqlite':
+        return False
+    available = getattr(connection, '_libapp_fts_available', None)
+    if available is None:
+        available = FTS_TABLE in connection.introspection.table_names(include_views=True)
+        connection._libapp_fts_available = available
+    return available
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def _python_snippet(text, query):
+    position = text.lower().find(query.lower())
+    if position < 0:
+        return escape(text[:SNIPPET_CHARS * 2])
+    start = max(0, position - SNIPPET_CHARS)
+    end = min(len(text), position + len(query) + SNIPPET_CHARS)
+    snippet = (
+        ('…' if start else '') + text[start:position]
+        + MATCH_START + text[position:position + len(query)] + MATCH_END
+        + text[position + len(query):end] + ('…' if end < len(text) else '')
+    )
+    return _highlight(snippet)
+
+
+def search_pages(query, books=None, limit=50):
+    """
+    Search inside digital book contents, optionally restricted to a
+    DigitalBook queryset. The queryset is applied as a subquery, so the
+    statement stays the same size however many books the catalog holds.
+    Returns page-level hits as dicts with book_id, page_number and an HTML snippet.
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+
+    # The trigram tokenizer needs at least three characters to match
+    if fts_available() and len(query) >= 3:
+        sql = f"""
+            SELECT p.digital_book_id, p.page_number,
+                   snippet({FTS_TABLE}, 0, %s, %s, '…', {SNIPPET_TOKENS})
+            FROM {FTS_TABLE} f
+            JOIN libapp_digitalbookpage p ON p.id = f.rowid
+            WHERE {FTS_TABLE} MATCH %s
+        """
+        params = [MATCH_START, MATCH_END, '"' + query.replace('"', '""') + '"']
+        if books is not None:
+            subquery, subquery_params = books.order_by().values('id').query.sql_with_params()
+            sql += f' AND p.digital_book_id IN ({subquery})'
+            params.extend(subquery_params)
+        sql += ' ORDER BY f.rank LIMIT %s'
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                {'book_id': book_id, 'page_number': page_number, 'snippet': _highlight(snippet)}
+                for book_id, page_number, snippet in cursor.fetchall()
+            ]
+
+    pages = DigitalBookPage.objects.filter(text__icontains=query)
+    if books is not None:
+        pages = pages.filter(digital_book__in=books.order_by().values('id'))
+    return [
+        {'book_id': book_id, 'page_number': page_number, 'snippet': _python_snippet(text, query)}
+        for book_id, page_number, text in pages.values_list('digital_book_id', 'page_number', 'text')[:limit]
+    ]
@@ -0,0 +1,131 @@
+"""
+Cache Service for ReadOps Library Management System
+Namespaced cache keys with versioned invalidation on top of Django's configured caches
+"""
+
+import hashlib
+import re
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+# Characters that are safe in keys for every backend (memcached is the strictest)
+SAFE_KEY_RE = re.compile(r'^[A-Za-z0-9_.:\-]{1,120}$')
+
+
+def _fresh_version():
+    """
+    Seed a namespace version from the clock. If a version key is ever
+    evicted, the replacement is still newer than every key written before,
+    so stale entries are never served again.
+    """
+    return time.time_ns() // 1000
+
+
+class CacheNamespace:
+    """
+    A group of cache entries that can be invalidated together.
+    Every key embeds the namespace's current version; bumping the version
+    orphans all existing entries, which then age out of the backend.
+    """
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, alias='default'):
+        self.name = name
+        self.timeout = timeout
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self):
+        return f'ns:{self.name}:version'
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, _fresh_version(), None)
+            version = self.cache.get(self.version_key) or _fresh_version()
+        return version
+
+    def invalidate(self):
+        """
+        Drop every entry in the namespace by moving to a new version.
+        The new version never falls behind the clock, so a later eviction
+        of the version key cannot reseed it below a version already used.
+        """
+        current = self.cache.get(self.version_key) or 0
+        version = max(current + 1, _fresh_version())
+        self.cache.set(self.version_key, version, None)
+        return version
+
+    def make_key(self, *parts, version=None):
+        raw = ':'.join(str(part) for part in parts)
+        if not SAFE_KEY_RE.match(raw):
+            raw = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        if version is None:
+            version = self.version()
+        return f'{self.name}:v{version}:{raw}'
+
+    def get(self, *parts, default=None):
+        return self.cache.get(self.make_key(*parts), default)
+
+    def set(self, *parts, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+        self.cache.set(self.make_key(*parts), value, timeout)
+
+    def add(self, *parts, value, timeout=DEFAULT_TIMEOUT):
+        """Store the value only if the key is absent; returns whether it was stored"""
+        timeout = self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+        return self.cache.add(self.make_key(*parts), value, timeout)
+
+    def delete(self, *parts):
+        self.cache.delete(self.make_key(*parts))
+
+    def incr(self, *parts, delta=1):
+        """Atomically add to a counter, creating it on first use"""
+        key = self.make_key(*parts)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            if self.cache.add(key, delta, self.timeout):
+                return delta
+            return self.cache.incr(key, delta)
+
+    def get_or_set(self, *parts, default, timeout=DEFAULT_TIMEOUT):
+        """Return the cached value, computing and storing it with `default()` on a miss"""
+        key = self.make_key(*parts)
+        value = self.cache.get(key)
+        if value is None:
+            value = default() if callable(default) else default
+            if value is not None:
+                self.cache.set(key, value, self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+        return value
+
+
+_namespaces = {}
+
+
+def get_namespace(name, timeout=DEFAULT_TIMEOUT, alias='default'):
+    """Return the shared CacheNamespace for `name`"""
+    namespace = _namespaces.get(name)
+    if namespace is None:
+        namespace = _namespaces[name] = CacheNamespace(name, timeout=timeout, alias=alias)
+    return namespace
+
+
+def model_namespace(model):
+    return get_namespace(f'model:{model._meta.label_lower}')
+
+
+def model_version(model):
+    """Current version counter for a model; changes whenever a row is saved or deleted"""
+    return model_namespace(model).version()
+
+
+def bump_model_version(model):
+    """Advance a model's version once the current transaction commits"""
+    transaction.on_commit(model_namespace(model).invalidate)
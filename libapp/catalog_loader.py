@@ -0,0 +1,240 @@
+"""
+Catalog Loader for ReadOps Library Management System
+Idempotently upserts catalog rows from JSON, JSONL or CSV files in batches
+"""
+
+import csv
+import json
+import os
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterable, List, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+from .cache_service import bump_model_version
+from .response_cache import invalidate_catalog
+
+POSITIVE_FIELDS = (models.PositiveIntegerField, models.PositiveSmallIntegerField, models.PositiveBigIntegerField)
+
+
+@dataclass
+class LoadSummary:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    ignored_columns: set = field(default_factory=set)
+
+    def add(self, other):
+        """Fold the summary of a later batch into this one"""
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.errors.extend(other.errors)
+        self.ignored_columns |= other.ignored_columns
+
+    def __str__(self):
+        return (
+            f'{self.inserted} inserted, {self.updated} updated, '
+            f'{self.unchanged} unchanged, {len(self.errors)} errors'
+        )
+
+
+def read_catalog(path) -> Iterable[Dict]:
+    """Yield catalog rows from a .json (list of objects), .jsonl or .csv file"""
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension == '.json':
+        with open(path, 'r', encoding='utf-8') as catalog_file:
+            data = json.load(catalog_file)
+        if isinstance(data, dict):
+            data = data.get('books', [])
+        yield from data
+    elif extension in ('.jsonl', '.ndjson'):
+        with open(path, 'r', encoding='utf-8') as catalog_file:
+            for line in catalog_file:
+                if line.strip():
+                    yield json.loads(line)
+    elif extension == '.csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as catalog_file:
+            yield from csv.DictReader(catalog_file)
+    else:
+        raise ValueError(f'Unsupported catalog format: {extension}')
+
+
+class CatalogLoader:
+    """
+    Upsert rows into a model, matching on a natural key such as (title, author).
+    Existing rows for the incoming keys are read up front so unchanged rows are
+    skipped and the summary can tell inserts from updates. When the key is backed by a unique
+    constraint the write is a single bulk_create(update_conflicts=True) per
+    batch; otherwise inserts and updates are written separately.
+    """
+
+    def __init__(self, model, key_fields=('title', 'author'), batch_size=1000, required_fields=()):
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.required_fields = tuple(dict.fromkeys(self.key_fields + tuple(required_fields)))
+        self.batch_size = batch_size
+        self.fields = {
+            model_field.name: model_field
+            for model_field in model._meta.concrete_fields
+            if not model_field.primary_key
+            and not model_field.is_relation
+            and not getattr(model_field, 'auto_now', False)
+            and not getattr(model_field, 'auto_now_add', False)
+        }
+        self.auto_now_fields = [
+            model_field.name for model_field in model._meta.concrete_fields
+            if getattr(model_field, 'auto_now', False)
+        ]
+        missing = [name for name in self.key_fields if name not in self.fields]
+        if missing:
+            raise ValueError(f'Unknown key fields for {model.__name__}: {", ".join(missing)}')
+
+    def has_unique_key(self):
+        key = set(self.key_fields)
+        for constraint in self.model._meta.constraints:
+            if isinstance(constraint, models.UniqueConstraint) and set(constraint.fields) == key and not constraint.condition:
+                return True
+        return any(set(fields) == key for fields in self.model._meta.unique_together)
+
+    def clean_row(self, row, summary):
+        """Convert raw values (e.g. CSV strings) to Python values for known fields"""
+        cleaned = {}
+        for name, value in row.items():
+            model_field = self.fields.get(name)
+            if model_field is None:
+                summary.ignored_columns.add(name)
+                continue
+            if value == '' and (model_field.null or model_field.has_default()) and name not in self.key_fields:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            if isinstance(model_field, models.FileField):
+                cleaned[name] = value or ''
+                continue
+            try:
+                cleaned[name] = model_field.to_python(value)
+                if cleaned[name] is not None:
+                    model_field.run_validators(cleaned[name])
+                    # SQLite reports no range for positive integer fields, so check the sign here
+                    if isinstance(model_field, POSITIVE_FIELDS) and cleaned[name] < 0:
+                        raise ValidationError('Ensure this value is greater than or equal to 0.')
+            except ValidationError as e:
+                raise ValidationError(f'{name}: {"; ".join(e.messages)}')
+        for name in self.required_fields:
+            if cleaned.get(name) in (None, ''):
+                raise ValidationError(f'Missing required field "{name}"')
+        return cleaned
+
+    def key_of(self, values):
+        return tuple(values[name] for name in self.key_fields)
+
+    def existing_rows(self, keys, field_names):
+        """Fetch current values for the given keys, filtering on the first key field in slices"""
+        lead = self.key_fields[0]
+        lead_values = sorted({key[0] for key in keys})
+        existing = {}
+        for offset in range(0, len(lead_values), self.batch_size):
+            queryset = self.model.objects.filter(
+                **{f'{lead}__in': lead_values[offset:offset + self.batch_size]}
+            ).values('pk', *field_names)
+            for values in queryset:
+                key = self.key_of(values)
+                if key in keys:
+                    existing[key] = values
+        return existing
+
+    def load_stream(self, rows, progress=None) -> LoadSummary:
+        """
+        Upsert rows from any iterable, reading and writing batch_size rows at
+        a time so memory stays flat for large .jsonl and .csv files. Each batch
+        commits on its own; a key repeated across batches is inserted by the
+        first and updated by the later one.
+        """
+        summary = LoadSummary()
+        rows = iter(rows)
+        start = 1
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return summary
+            summary.add(self.load(batch, start=start))
+            start += len(batch)
+            if progress:
+                progress(start - 1, summary)
+
+    def load(self, rows, start=1) -> LoadSummary:
+        """
+        Upsert one batch of rows. Errors are reported against row numbers
+        counted from `start`, so callers streaming a file in chunks can pass
+        the file position of the first row.
+        """
+        summary = LoadSummary()
+
+        # Later rows win when the input repeats a key
+        incoming = {}
+        for row_number, row in enumerate(rows, start=start):
+            try:
+                cleaned = self.clean_row(row, summary)
+            except (ValidationError, ValueError, TypeError) as e:
+                message = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                summary.errors.append((row_number, message))
+                continue
+            incoming[self.key_of(cleaned)] = cleaned
+
+        if not incoming:
+            return summary
+
+        field_names = list(self.fields)
+        existing = self.existing_rows(incoming, field_names)
+
+        to_insert = []
+        to_update = []
+        update_fields = set()
+        for key, cleaned in incoming.items():
+            current = existing.get(key)
+            if current is None:
+                to_insert.append(self.model(**cleaned))
+                continue
+
+            changed = {name: value for name, value in cleaned.items() if current[name] != value}
+            if not changed:
+                summary.unchanged += 1
+                continue
+
+            update_fields.update(changed)
+            merged = {name: current[name] for name in field_names}
+            merged.update(cleaned)
+            to_update.append(self.model(pk=current['pk'], **merged))
+
+        update_fields = sorted(update_fields) + self.auto_now_fields
+
+        with transaction.atomic():
+            if to_update and self.has_unique_key():
+                # One upsert statement per batch covers inserts and updates together
+                self.model.objects.bulk_create(
+                    to_insert + [self.model(**{name: getattr(obj, name) for name in field_names}) for obj in to_update],
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=list(self.key_fields),
+                    update_fields=update_fields,
+                )
+            else:
+                self.model.objects.bulk_create(to_insert, batch_size=self.batch_size)
+                if to_update:
+                    for obj in to_update:
+                        for name in self.auto_now_fields:
+                            self.model._meta.get_field(name).pre_save(obj, add=False)
+                    self.model.objects.bulk_update(to_update, update_fields, batch_size=self.batch_size)
+
+        # Bulk writes bypass the model signals that normally retire cached catalog pages
+        if to_insert or to_update:
+            invalidate_catalog()
+            bump_model_version(self.model)
+
+        summary.inserted = len(to_insert)
+        summary.updated = len(to_update)
+        return summary
@@ -1,6 +1,8 @@
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
 from functools import wraps
+from asgiref.sync import sync_to_async
 from .models import Fine
 
 def check_fine_access(view_func):
@@ -59,4 +61,18 @@ def librarian_required(view_func):
             return redirect('user_dashboard')
             
         return view_func(request, *args, **kwargs)
-    return wrapped_view
\ No newline at end of file
+    return wrapped_view
+
+
+def async_login_required(view_func):
+    """
+    login_required for coroutine views. Django 4.2's decorator only wraps
+    sync views, and resolving request.user touches the session and the
+    database, so the check runs through sync_to_async.
+    """
+    @wraps(view_func)
+    async def wrapped_view(request, *args, **kwargs):
+        if await sync_to_async(lambda: request.user.is_authenticated)():
+            return await view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+    return wrapped_view
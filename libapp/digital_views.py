@@ -10,23 +10,29 @@ from django.http import JsonResponse, HttpResponse, FileResponse
 from django.utils import timezone
 from django.conf import settings
 from django.db import transaction
-import qrcode
+from django.urls import reverse
+from django.db.models import Q
 import io
-import base64
-from PIL import Image
 import json
 from datetime import timedelta
 from decimal import Decimal
 
 from .models import DigitalBook, DigitalBookAccess, QRPayment, CustomUser
+from .qr_service import qr_service
+from .file_serving import serve_file
+from .reader_service import ReaderError, reader_service
+from .book_indexer import index_book_in_background, search_pages
+from .response_cache import cache_catalog_page
 
 
 @login_required
+@cache_catalog_page
 def digital_library(request):
     """Digital library catalog"""
     category = request.GET.get('category', '')
     book_type = request.GET.get('type', '')
     free_only = request.GET.get('free_only', '')
+    search_query = request.GET.get('q', '').strip()
     
     books = DigitalBook.objects.filter(is_active=True)
     
@@ -37,6 +43,21 @@ def digital_library(request):
     if free_only == 'true':
         books = books.filter(is_free=True)
     
+    # Search titles, authors and categories as well as the indexed page text
+    content_hits = {}
+    if search_query:
+        for hit in search_pages(search_query, books=books):
+            content_hits.setdefault(hit['book_id'], []).append(hit)
+        books = books.filter(
+            Q(title__icontains=search_query) |
+            Q(author__icontains=search_query) |
+            Q(category__icontains=search_query) |
+            Q(id__in=list(content_hits))
+        )
+        books = list(books)
+        for book in books:
+            book.content_hits = content_hits.get(book.id, [])[:3]
+    
     # Get user's current access
     user_access = DigitalBookAccess.objects.filter(
         user=request.user,
@@ -51,6 +72,7 @@ def digital_library(request):
         'selected_category': category,
         'selected_type': book_type,
         'free_only': free_only,
+        'search_query': search_query,
     }
     
     return render(request, 'libapp/digital_library.html', context)
@@ -155,35 +177,16 @@ def create_qr_payment(digital_access, amount):
     upi_id = "readops@paytm"  # Replace with actual UPI ID
     qr_data = f"upi://pay?pa={upi_id}&pn=ReadOps Library&am={amount}&cu=INR&tn=Digital Book Access"
     
-    # Create QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    # Generate QR code image
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Save QR code image
-    img_buffer = io.BytesIO()
-    qr_img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
-    
-    # Create QR payment record
+    # Identical UPI strings (same amount, same payee) share one cached image
     qr_payment = QRPayment.objects.create(
         user=digital_access.user,
         digital_book_access=digital_access,
         amount=amount,
         qr_code_data=qr_data,
+        qr_code_image=qr_service.get_or_create(qr_data),
         expires_at=timezone.now() + timedelta(minutes=30)  # 30 minutes expiry
     )
     
-    # Save QR code image
-    qr_payment.qr_code_image.save(
-        f'qr_{qr_payment.id}.png',
-        img_buffer,
-        save=True
-    )
-    
     return qr_payment
 
 
@@ -243,36 +246,111 @@ def confirm_payment(request, payment_id):
     return redirect('digital_book_detail', book_id=digital_access.digital_book.id)
 
 
+def get_reading_access(user, book):
+    """Return the user's valid online reading access for a book, or None"""
+    user_access = DigitalBookAccess.objects.filter(
+        user=user,
+        digital_book=book,
+        access_type='ONLINE_READING',
+        status='ACTIVE'
+    ).order_by('-access_end_date').first()
+    
+    if user_access and user_access.is_access_valid():
+        return user_access
+    return None
+
+
 @login_required
 def online_reader(request, book_id):
     """Online book reader"""
     book = get_object_or_404(DigitalBook, id=book_id, is_active=True)
     
     # Check if user has valid access
-    user_access = DigitalBookAccess.objects.filter(
-        user=request.user,
-        digital_book=book,
-        access_type='ONLINE_READING',
-        status='ACTIVE'
-    ).first()
+    user_access = get_reading_access(request.user, book)
     
-    if not user_access or not user_access.is_access_valid():
+    if not user_access:
         messages.error(request, 'You need to purchase access to read this book online.')
         return redirect('digital_book_detail', book_id=book_id)
     
-    # For demo purposes, we'll show a sample text
-    # In a real implementation, you'd load the actual book content
-    sample_content = get_sample_book_content(book)
-    
     context = {
         'book': book,
         'user_access': user_access,
-        'content': sample_content,
+        'start_page': request.GET.get('page', ''),
     }
     
+    # Pages are fetched one at a time from the page API; only the page count is needed here
+    manifest = None
+    if reader_service.has_pdf(book):
+        try:
+            manifest = reader_service.get_manifest(book)
+        except ReaderError:
+            # A damaged PDF should not take the reader page down
+            manifest = None
+    if manifest:
+        context['page_count'] = manifest['page_count']
+        context['page_images'] = reader_service.images_available()
+    else:
+        # Books without a readable PDF fall back to the sample content
+        context['content'] = get_sample_book_content(book)
+    
     return render(request, 'libapp/online_reader.html', context)
 
 
+@login_required
+def reader_page(request, book_id, page_number):
+    """Return a single reader page as JSON with prefetch hints for the following pages"""
+    book = get_object_or_404(DigitalBook, id=book_id, is_active=True)
+    
+    if not get_reading_access(request.user, book):
+        return JsonResponse({'error': 'You need to purchase access to read this book online.'}, status=403)
+    if not reader_service.has_pdf(book):
+        return JsonResponse({'error': 'This book has no PDF file.'}, status=404)
+    
+    try:
+        page = reader_service.get_page(book, page_number)
+    except IndexError as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    except ReaderError:
+        return JsonResponse({'error': 'This book\'s PDF could not be read.'}, status=404)
+    
+    if reader_service.images_available():
+        page['image_url'] = reverse('reader_page_image', args=[book.id, page_number])
+    page['prefetch'] = [
+        reverse('reader_page', args=[book.id, number]) for number in page['prefetch']
+    ]
+    
+    response = JsonResponse(page)
+    response['Link'] = ', '.join(f'<{url}>; rel=prefetch' for url in page['prefetch'])
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+@login_required
+def reader_page_image(request, book_id, page_number):
+    """Serve the rendered image of a single page"""
+    book = get_object_or_404(DigitalBook, id=book_id, is_active=True)
+    
+    if not get_reading_access(request.user, book):
+        return HttpResponse('You need to purchase access to read this book online.', status=403)
+    if not reader_service.has_pdf(book):
+        return HttpResponse('This book has no PDF file.', status=404)
+    
+    try:
+        page_count = reader_service.get_manifest(book)['page_count']
+    except ReaderError:
+        return HttpResponse('This book\'s PDF could not be read.', status=404)
+    if page_number < 1 or page_number > page_count:
+        return HttpResponse('Page not found.', status=404)
+    
+    try:
+        image_path = reader_service.get_page_image_path(book, page_number)
+    except ReaderError:
+        return HttpResponse('This page could not be rendered.', status=404)
+    if not image_path:
+        return HttpResponse('Page images are not available.', status=404)
+    return serve_file(request, image_path, content_type='image/png')
+
+
 @login_required
 def download_book(request, book_id):
     """Download digital book"""
@@ -306,18 +384,29 @@ def download_book(request, book_id):
         return redirect('digital_book_detail', book_id=book_id)
     
     try:
-        response = FileResponse(
-            open(file_path, 'rb'),
-            content_type=content_type,
-            as_attachment=True,
-            filename=filename
-        )
-        return response
+        return serve_file(request, file_path, content_type=content_type, filename=filename, as_attachment=True)
     except FileNotFoundError:
         messages.error(request, 'File not found.')
         return redirect('digital_book_detail', book_id=book_id)
 
 
+@login_required
+def online_reader_file(request, book_id):
+    """Serve the book PDF inline so the browser's viewer can fetch pages by byte range"""
+    book = get_object_or_404(DigitalBook, id=book_id, is_active=True)
+    
+    if not get_reading_access(request.user, book):
+        return HttpResponse('You need to purchase access to read this book online.', status=403)
+    
+    if not book.pdf_file:
+        return HttpResponse('This book has no PDF file.', status=404)
+    
+    try:
+        return serve_file(request, book.pdf_file.path, content_type='application/pdf', filename=f"{book.title}.pdf")
+    except FileNotFoundError:
+        return HttpResponse('File not found.', status=404)
+
+
 @login_required
 def my_digital_books(request):
     """User's digital book access history"""
@@ -416,6 +505,11 @@ def add_digital_book(request):
                 book.word_file = request.FILES['word_file']
             
             book.save()
+            
+            # Extract and index the PDF text without holding up the response
+            if book.pdf_file:
+                index_book_in_background(book)
+            
             messages.success(request, f'Digital book "{book.title}" added successfully!')
             return redirect('digital_library')
         else:
@@ -0,0 +1,153 @@
+"""
+Protected File Serving for ReadOps Library Management System
+Serves digital book files with byte ranges, conditional requests and optional web server offload
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat_result):
+    """Strong validator derived from file size and modification time"""
+    return f'"{stat_result.st_size:x}-{int(stat_result.st_mtime * 1000000):x}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header into an inclusive (start, end) tuple.
+    Returns None when the header is absent or uses multiple ranges (the
+    full body is sent instead) and raises ValueError when unsatisfiable.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Unsatisfiable range')
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    """A Range request is only honoured if If-Range (when present) still matches"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_file(path, start, length):
+    with open(path, 'rb') as file_obj:
+        file_obj.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file_obj.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _content_disposition(filename, as_attachment):
+    # Escapes quotes and backslashes, and uses filename* for non-ASCII names, as FileResponse does
+    return content_disposition_header(as_attachment, filename) or 'inline'
+
+
+def _offload_response(path):
+    """
+    Hand the transfer to the front-end web server once access is checked.
+    FILE_SERVING_OFFLOAD selects 'x-sendfile' (Apache/lighttpd) or
+    'x-accel-redirect' (nginx, using X_ACCEL_REDIRECT_PREFIX as the internal location).
+    """
+    mode = getattr(settings, 'FILE_SERVING_OFFLOAD', None)
+    if not mode:
+        return None
+
+    response = HttpResponse()
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+    elif mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'X_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        if relative == '..' or relative.startswith('../'):
+            # The internal location only aliases MEDIA_ROOT (the reader cache lives elsewhere)
+            return None
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative)
+    else:
+        return None
+    return response
+
+
+def serve_file(request, path, content_type=None, filename=None, as_attachment=False):
+    """
+    Serve a file with Accept-Ranges, 206 Partial Content, ETag/Last-Modified
+    validators and 304 responses. Raises FileNotFoundError if the file is missing.
+    """
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    def finalize(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finalize(not_modified)
+
+    offloaded = _offload_response(path)
+    if offloaded is not None:
+        offloaded['Content-Type'] = content_type
+        offloaded['Content-Disposition'] = _content_disposition(filename, as_attachment)
+        return finalize(offloaded)
+
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return finalize(response)
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_file(path, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    return finalize(response)
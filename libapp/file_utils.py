@@ -0,0 +1,24 @@
+"""
+File Utilities for ReadOps Library Management System
+Helpers for writing generated artifacts (QR images, reader pages, thumbnails) under MEDIA_ROOT
+"""
+
+import os
+import tempfile
+
+
+def atomic_write(path, data):
+    """
+    Write bytes to path through a temp file in the same directory and an atomic rename,
+    so concurrent readers see either the old file or the complete new one.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,108 @@
+"""
+Fragment Cache for ReadOps Library Management System
+Caches rendered template fragments and computed values keyed on model version counters
+"""
+
+import re
+
+from django.apps import apps
+from django.dispatch import Signal, receiver
+
+from .cache_service import get_namespace, model_version
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 10
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+# Cached fragments hold this marker where the CSRF token was; each render gets its own token
+CSRF_PLACEHOLDER = '__readops_csrf_token__'
+
+fragment_cache = get_namespace('fragments', timeout=FRAGMENT_CACHE_TIMEOUT)
+stats_cache = get_namespace('fragment_stats', timeout=None)
+
+# Instrumentation hook, sent on every lookup with the fragment name and whether it was a hit
+fragment_accessed = Signal()
+
+
+def resolve_models(depends):
+    """Accept model classes or names such as 'Book' or 'libapp.Book'"""
+    models = []
+    for model in depends:
+        if isinstance(model, str):
+            model = model.strip()
+            if not model:
+                continue
+            model = apps.get_model(model) if '.' in model else apps.get_model('libapp', model)
+        models.append(model)
+    return models
+
+
+def cached_value(name, depends, compute, vary=(), timeout=FRAGMENT_CACHE_TIMEOUT):
+    """
+    Return compute() cached under `name`. The key embeds the version counter
+    of every model in `depends`, so any save or delete of those models
+    yields a fresh key; `vary` adds further key parts (page, date, ...).
+    """
+    key_parts = [name]
+    for model in resolve_models(depends):
+        key_parts.append(f'{model._meta.label_lower}={model_version(model)}')
+    key_parts.extend(vary)
+
+    value = fragment_cache.get(*key_parts)
+    hit = value is not None
+    if not hit:
+        value = compute()
+        fragment_cache.set(*key_parts, value=value, timeout=timeout)
+
+    fragment_accessed.send(sender=cached_value, name=name, hit=hit)
+    return value
+
+
+def cached_fragment(name, depends, render, vary=(), csrf_token=None, timeout=FRAGMENT_CACHE_TIMEOUT):
+    """
+    Cache the HTML returned by render(). CSRF tokens rendered through
+    {% csrf_token %} are stored as a placeholder and refilled with the
+    current request's token, so cached forms keep posting correctly.
+    """
+    def compute():
+        html = str(render())
+        match = CSRF_INPUT_RE.search(html)
+        if match:
+            html = html.replace(match.group(1), CSRF_PLACEHOLDER)
+        return html
+
+    html = cached_value(name, depends, compute, vary=vary, timeout=timeout)
+    if CSRF_PLACEHOLDER in html and csrf_token:
+        html = html.replace(CSRF_PLACEHOLDER, str(csrf_token))
+    return html
+
+
+@receiver(fragment_accessed)
+def record_fragment_access(sender, name, hit, **kwargs):
+    """
+    Keep shared hit/miss counters so every process contributes to the hit
+    rates. Names are indexed in numbered slots: add() and incr() are atomic,
+    so concurrent first lookups of different names cannot overwrite each other.
+    """
+    if stats_cache.add('seen', name, value=True):
+        stats_cache.set('slot', stats_cache.incr('slots'), value=name)
+    stats_cache.incr('count', name, 'hits' if hit else 'misses')
+
+
+def fragment_hit_rates():
+    """Return {name: {'hits', 'misses', 'hit_rate'}} for every fragment seen so far"""
+    rates = {}
+    slots = stats_cache.get('slots', default=0)
+    names = {stats_cache.get('slot', slot) for slot in range(1, slots + 1)}
+    for name in sorted(name for name in names if name is not None):
+        hits = stats_cache.get('count', name, 'hits', default=0)
+        misses = stats_cache.get('count', name, 'misses', default=0)
+        total = hits + misses
+        rates[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+    return rates
+
+
+def reset_fragment_stats():
+    stats_cache.invalidate()
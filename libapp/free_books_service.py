@@ -3,91 +3,349 @@ Free Books Service for ReadOps Library Management System
 Finds free alternatives for books not available in the library
 """
 
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from types import MappingProxyType
+from urllib.parse import quote_plus
+
 import requests
 import json
-from typing import List, Dict, Optional
+from typing import List, Dict, NamedTuple, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .cache_service import get_namespace
+
+# Platforms searched over the network; the others are answered with direct search links
+API_PLATFORMS = ('open_library',)
+SEARCH_DEADLINE = 3.0
+RESULTS_FRESH_SECONDS = 60 * 60
+RESULTS_STALE_SECONDS = 60 * 60 * 24
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 60
+PLATFORM_LINK_CACHE_SIZE = 1024
+GENERAL_PLATFORM_COUNT = 4
+
+# Entries outlive their fresh window so a stale result can be served while it is refreshed;
+# size is bounded by the cache backend's LRU eviction (MAX_ENTRIES on locmem, maxmemory on redis)
+search_cache = get_namespace('free_books', timeout=RESULTS_STALE_SECONDS)
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='free-books')
+
+
+def normalize_search_query(query: str) -> str:
+    """Searches that differ only in case or spacing share a cache entry"""
+    return ' '.join(query.lower().split())
+
+
+class Platform(NamedTuple):
+    """A compiled catalogue entry; the URL template is split around {query} once"""
+    id: str
+    name: str
+    url: str
+    description: str
+    url_prefix: str
+    url_suffix: str
+    
+    def search_url(self, encoded_query: str) -> str:
+        return self.url_prefix + encoded_query + self.url_suffix
+
+
+class PlatformLink(NamedTuple):
+    name: str
+    url: str
+    description: str
+
+
+class SubjectPlatform(NamedTuple):
+    name: str
+    url: str
+    description: str
+    reason: str
+
+
+def _compile_platforms(definitions) -> MappingProxyType:
+    platforms = {}
+    for platform_id, name, url, description in definitions:
+        prefix, _, suffix = url.partition('{query}')
+        platforms[platform_id] = Platform(platform_id, name, url, description, prefix, suffix)
+    return MappingProxyType(platforms)
+
+
+PLATFORMS = _compile_platforms((
+    ('project_gutenberg', 'Project Gutenberg', 'https://www.gutenberg.org/ebooks/search/?query={query}',
+     'Free ebooks from the world\'s first digital library'),
+    ('open_library', 'Open Library', 'https://openlibrary.org/search?q={query}',
+     'Open, editable library catalog'),
+    ('many_books', 'ManyBooks', 'https://manybooks.net/search-book?search={query}',
+     'Free ebooks in various formats'),
+    ('free_ebooks', 'Free-eBooks.net', 'https://www.free-ebooks.net/search/{query}',
+     'Free ebooks and magazines'),
+    ('google_books', 'Google Books (Free)', 'https://books.google.com/books?q={query}&filter=free-ebooks',
+     'Free books from Google Books'),
+    ('archive_org', 'Internet Archive', 'https://archive.org/search.php?query={query}&sin=TXT&and[]=mediatype:texts',
+     'Digital library of free books and media'),
+    ('hathitrust', 'HathiTrust', 'https://catalog.hathitrust.org/Search/Home?lookfor={query}&type=all&setid=set_ft',
+     'Digital preservation repository'),
+    ('libgen', 'Library Genesis', 'https://libgen.is/search.php?req={query}',
+     'Academic and scientific literature'),
+))
+
+SUBJECT_PLATFORMS = (
+    ('computer science', ('project_gutenberg', 'open_library', 'libgen')),
+    ('mathematics', ('project_gutenberg', 'open_library', 'libgen')),
+    ('physics', ('project_gutenberg', 'open_library', 'libgen')),
+    ('literature', ('project_gutenberg', 'open_library', 'many_books')),
+    ('history', ('project_gutenberg', 'open_library', 'archive_org')),
+    ('philosophy', ('project_gutenberg', 'open_library', 'libgen')),
+    ('science', ('project_gutenberg', 'open_library', 'libgen')),
+    ('engineering', ('open_library', 'libgen', 'hathitrust')),
+)
+
+
+@lru_cache(maxsize=PLATFORM_LINK_CACHE_SIZE)
+def platform_links(query: str) -> Tuple[PlatformLink, ...]:
+    """Search links on every platform for a normalized query, built once per query per process"""
+    encoded_query = quote_plus(query)
+    return tuple(
+        PlatformLink(platform.name, platform.search_url(encoded_query), platform.description)
+        for platform in PLATFORMS.values()
+    )
+
+
+@lru_cache(maxsize=PLATFORM_LINK_CACHE_SIZE)
+def subject_platforms(subject: str, query: str = '') -> Tuple[SubjectPlatform, ...]:
+    """
+    Platforms recommended for a normalized subject, falling back to general
+    platforms. With a query the links search for it; without one they carry
+    the URL template.
+    """
+    def link(platform, reason):
+        url = platform.search_url(quote_plus(query)) if query else platform.url
+        return SubjectPlatform(platform.name, url, platform.description, reason)
+    
+    recommended = tuple(
+        link(PLATFORMS[platform_id], f'Great for {category} books')
+        for category, platform_ids in SUBJECT_PLATFORMS if category in subject
+        for platform_id in platform_ids
+    )
+    return recommended or tuple(
+        link(platform, 'General purpose free book platform')
+        for platform in list(PLATFORMS.values())[:GENERAL_PLATFORM_COUNT]
+    )
+
+
+class CircuitBreaker:
+    """
+    Skips a failing platform. After `threshold` consecutive failures the
+    breaker opens for `cooldown` seconds; then a single trial call is let
+    through, which closes it on success or reopens it on failure.
+    """
+    
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half-open'
+    
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
 class FreeBooksService:
     """
     Service to find free book alternatives from various platforms
     """
     
     def __init__(self):
-        self.free_platforms = {
-            'project_gutenberg': {
-                'name': 'Project Gutenberg',
-                'url': 'https://www.gutenberg.org/ebooks/search/?query={query}',
-                'api_url': 'https://www.gutenberg.org/ebooks/search/?query={query}&format=json',
-                'description': 'Free ebooks from the world\'s first digital library'
-            },
-            'open_library': {
-                'name': 'Open Library',
-                'url': 'https://openlibrary.org/search?q={query}',
-                'api_url': 'https://openlibrary.org/search.json?q={query}',
-                'description': 'Open, editable library catalog'
-            },
-            'many_books': {
-                'name': 'ManyBooks',
-                'url': 'https://manybooks.net/search-book?search={query}',
-                'description': 'Free ebooks in various formats'
-            },
-            'free_ebooks': {
-                'name': 'Free-eBooks.net',
-                'url': 'https://www.free-ebooks.net/search/{query}',
-                'description': 'Free ebooks and magazines'
-            },
-            'google_books': {
-                'name': 'Google Books (Free)',
-                'url': 'https://books.google.com/books?q={query}&filter=free-ebooks',
-                'description': 'Free books from Google Books'
-            },
-            'archive_org': {
-                'name': 'Internet Archive',
-                'url': 'https://archive.org/search.php?query={query}&sin=TXT&and[]=mediatype:texts',
-                'description': 'Digital library of free books and media'
-            },
-            'hathitrust': {
-                'name': 'HathiTrust',
-                'url': 'https://catalog.hathitrust.org/Search/Home?lookfor={query}&type=all&setid=set_ft',
-                'description': 'Digital preservation repository'
-            },
-            'libgen': {
-                'name': 'Library Genesis',
-                'url': 'https://libgen.is/search.php?req={query}',
-                'description': 'Academic and scientific literature'
-            }
-        }
+        self.open_library_search_url = getattr(
+            settings, 'OPEN_LIBRARY_SEARCH_URL', 'https://openlibrary.org/search.json'
+        )
+        self.search_deadline = getattr(settings, 'FREE_BOOKS_SEARCH_DEADLINE', SEARCH_DEADLINE)
+        self.results_fresh_seconds = getattr(settings, 'FREE_BOOKS_FRESH_SECONDS', RESULTS_FRESH_SECONDS)
+        self.breakers = {platform_id: CircuitBreaker() for platform_id in API_PLATFORMS}
+        self._fetchers = {'open_library': self._fetch_open_library}
+        self._async_fetchers = {'open_library': self._afetch_open_library}
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+        self.platforms = PLATFORMS
     
     def search_free_books(self, query: str, limit: int = 5) -> List[Dict]:
         """
-        Search for free books across multiple platforms
+        Search for free books across multiple platforms. Results are cached
+        per normalized query; an entry past its fresh window is still served
+        while a background refresh replaces it.
         """
-        results = []
+        key = normalize_search_query(query)
+        entry = search_cache.get(key, limit)
+        if entry is not None:
+            if self._is_stale(entry):
+                self._revalidate(query, limit)
+            return entry['results']
         
-        # Clean and prepare query
-        clean_query = query.strip().replace(' ', '+')
+        results, complete = self._search_all(query, limit)
+        self._store(key, limit, results, complete)
+        return results
+    
+    async def asearch_free_books(self, query: str, limit: int = 5) -> List[Dict]:
+        """
+        Async variant of search_free_books for async views
+        """
+        key = normalize_search_query(query)
+        entry = await sync_to_async(search_cache.get)(key, limit)
+        if entry is not None:
+            if self._is_stale(entry):
+                self._revalidate(query, limit)
+            return entry['results']
         
-        # Search each platform
-        for platform_id, platform_info in self.free_platforms.items():
-            try:
-                platform_results = self._search_platform(platform_id, clean_query, limit)
-                if platform_results:
-                    results.extend(platform_results)
-            except Exception as e:
-                print(f"Error searching {platform_info['name']}: {str(e)}")
-                continue
+        results, complete = await self._asearch_all(query, limit)
+        await sync_to_async(self._store)(key, limit, results, complete)
+        return results
+    
+    def _search_all(self, query: str, limit: int, background: bool = False):
+        """
+        Query the API platforms concurrently, waiting at most the search
+        deadline. Returns (results, complete); complete is False when a
+        platform failed, was skipped by its breaker or missed the deadline.
+        """
+        clean_query = query.strip().replace(' ', '+')
+        allowed = [platform_id for platform_id in API_PLATFORMS if self.breakers[platform_id].allow()]
+        if background:
+            # Refreshes already run on a pool thread; fetching inline avoids waiting on the same pool
+            api_results = {
+                platform_id: self._call_platform(platform_id, clean_query, limit) for platform_id in allowed
+            }
+        else:
+            futures = {
+                platform_id: _executor.submit(self._call_platform, platform_id, clean_query, limit)
+                for platform_id in allowed
+            }
+            wait(futures.values(), timeout=self.search_deadline)
+            api_results = {
+                platform_id: future.result() for platform_id, future in futures.items() if future.done()
+            }
+        return self._merge(clean_query, limit, api_results), self._complete(api_results)
+    
+    async def _asearch_all(self, query: str, limit: int):
+        clean_query = query.strip().replace(' ', '+')
+        tasks = {
+            platform_id: asyncio.ensure_future(self._acall_platform(platform_id, clean_query, limit))
+            for platform_id in API_PLATFORMS if self.breakers[platform_id].allow()
+        }
+        if tasks:
+            done, pending = await asyncio.wait(tasks.values(), timeout=self.search_deadline)
+            for task in pending:
+                task.cancel()
+        api_results = {
+            platform_id: task.result() for platform_id, task in tasks.items()
+            if task.done() and not task.cancelled()
+        }
+        return self._merge(clean_query, limit, api_results), self._complete(api_results)
+    
+    def _call_platform(self, platform_id: str, query: str, limit: int) -> Optional[List[Dict]]:
+        """Run one API search under its circuit breaker; None when it failed"""
+        breaker = self.breakers[platform_id]
+        try:
+            results = self._fetchers[platform_id](query, limit, timeout=self.search_deadline)
+        except Exception as e:
+            breaker.record_failure()
+            print(f"Error searching {self.platforms[platform_id].name}: {str(e)}")
+            return None
+        breaker.record_success()
+        return results
+    
+    async def _acall_platform(self, platform_id: str, query: str, limit: int) -> Optional[List[Dict]]:
+        breaker = self.breakers[platform_id]
+        try:
+            results = await self._async_fetchers[platform_id](query, limit, timeout=self.search_deadline)
+        except asyncio.CancelledError:
+            # Missed the deadline; count it so a hanging platform trips the breaker
+            breaker.record_failure()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            print(f"Error searching {self.platforms[platform_id].name}: {str(e)}")
+            return None
+        breaker.record_success()
+        return results
+    
+    def _merge(self, query: str, limit: int, api_results: Dict) -> List[Dict]:
+        """Combine API results with direct links, in platform order"""
+        results = []
+        for platform_id in self.platforms:
+            if platform_id in API_PLATFORMS:
+                results.extend(api_results.get(platform_id) or [])
+            else:
+                results.extend(self._search_platform(platform_id, query, limit))
         
         # Remove duplicates and limit results
         unique_results = self._remove_duplicates(results)
         return unique_results[:limit]
     
+    def _complete(self, api_results: Dict) -> bool:
+        return all(api_results.get(platform_id) is not None for platform_id in API_PLATFORMS)
+    
+    def _store(self, key: str, limit: int, results: List[Dict], complete: bool):
+        # Partial results are stored as already stale, so the next search serves them and retries in the background
+        search_cache.set(key, limit, value={'results': results, 'fetched_at': time.time() if complete else 0})
+    
+    def _is_stale(self, entry: Dict) -> bool:
+        return time.time() - entry['fetched_at'] > self.results_fresh_seconds
+    
+    def _revalidate(self, query: str, limit: int):
+        """Refresh a stale entry on a pool thread, at most once per query at a time"""
+        token = (normalize_search_query(query), limit)
+        with self._revalidating_lock:
+            if token in self._revalidating:
+                return
+            self._revalidating.add(token)
+        
+        def refresh():
+            try:
+                results, complete = self._search_all(query, limit, background=True)
+                self._store(token[0], limit, results, complete)
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(token)
+        
+        _executor.submit(refresh)
+    
     def _search_platform(self, platform_id: str, query: str, limit: int) -> List[Dict]:
         """
         Search a specific platform for free books
         """
-        platform = self.free_platforms[platform_id]
-        results = []
+        platform = self.platforms[platform_id]
         
         if platform_id == 'open_library':
             return self._search_open_library(query, limit)
@@ -96,11 +354,11 @@ class FreeBooksService:
         else:
             # For platforms without API, return direct links
             return [{
-                'title': f'Search {platform["name"]}',
+                'title': f'Search {platform.name}',
                 'author': 'Various Authors',
-                'url': platform['url'].format(query=query),
-                'platform': platform['name'],
-                'description': platform['description'],
+                'url': platform.search_url(query),
+                'platform': platform.name,
+                'description': platform.description,
                 'is_direct_link': True
             }]
     
@@ -109,39 +367,49 @@ class FreeBooksService:
         Search Open Library API
         """
         try:
-            url = f"https://openlibrary.org/search.json?q={query}&limit={limit}"
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            
-            results = []
-            for doc in data.get('docs', [])[:limit]:
-                if doc.get('ebook_count_i', 0) > 0:  # Only include books with ebooks
-                    results.append({
-                        'title': doc.get('title', 'Unknown Title'),
-                        'author': ', '.join(doc.get('author_name', ['Unknown Author'])),
-                        'url': f"https://openlibrary.org{doc.get('key', '')}",
-                        'platform': 'Open Library',
-                        'description': f"Available as ebook with {doc.get('ebook_count_i', 0)} formats",
-                        'is_direct_link': False,
-                        'year': doc.get('first_publish_year', 'Unknown')
-                    })
-            
-            return results
+            return self._fetch_open_library(query, limit, timeout=self.search_deadline)
         except Exception as e:
             print(f"Error searching Open Library: {str(e)}")
             return []
     
+    def _fetch_open_library(self, query: str, limit: int, timeout: float) -> List[Dict]:
+        url = f"{self.open_library_search_url}?q={query}&limit={limit}"
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        return self._parse_open_library(response.json(), limit)
+    
+    async def _afetch_open_library(self, query: str, limit: int, timeout: float) -> List[Dict]:
+        from .http_client import get_json
+        url = f"{self.open_library_search_url}?q={query}&limit={limit}"
+        return self._parse_open_library(await get_json(url, timeout=timeout), limit)
+    
+    def _parse_open_library(self, data: Dict, limit: int) -> List[Dict]:
+        results = []
+        for doc in data.get('docs', [])[:limit]:
+            if doc.get('ebook_count_i', 0) > 0:  # Only include books with ebooks
+                results.append({
+                    'title': doc.get('title', 'Unknown Title'),
+                    'author': ', '.join(doc.get('author_name', ['Unknown Author'])),
+                    'url': f"https://openlibrary.org{doc.get('key', '')}",
+                    'platform': 'Open Library',
+                    'description': f"Available as ebook with {doc.get('ebook_count_i', 0)} formats",
+                    'is_direct_link': False,
+                    'year': doc.get('first_publish_year', 'Unknown')
+                })
+        return results
+    
     def _search_project_gutenberg(self, query: str, limit: int) -> List[Dict]:
         """
         Search Project Gutenberg (simplified)
         """
         # Project Gutenberg doesn't have a public API, so we return direct search links
+        platform = self.platforms['project_gutenberg']
         return [{
             'title': f'Search Project Gutenberg for "{query}"',
             'author': 'Various Authors',
-            'url': f"https://www.gutenberg.org/ebooks/search/?query={query}",
-            'platform': 'Project Gutenberg',
-            'description': 'Free ebooks from the world\'s first digital library',
+            'url': platform.search_url(query),
+            'platform': platform.name,
+            'description': platform.description,
             'is_direct_link': True
         }]
     
@@ -164,72 +432,38 @@ class FreeBooksService:
         """
         Get platform suggestions for a specific book
         """
-        query = book_title
-        if book_author:
-            query = f"{book_title} {book_author}"
-        
+        query = self._suggestion_query(book_title, book_author)
         free_books = self.search_free_books(query, limit=3)
-        
-        # Create direct search links for all platforms
-        platform_links = []
-        for platform_id, platform_info in self.free_platforms.items():
-            platform_links.append({
-                'name': platform_info['name'],
-                'url': platform_info['url'].format(query=query),
-                'description': platform_info['description']
-            })
-        
+        return self._suggestions(book_title, book_author, query, free_books)
+    
+    async def aget_platform_suggestions(self, book_title: str, book_author: str = None) -> Dict:
+        """
+        Async variant of get_platform_suggestions
+        """
+        query = self._suggestion_query(book_title, book_author)
+        free_books = await self.asearch_free_books(query, limit=3)
+        return self._suggestions(book_title, book_author, query, free_books)
+    
+    def _suggestion_query(self, book_title: str, book_author: str = None) -> str:
+        if book_author:
+            return f"{book_title} {book_author}"
+        return book_title
+    
+    def _suggestions(self, book_title: str, book_author: Optional[str], query: str, free_books: List[Dict]) -> Dict:
         return {
             'book_title': book_title,
             'book_author': book_author,
             'free_books_found': free_books,
-            'platform_links': platform_links,
+            # Shared, immutable and memoized: repeated empty searches reuse the same links
+            'platform_links': platform_links(normalize_search_query(query)),
             'search_query': query
         }
     
-    def get_subject_specific_platforms(self, subject: str) -> List[Dict]:
+    def get_subject_specific_platforms(self, subject: str, query: str = None) -> Tuple[SubjectPlatform, ...]:
         """
-        Get platforms that are good for specific subjects
+        Get platforms that are good for specific subjects, with links searching for `query` when given
         """
-        subject_platforms = {
-            'computer science': ['project_gutenberg', 'open_library', 'libgen'],
-            'mathematics': ['project_gutenberg', 'open_library', 'libgen'],
-            'physics': ['project_gutenberg', 'open_library', 'libgen'],
-            'literature': ['project_gutenberg', 'open_library', 'many_books'],
-            'history': ['project_gutenberg', 'open_library', 'archive_org'],
-            'philosophy': ['project_gutenberg', 'open_library', 'libgen'],
-            'science': ['project_gutenberg', 'open_library', 'libgen'],
-            'engineering': ['open_library', 'libgen', 'hathitrust']
-        }
-        
-        subject_lower = subject.lower()
-        recommended_platforms = []
-        
-        for category, platforms in subject_platforms.items():
-            if category in subject_lower:
-                for platform_id in platforms:
-                    if platform_id in self.free_platforms:
-                        platform = self.free_platforms[platform_id]
-                        recommended_platforms.append({
-                            'name': platform['name'],
-                            'url': platform['url'],
-                            'description': platform['description'],
-                            'reason': f'Great for {category} books'
-                        })
-        
-        # If no specific match, return general platforms
-        if not recommended_platforms:
-            recommended_platforms = [
-                {
-                    'name': platform['name'],
-                    'url': platform['url'],
-                    'description': platform['description'],
-                    'reason': 'General purpose free book platform'
-                }
-                for platform in list(self.free_platforms.values())[:4]
-            ]
-        
-        return recommended_platforms
+        return subject_platforms(normalize_search_query(subject), normalize_search_query(query or ''))
 
 # Create a global instance
 free_books_service = FreeBooksService()
@@ -0,0 +1,53 @@
+"""
+Async HTTP Client for ReadOps Library Management System
+Shared httpx client for outbound calls made from async views, so a single
+worker can wait on many slow upstream services without holding a thread each
+"""
+
+import asyncio
+import ssl
+import weakref
+from functools import lru_cache
+
+DEFAULT_TIMEOUT = 10
+MAX_CONNECTIONS = 100
+
+# httpx clients are bound to the event loop that created them; ASGI servers
+# run one loop per worker, while async views served under WSGI get a new loop
+# per request, so keep one client per loop
+_clients = weakref.WeakKeyDictionary()
+
+
+@lru_cache(maxsize=None)
+def _ssl_context():
+    # Loading the CA bundle is the slow part of creating a client; share it between loops
+    import certifi
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def get_client():
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            verify=_ssl_context(),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def get_json(url, params=None, timeout=DEFAULT_TIMEOUT):
+    response = await get_client().get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+async def post_json(url, data=None, headers=None, timeout=DEFAULT_TIMEOUT):
+    """POST form data and decode the JSON reply; non-2xx replies are returned too, as the SMS APIs put errors in the body"""
+    response = await get_client().post(url, data=data, headers=headers, timeout=timeout)
+    return response.json()
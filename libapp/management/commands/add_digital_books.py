@@ -2,7 +2,8 @@
 Management command to add sample digital books
 """
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from libapp.catalog_loader import CatalogLoader
 from libapp.models import DigitalBook
 
 
@@ -144,22 +145,16 @@ class Command(BaseCommand):
             },
         ]
 
-        created_count = 0
-        for book_data in digital_books:
-            book, created = DigitalBook.objects.get_or_create(
-                title=book_data['title'],
-                defaults=book_data
-            )
-            if created:
-                created_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'Created: {book.title}')
-                )
-            else:
-                self.stdout.write(
-                    self.style.WARNING(f'Already exists: {book.title}')
-                )
+        # Upsert on (title, author) so re-running only touches changed rows
+        summary = CatalogLoader(DigitalBook).load(digital_books)
 
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully added {created_count} digital books!')
+            self.style.SUCCESS(
+                f'Digital books: {summary.inserted} inserted, {summary.updated} updated, '
+                f'{summary.unchanged} unchanged'
+            )
         )
+        if summary.errors:
+            for row_number, message in summary.errors:
+                self.stdout.write(self.style.ERROR(f'Row {row_number}: {message}'))
+            raise CommandError(f'{len(summary.errors)} books could not be saved')
@@ -1,4 +1,5 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from libapp.catalog_loader import CatalogLoader
 from libapp.models import DigitalBook
 from django.utils import timezone
 import os
@@ -394,21 +395,19 @@ class Command(BaseCommand):
         # Combine all books
         all_books = kannada_stories + english_learning + additional_free_books
         
-        created_count = 0
-        for book_data in all_books:
-            # Check if book already exists
-            if not DigitalBook.objects.filter(title=book_data['title']).exists():
-                DigitalBook.objects.create(**book_data)
-                created_count += 1
-                self.stdout.write(f"Created: {book_data['title']}")
-            else:
-                self.stdout.write(f"Already exists: {book_data['title']}")
+        # Upsert on (title, author) so re-running only touches changed rows
+        summary = CatalogLoader(DigitalBook).load(all_books)
         
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully added {created_count} free educational books to the digital library!'
+                f'Free educational books: {summary.inserted} inserted, {summary.updated} updated, '
+                f'{summary.unchanged} unchanged'
             )
         )
+        if summary.errors:
+            for row_number, message in summary.errors:
+                self.stdout.write(self.style.ERROR(f'Row {row_number}: {message}'))
+            raise CommandError(f'{len(summary.errors)} books could not be saved')
         
         # Display summary
         self.stdout.write('\n' + '='*60)
@@ -417,7 +416,7 @@ class Command(BaseCommand):
         self.stdout.write(f'📚 Kannada Stories (1st-10th std): {len(kannada_stories)} books')
         self.stdout.write(f'🇬🇧 English Learning Materials: {len(english_learning)} books')
         self.stdout.write(f'📖 Additional Free Books: {len(additional_free_books)} books')
-        self.stdout.write(f'📊 Total Free Books Added: {created_count} books')
+        self.stdout.write(f'📊 Total Free Books Added: {summary.inserted} books')
         self.stdout.write('='*60)
         
         self.stdout.write('\n📋 Categories included:')
@@ -0,0 +1,111 @@
+"""
+Django management command to compare SQLite throughput with and without the production profile
+Run with: python manage.py benchmark_sqlite --threads 8 --seconds 5 --write-ratio 0.2
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from libapp.sqlite_profile import apply_pragmas
+
+BOOK_ROWS = 5000
+
+
+def _prepare(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.executescript('''
+        CREATE TABLE book (id INTEGER PRIMARY KEY, title TEXT, subject TEXT, quantity INTEGER);
+        CREATE INDEX book_subject_idx ON book (subject);
+        CREATE TABLE scan (id INTEGER PRIMARY KEY, book_id INTEGER, scanned_at REAL);
+    ''')
+    conn.executemany(
+        'INSERT INTO book (title, subject, quantity) VALUES (?, ?, ?)',
+        ((f'Book {i}', f'Subject {i % 50}', 5) for i in range(BOOK_ROWS)),
+    )
+    conn.close()
+
+
+def _worker(path, pragmas, deadline, write_ratio, results, lock):
+    # Same defaults as Django's SQLite backend: 5s sqlite3 timeout, autocommit
+    conn = sqlite3.connect(path, isolation_level=None)
+    if pragmas:
+        apply_pragmas(conn.cursor(), pragmas)
+    rng = random.Random()
+    reads = writes = errors = 0
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                book_id = rng.randint(1, BOOK_ROWS)
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('UPDATE book SET quantity = quantity + 1 WHERE id = ?', (book_id,))
+                conn.execute('INSERT INTO scan (book_id, scanned_at) VALUES (?, ?)', (book_id, time.time()))
+                conn.execute('COMMIT')
+                writes += 1
+            else:
+                conn.execute(
+                    'SELECT id, title, quantity FROM book WHERE subject = ? ORDER BY title LIMIT 25',
+                    (f'Subject {rng.randrange(50)}',),
+                ).fetchall()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    with lock:
+        results['reads'] += reads
+        results['writes'] += writes
+        results['errors'] += errors
+
+
+class Command(BaseCommand):
+    help = 'Benchmark mixed read/write SQLite throughput with default settings and the production profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent connections')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of operations that write')
+
+    def run(self, pragmas, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            _prepare(path)
+            results = {'reads': 0, 'writes': 0, 'errors': 0}
+            lock = threading.Lock()
+            deadline = time.perf_counter() + options['seconds']
+            threads = [
+                threading.Thread(target=_worker, args=(path, pragmas, deadline, options['write_ratio'], results, lock))
+                for _ in range(options['threads'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return results
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{options["threads"]} threads, {options["seconds"]:.0f}s per run, '
+            f'{options["write_ratio"]:.0%} writes'
+        )
+        baseline = None
+        for label, pragmas in (('default', {}), ('production', settings.SQLITE_PRAGMAS)):
+            results = self.run(pragmas, options)
+            total = (results['reads'] + results['writes']) / options['seconds']
+            line = (
+                f'{label:>10}: {total:8.0f} ops/s '
+                f'({results["reads"] / options["seconds"]:.0f} reads/s, '
+                f'{results["writes"] / options["seconds"]:.0f} writes/s, '
+                f'{results["errors"]} lock errors)'
+            )
+            if baseline:
+                line += f'  x{total / baseline:.2f}'
+            baseline = baseline or total
+            self.stdout.write(line)
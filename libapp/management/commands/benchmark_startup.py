@@ -0,0 +1,122 @@
+"""
+Django management command to measure cold start: import time and time to first request
+Run with: python manage.py benchmark_startup --runs 5 --check
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules that must stay out of startup; they are imported by the views that use them
+HEAVY_MODULES = (
+    'PIL.Image',
+    'qrcode',
+    'reportlab.platypus',
+    'pypdf',
+    'httpx',
+    'libapp.email_service',
+)
+
+# Runs in a fresh interpreter so nothing is already imported
+PROBE = '''
+import json, os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import resolve
+resolve('/')
+ready = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from django.test import RequestFactory
+application = get_wsgi_application()
+environ = RequestFactory().get(sys.argv[1]).environ
+environ['HTTP_HOST'] = 'localhost'
+status = []
+b''.join(application(environ, lambda s, h, *a: status.append(s)))
+served = time.perf_counter()
+print(json.dumps({
+    'startup_ms': (ready - start) * 1000,
+    'first_request_ms': (served - start) * 1000,
+    'status': status[0],
+    'heavy': [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+}))
+'''
+
+
+def _run_probe(path, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROBE, path, json.dumps(HEAVY_MODULES)]
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'library.settings'))
+    result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR, env=env)
+    if result.returncode:
+        raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'probe failed')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def _slowest_imports(importtime_output, limit):
+    """Parse `-X importtime` lines into (cumulative_us, module) pairs, slowest first"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Nested imports are indented past the single space after the separator
+        if not module[1:].startswith(' '):
+            rows.append((int(cumulative), module.strip()))
+    # Only top-level packages, so a slow dependency is not listed once per submodule
+    top = {}
+    for cumulative, module in rows:
+        package = module.split('.')[0] if not module.startswith('libapp') else module
+        top[package] = max(top.get(package, 0), cumulative)
+    return sorted(((us, name) for name, us in top.items()), reverse=True)[:limit]
+
+
+class Command(BaseCommand):
+    help = 'Measure Django startup and time to first request in fresh interpreters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to take the median over')
+        parser.add_argument('--path', default='/aboutus/', help='URL served as the first request')
+        parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list')
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if a heavy module is imported at startup or the budget is exceeded')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail --check when median time to first request exceeds this')
+
+    def handle(self, *args, **options):
+        samples = [_run_probe(options['path'])[0] for _ in range(options['runs'])]
+        startup = sorted(sample['startup_ms'] for sample in samples)
+        first_request = sorted(sample['first_request_ms'] for sample in samples)
+        median = len(samples) // 2
+
+        self.stdout.write(f'{options["runs"]} runs, first request {options["path"]} -> {samples[0]["status"]}')
+        self.stdout.write(f'  setup + URLConf:   {startup[median]:7.0f} ms median ({startup[0]:.0f}-{startup[-1]:.0f})')
+        self.stdout.write(
+            f'  first request:     {first_request[median]:7.0f} ms median '
+            f'({first_request[0]:.0f}-{first_request[-1]:.0f})'
+        )
+
+        _, importtime_output = _run_probe(options['path'], importtime=True)
+        self.stdout.write('\nSlowest imports (cumulative, -X importtime):')
+        for microseconds, module in _slowest_imports(importtime_output, options['top']):
+            self.stdout.write(f'  {microseconds / 1000:7.1f} ms  {module}')
+
+        heavy = sorted({name for sample in samples for name in sample['heavy']})
+        if heavy:
+            self.stdout.write(self.style.WARNING(f'\nHeavy modules loaded at startup: {", ".join(heavy)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nNo heavy modules loaded at startup'))
+
+        if options['check']:
+            if heavy:
+                raise CommandError(f'Heavy modules imported at startup: {", ".join(heavy)}')
+            if options['budget_ms'] and first_request[median] > options['budget_ms']:
+                raise CommandError(
+                    f'Time to first request {first_request[median]:.0f} ms exceeds budget {options["budget_ms"]:.0f} ms'
+                )
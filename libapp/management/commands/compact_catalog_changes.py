@@ -0,0 +1,20 @@
+"""
+Django management command to keep the CatalogChange journal from growing without bound
+Run with: python manage.py compact_catalog_changes --days 30
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from libapp.models import CatalogChange
+
+
+class Command(BaseCommand):
+    help = 'Drop catalog journal entries older than --days, keeping the latest entry of every row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep every entry newer than this many days')
+
+    def handle(self, *args, **options):
+        deleted = CatalogChange.compact(timezone.now() - timezone.timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} superseded journal entries'))
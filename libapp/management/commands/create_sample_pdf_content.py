@@ -1,86 +1,182 @@
-from django.core.management.base import BaseCommand
-from libapp.models import DigitalBook
+"""
+Django management command to render sample PDFs for free digital books
+Run with: python manage.py create_sample_pdf_content --workers 4
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
-import io
+
+from libapp.book_indexer import index_books
+from libapp.models import DigitalBook
+
+
+def build_sample_pdf(job):
+    """Render the sample PDF for one book and return its bytes"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = []
+    
+    # Title
+    title_style = styles['Title']
+    title = Paragraph(job['title'], title_style)
+    story.append(title)
+    story.append(Spacer(1, 12))
+    
+    # Author
+    author_style = styles['Heading2']
+    author = Paragraph(f"by {job['author']}", author_style)
+    story.append(author)
+    story.append(Spacer(1, 12))
+    
+    # Description
+    desc_style = styles['Normal']
+    description = Paragraph(job['description'], desc_style)
+    story.append(description)
+    story.append(Spacer(1, 12))
+    
+    # Category and Type
+    category_info = Paragraph(f"<b>Category:</b> {job['category']}<br/><b>Type:</b> {job['book_type']}", desc_style)
+    story.append(category_info)
+    story.append(Spacer(1, 12))
+    
+    content_style = styles['Normal']
+    content = Paragraph(job['content'], content_style)
+    story.append(content)
+    
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_to_storage(job):
+    """
+    Worker entry point: render one PDF and write it straight to storage.
+    Files left by an interrupted run are reused unless overwrite is set.
+    Returns (book_id, storage name, rendered, error).
+    """
+    name = job['name']
+    try:
+        if default_storage.exists(name):
+            if not job['overwrite']:
+                return job['book_id'], name, False, None
+            default_storage.delete(name)
+        saved_name = default_storage.save(name, ContentFile(build_sample_pdf(job)))
+        return job['book_id'], saved_name, True, None
+    except Exception as e:
+        return job['book_id'], None, False, str(e)
 
 
 class Command(BaseCommand):
     help = 'Create sample PDF content for free educational books'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes used to render PDFs',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate PDFs for every free book, overwriting existing files '
+                 '(by default only books without a PDF on disk are rendered)',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Creating sample PDF content for free books...'))
+        force = options['force']
+        workers = max(1, options['workers'])
         
         # Get all free books
-        free_books = DigitalBook.objects.filter(is_free=True)
+        free_books = list(DigitalBook.objects.filter(is_free=True))
+        if not force:
+            free_books = [
+                book for book in free_books
+                if not book.pdf_file or not default_storage.exists(book.pdf_file.name)
+            ]
         
-        created_count = 0
+        jobs = []
+        used_names = set()
         for book in free_books:
-            if not book.pdf_file:  # Only create if no PDF exists
-                # Create sample PDF content
-                buffer = io.BytesIO()
-                doc = SimpleDocTemplate(buffer, pagesize=letter)
-                styles = getSampleStyleSheet()
-                story = []
-                
-                # Title
-                title_style = styles['Title']
-                title = Paragraph(book.title, title_style)
-                story.append(title)
-                story.append(Spacer(1, 12))
-                
-                # Author
-                author_style = styles['Heading2']
-                author = Paragraph(f"by {book.author}", author_style)
-                story.append(author)
-                story.append(Spacer(1, 12))
-                
-                # Description
-                desc_style = styles['Normal']
-                description = Paragraph(book.description, desc_style)
-                story.append(description)
-                story.append(Spacer(1, 12))
-                
-                # Category and Type
-                category_info = Paragraph(f"<b>Category:</b> {book.category}<br/><b>Type:</b> {book.get_book_type_display()}", desc_style)
-                story.append(category_info)
-                story.append(Spacer(1, 12))
-                
-                # Sample content based on category
-                if 'Kannada' in book.category:
-                    sample_content = self.get_kannada_sample_content(book)
-                elif 'English' in book.category:
-                    sample_content = self.get_english_sample_content(book)
-                elif 'Mathematics' in book.category:
-                    sample_content = self.get_math_sample_content(book)
-                elif 'Science' in book.category:
-                    sample_content = self.get_science_sample_content(book)
-                else:
-                    sample_content = self.get_general_sample_content(book)
-                
-                content_style = styles['Normal']
-                content = Paragraph(sample_content, content_style)
-                story.append(content)
-                
-                # Build PDF
-                doc.build(story)
-                buffer.seek(0)
-                
-                # Save PDF to book
-                filename = f"{book.title.replace(' ', '_').replace('/', '_')}.pdf"
-                book.pdf_file.save(filename, ContentFile(buffer.getvalue()), save=True)
+            # Stable file names let a rerun pick up PDFs already written by workers
+            filename = f"{book.title.replace(' ', '_').replace('/', '_')}.pdf"
+            name = book.pdf_file.field.generate_filename(book, filename)
+            if name in used_names:
+                name = book.pdf_file.field.generate_filename(book, f"{filename[:-4]}_{book.id}.pdf")
+            used_names.add(name)
+            
+            jobs.append({
+                'book_id': book.id,
+                'name': name,
+                'overwrite': force,
+                'title': book.title,
+                'author': book.author,
+                'description': book.description,
+                'category': book.category,
+                'book_type': book.get_book_type_display(),
+                'content': self.get_sample_content(book),
+            })
+        
+        self.stdout.write(f'Rendering {len(jobs)} PDFs with {workers} workers...')
+        books_by_id = {book.id: book for book in free_books}
+        changed_books = []
+        rendered_count = 0
+        failed_count = 0
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            for done, (book_id, name, rendered, error) in enumerate(executor.map(render_to_storage, jobs), start=1):
+                book = books_by_id[book_id]
+                if error:
+                    failed_count += 1
+                    self.stdout.write(f"[{done}/{len(jobs)}] ❌ {book.title}: {error}")
+                    continue
                 
-                created_count += 1
-                self.stdout.write(f"Created PDF for: {book.title}")
+                rendered_count += rendered
+                self.stdout.write(f"[{done}/{len(jobs)}] {'Created' if rendered else 'Reused'} PDF for: {book.title}")
+                book.pdf_file.name = name
+                book.updated_date = timezone.now()
+                changed_books.append(book)
+        
+        # Record every file path in one bulk write instead of a save per book
+        DigitalBook.objects.bulk_update(changed_books, ['pdf_file', 'updated_date'], batch_size=500)
         
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully created {created_count} sample PDF files for free books!'
+                f'Successfully created {rendered_count} sample PDF files for free books! '
+                f'({len(changed_books) - rendered_count} reused, {failed_count} failed)'
             )
         )
+        
+        # Make the new PDFs searchable from the digital library
+        if changed_books:
+            indexed_books, indexed_pages, errors = index_books(changed_books, workers=workers)
+            self.stdout.write(f'Indexed {indexed_pages} pages from {indexed_books} new PDFs')
+    
+    def get_sample_content(self, book):
+        """Sample content based on category"""
+        if 'Kannada' in book.category:
+            return self.get_kannada_sample_content(book)
+        elif 'English' in book.category:
+            return self.get_english_sample_content(book)
+        elif 'Mathematics' in book.category:
+            return self.get_math_sample_content(book)
+        elif 'Science' in book.category:
+            return self.get_science_sample_content(book)
+        else:
+            return self.get_general_sample_content(book)
     
     def get_kannada_sample_content(self, book):
         if '1ನೇ ತರಗತಿ' in book.title and 'ಅಕ್ಷರಗಳು' in book.title:
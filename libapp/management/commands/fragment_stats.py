@@ -0,0 +1,32 @@
+"""
+Django management command to report fragment cache hit rates
+Run with: python manage.py fragment_stats [--reset]
+"""
+
+from django.core.management.base import BaseCommand
+
+from libapp.fragment_cache import fragment_hit_rates, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit rates for cached dashboard and API fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Clear the counters after reporting them',
+        )
+
+    def handle(self, *args, **options):
+        rates = fragment_hit_rates()
+        if not rates:
+            self.stdout.write('No fragment lookups recorded yet')
+        for name, stats in rates.items():
+            self.stdout.write(
+                f'{name}: {stats["hit_rate"]:.1%} hit rate '
+                f'({stats["hits"]} hits, {stats["misses"]} misses)'
+            )
+        if options['reset']:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS('Fragment counters reset'))
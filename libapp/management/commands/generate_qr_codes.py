@@ -0,0 +1,80 @@
+"""
+Django management command to pre-generate QR codes for every user
+Run with: python manage.py generate_qr_codes --workers 4
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from libapp.models import CustomUser, UserQRCode
+from libapp.qr_service import qr_service, payload_digest, render_for_pool
+from libapp.qr_tokens import is_token
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate content-addressed QR code images for all users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes used to render images',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per bulk database write',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = options['batch_size']
+
+        # Create QR records for users that do not have one yet
+        missing_users = CustomUser.objects.filter(qr_code__isnull=True).values_list('id', flat=True)
+        new_codes = [UserQRCode(user_id=user_id) for user_id in missing_users]
+        for qr_code in new_codes:
+            qr_code.qr_code_data = qr_code.generate_qr_data()
+        UserQRCode.objects.bulk_create(new_codes, batch_size=batch_size)
+        self.stdout.write(f'Created {len(new_codes)} new QR records')
+
+        qr_codes = list(UserQRCode.objects.only('id', 'user_id', 'qr_code_data', 'qr_code_image'))
+        for qr_code in qr_codes:
+            # Upgrade legacy JSON codes to signed tokens
+            if not is_token(qr_code.qr_code_data):
+                qr_code.qr_code_data = qr_code.generate_qr_data()
+
+        # Render each distinct payload once, skipping images already on disk
+        pending = {}
+        for qr_code in qr_codes:
+            digest = payload_digest(qr_code.qr_code_data)
+            if not qr_service.exists(digest):
+                pending[digest] = qr_code.qr_code_data
+
+        self.stdout.write(f'Rendering {len(pending)} QR images with {workers} workers...')
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for digest, png in executor.map(render_for_pool, pending.values(), chunksize=32):
+                qr_service.store(digest, png)
+                rendered += 1
+                if rendered % 100 == 0:
+                    self.stdout.write(f'  {rendered}/{len(pending)} rendered')
+
+        # Point every record at its content-addressed image
+        changed = []
+        for qr_code in qr_codes:
+            image_name = qr_service.storage_name(payload_digest(qr_code.qr_code_data))
+            if qr_code.qr_code_image.name != image_name:
+                qr_code.qr_code_image.name = image_name
+                changed.append(qr_code)
+        UserQRCode.objects.bulk_update(changed, ['qr_code_data', 'qr_code_image'], batch_size=batch_size)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rendered {rendered} images and updated {len(changed)} of {len(qr_codes)} QR records'
+            )
+        )
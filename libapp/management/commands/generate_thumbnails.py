@@ -0,0 +1,63 @@
+"""
+Django management command to build responsive cover thumbnails
+Run with: python manage.py generate_thumbnails --workers 4
+"""
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from libapp.models import Book, DigitalBook
+from libapp.thumbnails import manifest_name, thumbnail_service
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/JPEG thumbnail variants for book and digital book covers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes used to resize images',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild variants even when an up-to-date manifest exists',
+        )
+
+    def handle(self, *args, **options):
+        names = set(Book.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True))
+        names |= set(
+            DigitalBook.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+            .values_list('cover_image', flat=True)
+        )
+
+        media_root = thumbnail_service.media_root
+        missing = sorted(name for name in names if not thumbnail_service.has_source(name))
+        names = sorted(names - set(missing))
+        if not options['force']:
+            # build_variants also skips unchanged images; this just avoids dispatching them
+            names = [name for name in names if not os.path.exists(os.path.join(media_root, manifest_name(name)))]
+
+        self.stdout.write(f'Generating thumbnails for {len(names)} images with {options["workers"]} workers...')
+        done = 0
+
+        def progress(name, error):
+            nonlocal done
+            done += 1
+            if error:
+                self.stdout.write(self.style.ERROR(f'[{done}/{len(names)}] {name}: {error}'))
+            elif done % 50 == 0 or done == len(names):
+                self.stdout.write(f'[{done}/{len(names)}] generated')
+
+        generated, errors = thumbnail_service.generate_all(
+            names, workers=max(1, options['workers']), force=options['force'], progress=progress,
+        )
+
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{len(missing)} referenced images are missing from MEDIA_ROOT'))
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated thumbnails for {generated} images ({len(errors)} errors)')
+        )
@@ -0,0 +1,60 @@
+"""
+Django management command to import physical books from a CSV or XLSX file
+Run with: python manage.py import_books semester_list.xlsx --images-dir covers/
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from libapp.book_import import CHUNK_SIZE, CoverSource, import_books, iter_book_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import or update physical books from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Inventory file (.csv or .xlsx)')
+        parser.add_argument(
+            '--images-dir',
+            help='Directory holding the cover files named in the image column',
+        )
+        parser.add_argument(
+            '--covers-zip',
+            help='ZIP archive holding the cover files named in the image column',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Rows validated and written per batch',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            covers = CoverSource(directory=options['images_dir'], archive=options['covers_zip'], allow_urls=True)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot open covers: {e}')
+
+        def progress(first_row, report):
+            self.stdout.write(f'  from row {first_row}: {report}')
+
+        try:
+            with open(options['path'], 'rb') as sheet:
+                report = import_books(
+                    iter_book_rows(sheet, options['path']),
+                    covers=covers,
+                    chunk_size=options['chunk_size'],
+                    progress=progress,
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            covers.close()
+
+        if report.ignored_columns:
+            self.stdout.write(
+                self.style.WARNING(f'Ignored unknown columns: {", ".join(sorted(report.ignored_columns))}')
+            )
+        for row_number, message in report.errors:
+            self.stdout.write(self.style.ERROR(f'Row {row_number}: {message}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Books: {report}'))
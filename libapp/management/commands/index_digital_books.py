@@ -0,0 +1,60 @@
+"""
+Django management command to extract and index the text of digital book PDFs
+Run with: python manage.py index_digital_books --workers 4
+"""
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from libapp.book_indexer import index_books
+from libapp.models import DigitalBook
+
+
+class Command(BaseCommand):
+    help = 'Extract per-page text from digital book PDFs and add it to the full-text index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes used to extract PDF text',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-index books that already have extracted pages',
+        )
+        parser.add_argument(
+            '--book-id',
+            type=int,
+            action='append',
+            dest='book_ids',
+            help='Only index the given book (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        books = DigitalBook.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True)
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+        if not options['force']:
+            books = books.filter(pages__isnull=True)
+        books = list(books.only('id', 'title', 'pdf_file'))
+
+        self.stdout.write(f'Indexing {len(books)} digital books with {options["workers"]} workers...')
+        titles = {book.id: book.title for book in books}
+
+        def progress(book_id, error):
+            if error:
+                self.stdout.write(f'❌ {titles[book_id]}: {error}')
+            else:
+                self.stdout.write(f'Indexed: {titles[book_id]}')
+
+        indexed_books, indexed_pages, errors = index_books(books, workers=max(1, options['workers']), progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully indexed {indexed_pages} pages from {indexed_books} books ({len(errors)} failed)'
+            )
+        )
@@ -0,0 +1,56 @@
+"""
+Django management command to upsert catalog rows from a file
+Run with: python manage.py load_catalog books.csv --key title,author
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from libapp.catalog_loader import CatalogLoader, read_catalog
+
+
+class Command(BaseCommand):
+    help = 'Idempotently load catalog rows from a JSON, JSONL or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file (.json, .jsonl or .csv)')
+        parser.add_argument(
+            '--model',
+            default='DigitalBook',
+            help='libapp model to load into',
+        )
+        parser.add_argument(
+            '--key',
+            default='title,author',
+            help='Comma-separated natural key fields',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk database write',
+        )
+
+    def progress(self, rows, summary):
+        self.stdout.write(f'  {rows} rows read: {summary}')
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model('libapp', options['model'])
+            loader = CatalogLoader(
+                model,
+                key_fields=[name.strip() for name in options['key'].split(',') if name.strip()],
+                batch_size=options['batch_size'],
+            )
+            summary = loader.load_stream(read_catalog(options['path']), progress=self.progress)
+        except (LookupError, ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        if summary.ignored_columns:
+            self.stdout.write(
+                self.style.WARNING(f'Ignored unknown columns: {", ".join(sorted(summary.ignored_columns))}')
+            )
+        for row_number, message in summary.errors:
+            self.stdout.write(self.style.ERROR(f'Row {row_number}: {message}'))
+
+        self.stdout.write(self.style.SUCCESS(f'{model.__name__}: {summary}'))
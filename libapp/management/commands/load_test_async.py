@@ -0,0 +1,143 @@
+"""
+Django management command to load test the async views against a local stub of the upstream services
+Run with: python manage.py load_test_async --requests 200 --concurrency 50 --latency 300 --threads 8
+"""
+
+import asyncio
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from libapp.free_books_service import free_books_service
+
+
+class _SlowUpstreamHandler(BaseHTTPRequestHandler):
+    """Answers like Open Library's search API after a fixed delay"""
+    latency = 0.3
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = json.dumps({'docs': []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub(latency):
+    handler = type('StubHandler', (_SlowUpstreamHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _paths(count):
+    # Unique queries with no local matches, so every request misses the page cache and calls upstream
+    return [f'/explore/?q=zz-{uuid.uuid4().hex[:12]}' for _ in range(count)]
+
+
+def _summary(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return (
+        f'{label:>5}: {len(latencies) / elapsed:7.1f} req/s  '
+        f'p50 {statistics.median(latencies) * 1000:6.0f} ms  p95 {p95 * 1000:6.0f} ms  '
+        f'wall {elapsed:5.2f}s'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare the ASGI and WSGI entry points on explore searches that wait on a slow upstream stub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per run')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--latency', type=float, default=300, help='Stub upstream latency in ms')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='WSGI worker threads, as a threaded gunicorn worker would have')
+
+    def run_wsgi(self, paths, options):
+        from django.core.wsgi import get_wsgi_application
+        application = get_wsgi_application()
+        factory = RequestFactory()
+
+        def call(path):
+            environ = factory.get(path).environ
+            environ['HTTP_HOST'] = 'localhost'
+            status = []
+            start = time.perf_counter()
+            b''.join(application(environ, lambda s, h, *a: status.append(s)))
+            return time.perf_counter() - start, status[0]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(call, paths))
+        return results, time.perf_counter() - start
+
+    def run_asgi(self, paths, options):
+        from library.asgi import application
+
+        async def call(path, semaphore):
+            route, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': route, 'raw_path': route.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'localhost')],
+                'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            async with semaphore:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                return time.perf_counter() - start, str(sent[0]['status'])
+
+        async def main():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            start = time.perf_counter()
+            results = await asyncio.gather(*(call(path, semaphore) for path in paths))
+            return results, time.perf_counter() - start
+
+        return asyncio.run(main())
+
+    def handle(self, *args, **options):
+        stub = _start_stub(options['latency'] / 1000)
+        free_books_service.open_library_search_url = f'http://127.0.0.1:{stub.server_port}/search.json'
+        if 'localhost' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'localhost']
+
+        self.stdout.write(
+            f'{options["requests"]} requests, upstream latency {options["latency"]:.0f} ms, '
+            f'ASGI concurrency {options["concurrency"]}, WSGI threads {options["threads"]}'
+        )
+        try:
+            for label, runner in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                results, elapsed = runner(_paths(options['requests']), options)
+                failures = [status for _, status in results if not status.startswith('200')]
+                line = _summary(label, [latency for latency, _ in results], elapsed)
+                if failures:
+                    line += f'  ({len(failures)} non-200: {failures[0]})'
+                self.stdout.write(line)
+        finally:
+            stub.shutdown()
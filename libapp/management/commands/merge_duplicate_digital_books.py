@@ -0,0 +1,67 @@
+"""
+Django management command to report, and optionally merge, digital books that share a (title, author) pair
+Run with: python manage.py merge_duplicate_digital_books [--merge]
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.migrations.loader import MigrationLoader
+
+# The models as of the last migration before the unique constraint: this
+# command has to run while migrate is blocked on duplicates, when later
+# tables (and the signals that write to them) may not exist yet
+STATE_BEFORE_CONSTRAINT = ('libapp', '0010_digitalbookpage')
+
+
+class Command(BaseCommand):
+    help = 'List digital books that share a title and author; with --merge keep the oldest row of each group'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help='Move access records onto the oldest row and delete the other rows with their extracted pages',
+        )
+
+    def handle(self, *args, **options):
+        apps = MigrationLoader(connection).project_state(STATE_BEFORE_CONSTRAINT).apps
+        DigitalBook = apps.get_model('libapp', 'DigitalBook')
+        DigitalBookAccess = apps.get_model('libapp', 'DigitalBookAccess')
+
+        duplicates = list(
+            DigitalBook.objects.values('title', 'author')
+            .annotate(row_count=models.Count('id'), keep_id=models.Min('id'))
+            .filter(row_count__gt=1)
+            .order_by('title', 'author')
+        )
+        if not duplicates:
+            self.stdout.write(self.style.SUCCESS('No duplicate digital books'))
+            return
+
+        merged_ids = []
+        with transaction.atomic():
+            for duplicate in duplicates:
+                extra_ids = list(
+                    DigitalBook.objects.filter(title=duplicate['title'], author=duplicate['author'])
+                    .exclude(id=duplicate['keep_id'])
+                    .values_list('id', flat=True)
+                )
+                self.stdout.write(
+                    f'{duplicate["title"]!r} by {duplicate["author"]!r}: keep #{duplicate["keep_id"]}, '
+                    f'duplicates {", ".join(f"#{pk}" for pk in extra_ids)}'
+                )
+                if options['merge']:
+                    DigitalBookAccess.objects.filter(digital_book_id__in=extra_ids).update(
+                        digital_book_id=duplicate['keep_id']
+                    )
+                    DigitalBook.objects.filter(id__in=extra_ids).delete()
+                    merged_ids.append(duplicate['keep_id'])
+
+        if not options['merge']:
+            self.stdout.write(f'{len(duplicates)} duplicate groups; run again with --merge to merge them')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {len(duplicates)} duplicate groups. Re-index the kept books with: '
+            f'python manage.py index_digital_books --force '
+            + ' '.join(f'--book-id {pk}' for pk in merged_ids)
+        ))
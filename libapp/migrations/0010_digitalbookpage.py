@@ -0,0 +1,80 @@
+# Generated by Django 4.2.3 on 2026-10-19 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FTS_TABLE = 'libapp_digitalbookpage_fts'
+
+# External-content FTS5 index kept in sync with libapp_digitalbookpage by triggers.
+# The trigram tokenizer matches substrings in any script, including Kannada.
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='libapp_digitalbookpage', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS libapp_digitalbookpage_ai AFTER INSERT ON libapp_digitalbookpage BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS libapp_digitalbookpage_ad AFTER DELETE ON libapp_digitalbookpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS libapp_digitalbookpage_au AFTER UPDATE ON libapp_digitalbookpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+SQLITE_FTS_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS libapp_digitalbookpage_ai',
+    'DROP TRIGGER IF EXISTS libapp_digitalbookpage_ad',
+    'DROP TRIGGER IF EXISTS libapp_digitalbookpage_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def create_fts_index(apps, schema_editor):
+    """Create the full-text index on SQLite builds with FTS5; other backends fall back to icontains"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            for statement in SQLITE_FTS_SQL:
+                cursor.execute(statement)
+    except Exception as e:
+        print(f"Full-text index not created (FTS5 trigram unavailable): {str(e)}")
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in SQLITE_FTS_DROP_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libapp', '0009_userqrcode_qrscanlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigitalBookPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('indexed_date', models.DateTimeField(auto_now=True)),
+                ('digital_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='libapp.digitalbook')),
+            ],
+            options={
+                'ordering': ['digital_book', 'page_number'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='digitalbookpage',
+            constraint=models.UniqueConstraint(fields=('digital_book', 'page_number'), name='unique_digital_book_page'),
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
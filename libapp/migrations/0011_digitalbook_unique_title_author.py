@@ -0,0 +1,41 @@
+# Generated by Django 4.2.3 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+def check_duplicate_digital_books(apps, schema_editor):
+    """
+    Earlier seeding commands matched on title only, so the same (title, author)
+    may exist more than once. Merging them deletes rows (and their extracted
+    pages), so it is left to an explicit command instead of this migration.
+    """
+    DigitalBook = apps.get_model('libapp', 'DigitalBook')
+    duplicates = list(
+        DigitalBook.objects.values('title', 'author')
+        .annotate(row_count=models.Count('id'))
+        .filter(row_count__gt=1)
+        .order_by('title', 'author')
+    )
+    if duplicates:
+        report = '\n'.join(
+            f'  {row["title"]!r} by {row["author"]!r}: {row["row_count"]} rows' for row in duplicates
+        )
+        raise RuntimeError(
+            f'Duplicate digital books block the unique (title, author) constraint:\n{report}\n'
+            'Review them, or run "python manage.py merge_duplicate_digital_books --merge", then migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libapp', '0010_digitalbookpage'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_digital_books, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='digitalbook',
+            constraint=models.UniqueConstraint(fields=('title', 'author'), name='unique_digital_book_title_author'),
+        ),
+    ]
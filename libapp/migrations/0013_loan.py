@@ -0,0 +1,68 @@
+# Generated by Django 4.2.3 on 2026-10-19 17:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def backfill_loans(apps, schema_editor):
+    """Index the loans currently held in CustomUser.books"""
+    CustomUser = apps.get_model('libapp', 'CustomUser')
+    Book = apps.get_model('libapp', 'Book')
+    Loan = apps.get_model('libapp', 'Loan')
+
+    def parse(value):
+        parsed = timezone.datetime.fromisoformat(value)
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    book_ids = set(Book.objects.values_list('pk', flat=True))
+    now = timezone.now()
+    loans = []
+    for user in CustomUser.objects.exclude(books=[]).only('id', 'books').iterator(chunk_size=500):
+        seen = set()
+        for entry in user.books or []:
+            if not entry.get('start_date') or not entry.get('end_date'):
+                continue
+            title = str(entry.get('title', ''))[:100]
+            start_date = parse(entry['start_date'])
+            if (title, start_date) in seen:
+                continue
+            seen.add((title, start_date))
+            book_id = entry.get('id')
+            book_id = int(book_id) if str(book_id).isdigit() else None
+            loans.append(Loan(
+                user_id=user.id,
+                book_id=book_id if book_id in book_ids else None,
+                title=title,
+                start_date=start_date,
+                end_date=parse(entry['end_date']),
+                returned_at=now if entry.get('is_returned') else None,
+            ))
+    Loan.objects.bulk_create(loans, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libapp', '0012_book_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Loan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField()),
+                ('returned_at', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='libapp.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['end_date'], name='loan_active_due_idx'), models.Index(fields=['user', 'returned_at'], name='loan_user_returned_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_loans, migrations.RunPython.noop),
+    ]
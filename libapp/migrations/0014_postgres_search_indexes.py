@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Columns searched with icontains. Django renders those lookups as
+# UPPER(col::text) LIKE UPPER(%s), so the trigram indexes use the same expression.
+TRIGRAM_COLUMNS = [
+    ('libapp_book', 'title'),
+    ('libapp_book', 'author'),
+    ('libapp_book', 'subject'),
+    ('libapp_digitalbook', 'title'),
+    ('libapp_digitalbook', 'author'),
+    ('libapp_digitalbook', 'category'),
+    ('libapp_digitalbookpage', 'text'),
+    ('libapp_customuser', 'username'),
+    ('libapp_customuser', 'email'),
+    ('libapp_customuser', 'first_name'),
+    ('libapp_customuser', 'last_name'),
+]
+
+
+def index_name(table, column):
+    return f'{table}_{column}_trgm'
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """PostgreSQL only: SQLite has no trigram indexes and keeps scanning for substring matches"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name(table, column)} '
+            f'ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name(table, column)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libapp', '0013_loan'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.3 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+def backfill_journal(apps, schema_editor):
+    """Journal the current catalog as inserts, so a client syncing from the start gets every row"""
+    CatalogChange = apps.get_model('libapp', 'CatalogChange')
+    for name in ('Book', 'DigitalBook'):
+        model = apps.get_model('libapp', name)
+        pks = model.objects.order_by('pk').values_list('pk', flat=True)
+        CatalogChange.objects.bulk_create(
+            [CatalogChange(model=model._meta.model_name, object_id=pk, action='insert') for pk in pks.iterator()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libapp', '0014_postgres_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], max_length=6)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_journal, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,118 @@
-from django.db import models
+from django.db import connections, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from decimal import Decimal
 
+from .cache_service import bump_model_version
+from .response_cache import invalidate_catalog
+
+
+def is_journaled_change(model, field_names):
+    """
+    Whether writing these fields changes what the catalog feed serves.
+    auto_now stamps and the model's UNJOURNALED_FIELDS (files the API does
+    not expose) do not; None, meaning every field, does.
+    """
+    if field_names is None:
+        return True
+    skipped = set(getattr(model, 'UNJOURNALED_FIELDS', ()))
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False):
+            skipped.update((field.name, field.attname))
+    return not set(field_names) <= skipped
+
+
+class CatalogQuerySet(models.QuerySet):
+    """
+    QuerySet for the catalog models. Bulk writes skip the save signals that
+    feed the CatalogChange journal and retire cached pages, so update()
+    (which bulk_update() goes through) and bulk_create() record their rows,
+    bump the version counters on commit and stamp auto_now columns themselves.
+    """
+
+    def _written(self):
+        invalidate_catalog()
+        bump_model_version(self.model)
+
+    def _journal_matching(self, now):
+        """
+        Journal an update of every matching row with one INSERT ... SELECT,
+        so hot updates such as stock counters never read the keys back
+        """
+        connection = connections[self.db]
+        select_sql, params = self.order_by().values('pk').query.get_compiler(self.db).as_sql()
+        quote = connection.ops.quote_name
+        pk_column = quote(self.model._meta.pk.column)
+        columns = ', '.join(quote(name) for name in ('model', 'object_id', 'action', 'changed_at'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(CatalogChange._meta.db_table)} ({columns}) '
+                f'SELECT %s, matching.{pk_column}, %s, %s FROM ({select_sql}) matching',
+                [self.model._meta.model_name, CatalogChange.UPDATE,
+                 connection.ops.adapt_datetimefield_value(now), *params],
+            )
+
+    def update(self, **kwargs):
+        now = timezone.now()
+        journaled = is_journaled_change(self.model, kwargs)
+        for field in self.model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):
+                kwargs.setdefault(field.attname, now)
+        with transaction.atomic(using=self.db):
+            # Before the update, so a filter on an updated column still selects the same rows
+            if journaled:
+                self._journal_matching(now)
+            updated = super().update(**kwargs)
+            if updated:
+                self._written()
+        return updated
+    update.alters_data = True
+
+    def _pks_by_key(self, objs, fields):
+        # Any manager may hide rows (Book hides tombstones); the key lookup must see them all
+        lead = fields[0]
+        queryset = self.model._base_manager.using(self.db).filter(
+            **{f'{lead}__in': {getattr(obj, lead) for obj in objs}}
+        )
+        return {tuple(row[1:]): row[0] for row in queryset.values_list('pk', *fields)}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        unique_fields = kwargs.get('unique_fields') if kwargs.get('update_conflicts') else None
+        with transaction.atomic(using=self.db):
+            if unique_fields:
+                # Upserts do not return primary keys; tell inserts from updates by the conflict key
+                before = self._pks_by_key(objs, unique_fields)
+            created = super().bulk_create(objs, *args, **kwargs)
+            if unique_fields:
+                after = self._pks_by_key(objs, unique_fields)
+                keys = {tuple(getattr(obj, name) for name in unique_fields) for obj in objs}
+                CatalogChange.record(self.model, [after[key] for key in keys if key in after and key not in before], CatalogChange.INSERT)
+                CatalogChange.record(self.model, [before[key] for key in keys if key in before], CatalogChange.UPDATE)
+            else:
+                CatalogChange.record(self.model, [obj.pk for obj in objs if obj.pk is not None], CatalogChange.INSERT)
+            if objs:
+                self._written()
+        return created
+    bulk_create.alters_data = True
+
+
+class BookQuerySet(CatalogQuerySet):
+    def delete(self):
+        """Tombstone the books one by one so the save signals retire caches and journal the removal"""
+        with transaction.atomic(using=self.db):
+            books = list(self.filter(deleted_at__isnull=True))
+            for book in books:
+                book.delete()
+        return len(books), {self.model._meta.label: len(books)}
+    delete.alters_data = True
+
+
+class BookManager(models.Manager.from_queryset(BookQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 # Create your models here.
 class Book(models.Model):
     title = models.CharField(max_length=100)
@@ -13,9 +123,31 @@ class Book(models.Model):
     subject = models.CharField(max_length=100)
     # store uploads under MEDIA_ROOT/book_covers/ (avoid double 'media/media' path)
     image = models.ImageField(upload_to='book_covers/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Deleted books are kept as tombstones so delta-sync clients can learn about the removal
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # `objects` hides tombstones; `all_objects` includes them
+    objects = BookManager()
+    all_objects = models.Manager.from_queryset(BookQuerySet)()
+
+    class Meta:
+        # Sort and filter columns of the librarian dashboard's paginated book table
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['author'], name='book_author_idx'),
+            models.Index(fields=['subject'], name='book_subject_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def delete(self, using=None, keep_parents=False):
+        if self.deleted_at is not None:
+            return 0, {}
+        self.deleted_at = timezone.now()
+        self.save(using=using, update_fields=['deleted_at', 'updated_at'])
+        return 1, {self._meta.label: 1}
     
 class CustomUser(AbstractUser):
     email = models.EmailField()
@@ -116,6 +248,89 @@ class Librarian(models.Model):
     def __str__(self):
         return self.user.username
 
+# Model for Loan: a relational index over CustomUser.books so loan state can be queried in SQL
+class Loan(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='loan_records')
+    # Books are tombstoned (Book.delete), so SET_NULL only runs for a hard delete made around it
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, blank=True)
+    title = models.CharField(max_length=100)  # Store book title separately in case book is deleted
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+    returned_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Active loans ordered by due date, as listed on the status page
+            models.Index(fields=['end_date'], condition=models.Q(returned_at__isnull=True), name='loan_active_due_idx'),
+            models.Index(fields=['user', 'returned_at'], name='loan_user_returned_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.title}"
+
+    @staticmethod
+    def parse_date(value):
+        if not value:
+            return None
+        parsed = timezone.datetime.fromisoformat(value)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    @classmethod
+    def sync_for_user(cls, user):
+        """
+        Bring the user's Loan rows in line with `user.books`. Entries that
+        left the JSON list were returned, so their rows are closed rather
+        than deleted; new entries are inserted and extended ones updated.
+        """
+        entries = {}
+        for entry in user.books or []:
+            start_date = cls.parse_date(entry.get('start_date'))
+            end_date = cls.parse_date(entry.get('end_date'))
+            if start_date is None or end_date is None:
+                continue
+            entries[(str(entry.get('title', ''))[:100], start_date)] = (entry, end_date)
+
+        now = timezone.now()
+        known = {
+            (loan.title, loan.start_date): loan
+            for loan in cls.objects.filter(user=user).filter(
+                models.Q(returned_at__isnull=True) | models.Q(start_date__in=[key[1] for key in entries])
+            )
+        }
+
+        to_close = [loan for key, loan in known.items() if key not in entries and loan.returned_at is None]
+        to_update = []
+        to_create = []
+        for (title, start_date), (entry, end_date) in entries.items():
+            book_id = entry.get('id')
+            book_id = int(book_id) if str(book_id).isdigit() else None
+            loan = known.get((title, start_date))
+            if loan is None:
+                to_create.append(cls(
+                    user=user, book_id=book_id, title=title, start_date=start_date, end_date=end_date,
+                    returned_at=now if entry.get('is_returned') else None,
+                ))
+                continue
+            returned = bool(entry.get('is_returned'))
+            if loan.end_date != end_date or returned != (loan.returned_at is not None):
+                loan.end_date = end_date
+                loan.returned_at = (loan.returned_at or now) if returned else None
+                to_update.append(loan)
+
+        for loan in to_close:
+            loan.returned_at = now
+        if to_create:
+            # Loans may reference books that have since been deleted
+            existing = set(Book.objects.filter(pk__in={loan.book_id for loan in to_create}).values_list('pk', flat=True))
+            for loan in to_create:
+                if loan.book_id not in existing:
+                    loan.book_id = None
+            cls.objects.bulk_create(to_create)
+        if to_close or to_update:
+            cls.objects.bulk_update(to_close + to_update, ['end_date', 'returned_at'])
+
 # Model for Payment
 class Payment(models.Model):
     PAYMENT_TYPE_CHOICES = [
@@ -201,10 +416,76 @@ class DigitalBook(models.Model):
     is_active = models.BooleanField(default=True)
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
+
+    # Stored files are not part of the catalog API, so writing only these is not journaled
+    UNJOURNALED_FIELDS = ('pdf_file', 'word_file')
+
+    objects = CatalogQuerySet.as_manager()
+    
+    class Meta:
+        constraints = [
+            # Natural key used by the catalog loader's upserts
+            models.UniqueConstraint(fields=['title', 'author'], name='unique_digital_book_title_author'),
+        ]
     
     def __str__(self):
         return self.title
 
+# Model for the catalog change journal read by delta-sync clients
+class CatalogChange(models.Model):
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (INSERT, 'Insert'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+
+    model = models.CharField(max_length=20)  # model_name of the changed row: 'book' or 'digitalbook'
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.action} {self.model} #{self.object_id}"
+
+    @classmethod
+    def record(cls, model, pks, action):
+        """Journal one change per primary key; the auto-increment id is the sync cursor"""
+        cls.objects.bulk_create(
+            [cls(model=model._meta.model_name, object_id=pk, action=action) for pk in pks],
+            batch_size=1000,
+        )
+
+    @classmethod
+    def compact(cls, before):
+        """
+        Delete entries older than `before` except the latest one for each
+        row. A client on any cursor still learns every row that changed
+        after it, since the feed serves each row's current state, and the
+        journal stays about as large as the catalog plus recent history.
+        """
+        latest = cls.objects.values('model', 'object_id').annotate(last=models.Max('pk')).values('last')
+        deleted, _ = cls.objects.filter(changed_at__lt=before).exclude(pk__in=latest).delete()
+        return deleted
+
+# Model for text extracted from a digital book PDF, one row per page
+class DigitalBookPage(models.Model):
+    digital_book = models.ForeignKey(DigitalBook, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+    indexed_date = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['digital_book', 'page_number']
+        constraints = [
+            models.UniqueConstraint(fields=['digital_book', 'page_number'], name='unique_digital_book_page'),
+        ]
+    
+    def __str__(self):
+        return f"{self.digital_book.title} - Page {self.page_number}"
+
 # Model for Digital Book Access
 class DigitalBookAccess(models.Model):
     ACCESS_TYPE_CHOICES = [
@@ -263,6 +544,11 @@ class QRPayment(models.Model):
     def is_expired(self):
         from django.utils import timezone
         return timezone.now() > self.expires_at
+    
+    @property
+    def qr_image_url(self):
+        from .qr_service import qr_service
+        return qr_service.image_url(self.qr_code_image)
 
 # Model for Mobile Notifications
 class MobileNotification(models.Model):
@@ -315,6 +601,22 @@ class MobileNotification(models.Model):
         
         return bima_id
     
+    @classmethod
+    def generate_bima_ids(cls, count):
+        """Generate `count` unique BIMA IDs with one lookup per round, for bulk_create"""
+        import random
+        import string
+        
+        ids = set()
+        while len(ids) < count:
+            candidates = {
+                f"BIMA-{''.join(random.choices(string.ascii_uppercase + string.digits, k=8))}"
+                for _ in range(count - len(ids))
+            }
+            candidates -= set(cls.objects.filter(bima_id__in=candidates).values_list('bima_id', flat=True))
+            ids |= candidates
+        return list(ids)
+    
     def save(self, *args, **kwargs):
         if not self.bima_id:
             self.bima_id = self.generate_bima_id()
@@ -337,20 +639,15 @@ class UserQRCode(models.Model):
         return f"QR Code - {self.user.username}"
     
     def generate_qr_data(self):
-        """Generate QR code data with user information"""
-        import json
-        from django.utils import timezone
+        """Generate a compact signed token identifying the user"""
+        from .qr_tokens import make_token
         
-        user_data = {
-            'user_id': self.user.id,
-            'username': self.user.username,
-            'email': self.user.email,
-            'phone': self.user.phone,
-            'full_name': f"{self.user.first_name} {self.user.last_name}".strip(),
-            'is_librarian': self.user.is_librarian,
-            'created_date': (self.created_date or timezone.now()).isoformat(),
-        }
-        return json.dumps(user_data)
+        return make_token(self.user_id)
+    
+    @property
+    def qr_image_url(self):
+        from .qr_service import qr_service
+        return qr_service.image_url(self.qr_code_image)
     
     def save(self, *args, **kwargs):
         if not self.qr_code_data:
@@ -0,0 +1,109 @@
+"""
+QR Code Rendering Service for ReadOps Library Management System
+Renders QR images once per payload and stores them content-addressed under MEDIA_ROOT
+"""
+
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.urls import reverse
+
+from .file_utils import atomic_write
+
+# Bump when the rendering style changes so old images are not reused
+STYLE_VERSION = 'v1'
+CACHE_DIR = 'qr_cache'
+
+
+def payload_digest(data: str) -> str:
+    """Content address for a QR payload and the current rendering style"""
+    return hashlib.sha256(f'{STYLE_VERSION}\n{data}'.encode('utf-8')).hexdigest()
+
+
+def render_png(data: str) -> bytes:
+    """
+    Render a QR payload to PNG bytes.
+    Only the payload is needed, so generate_qr_codes can render in worker
+    processes and write the results from the parent via QRCodeService.store.
+    """
+    # Imported on first render so URL loading and management commands skip qrcode and PIL
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_for_pool(data: str):
+    """Worker entry point for bulk rendering; returns (digest, png bytes)"""
+    return payload_digest(data), render_png(data)
+
+
+class QRCodeService:
+    """
+    Content-addressed QR image store.
+    Identical payloads (e.g. the same UPI amount and payee) share one file.
+    """
+
+    @property
+    def media_root(self):
+        return settings.MEDIA_ROOT
+
+    def storage_name(self, digest: str) -> str:
+        """Storage-relative file name for a digest, sharded by prefix"""
+        return f'{CACHE_DIR}/{digest[:2]}/{digest}.png'
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.media_root, self.storage_name(digest))
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def store(self, digest: str, png: bytes) -> str:
+        """
+        Write rendered bytes for a digest if not already present.
+        Writes go through a temp file and an atomic rename so concurrent
+        requests for the same payload never observe a partial image.
+        """
+        target = self.path(digest)
+        if not os.path.exists(target):
+            atomic_write(target, png)
+        return self.storage_name(digest)
+
+    def get_or_create(self, data: str) -> str:
+        """Return the storage name for a payload, rendering it only on first use"""
+        digest = payload_digest(data)
+        if self.exists(digest):
+            return self.storage_name(digest)
+        return self.store(digest, render_png(data))
+
+    def digest_from_name(self, name: str):
+        """Extract the digest from a cached storage name, or None for legacy files"""
+        if not name or not name.startswith(f'{CACHE_DIR}/'):
+            return None
+        return os.path.splitext(os.path.basename(name))[0]
+
+    def image_url(self, image_field):
+        """URL for a QR ImageField, preferring the immutable cached route"""
+        if not image_field:
+            return ''
+        digest = self.digest_from_name(image_field.name)
+        if digest:
+            return reverse('qr_image', args=[digest])
+        return image_field.url
+
+
+# Create a global instance
+qr_service = QRCodeService()
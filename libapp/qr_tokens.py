@@ -0,0 +1,130 @@
+"""
+Compact signed QR tokens for ReadOps Library Management System
+Encodes a user id and issue time with an HMAC so scans can be trusted without a database lookup
+"""
+
+import base64
+import binascii
+import json
+import struct
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .cache_service import get_namespace
+
+TOKEN_PREFIX = 'RO1:'
+TOKEN_SALT = 'libapp.qr_tokens.user'
+# 80-bit truncated HMAC keeps the token short while staying unforgeable in practice
+MAC_LENGTH = 10
+# user id (uint32) + issued-at epoch seconds (uint32)
+PAYLOAD_FORMAT = '>II'
+USER_CACHE_TIMEOUT = 60
+# What the scan page shows about a user; never the password hash or the loan list
+SCAN_PROFILE_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email', 'phone',
+    'is_librarian', 'is_active', 'is_staff', 'date_joined', 'last_login',
+)
+
+user_cache = get_namespace('qr_tokens', timeout=USER_CACHE_TIMEOUT)
+
+QRToken = namedtuple('QRToken', ['user_id', 'issued_at'])
+
+
+class QRTokenError(ValueError):
+    """Raised when scanned QR data cannot be verified"""
+
+
+def _sign(payload):
+    return salted_hmac(TOKEN_SALT, payload, algorithm='sha256').digest()[:MAC_LENGTH]
+
+
+def make_token(user_id, issued_at=None):
+    """
+    Build a signed token for the given user.
+    The token uses only upper-case base32 characters so QR encoders can
+    use alphanumeric mode, which yields a smaller, lower-version code.
+    """
+    if issued_at is None:
+        issued_at = int(time.time())
+    payload = struct.pack(PAYLOAD_FORMAT, int(user_id), int(issued_at))
+    encoded = base64.b32encode(payload + _sign(payload)).decode('ascii').rstrip('=')
+    return TOKEN_PREFIX + encoded
+
+
+def is_token(data):
+    """Check whether QR data uses the compact token format"""
+    return isinstance(data, str) and data.startswith(TOKEN_PREFIX)
+
+
+def verify_token(token, max_age=None):
+    """
+    Verify a compact token in-process and return a QRToken.
+    No database access happens here; callers fetch user details lazily.
+    """
+    if not is_token(token):
+        raise QRTokenError('Not a ReadOps QR token')
+
+    encoded = token[len(TOKEN_PREFIX):].strip().upper()
+    encoded += '=' * (-len(encoded) % 8)
+    try:
+        raw = base64.b32decode(encoded)
+    except (binascii.Error, ValueError):
+        raise QRTokenError('Malformed QR token')
+
+    payload_size = struct.calcsize(PAYLOAD_FORMAT)
+    if len(raw) != payload_size + MAC_LENGTH:
+        raise QRTokenError('Malformed QR token')
+
+    payload, mac = raw[:payload_size], raw[payload_size:]
+    if not constant_time_compare(mac, _sign(payload)):
+        raise QRTokenError('QR token signature mismatch')
+
+    user_id, issued_at = struct.unpack(PAYLOAD_FORMAT, payload)
+
+    if max_age is None:
+        max_age = getattr(settings, 'QR_TOKEN_MAX_AGE', None)
+    if max_age is not None and time.time() - issued_at > max_age:
+        raise QRTokenError('QR token has expired')
+
+    return QRToken(user_id=user_id, issued_at=issued_at)
+
+
+def parse_qr_data(qr_data):
+    """
+    Resolve scanned QR data to a user id.
+    Compact tokens are verified by signature. Legacy JSON codes generated
+    before the token format are still accepted through a compatibility path.
+    Returns a (user_id, is_legacy) tuple.
+    """
+    qr_data = (qr_data or '').strip()
+    if is_token(qr_data):
+        return verify_token(qr_data).user_id, False
+
+    try:
+        user_data = json.loads(qr_data)
+    except json.JSONDecodeError:
+        raise QRTokenError('Unrecognised QR code data')
+    if not isinstance(user_data, dict) or not user_data.get('user_id'):
+        raise QRTokenError('QR code data is missing a user id')
+    return int(user_data['user_id']), True
+
+
+def get_scan_profile(user_id):
+    """
+    The scanned user's profile fields as a dict, cached briefly for repeat
+    scans and dropped by the user_changed signal whenever the user is saved.
+    Raises CustomUser.DoesNotExist for an unknown id.
+    """
+    from .models import CustomUser
+
+    return user_cache.get_or_set(
+        'profile', user_id,
+        default=lambda: CustomUser.objects.values(*SCAN_PROFILE_FIELDS).get(id=user_id),
+    )
+
+
+def invalidate_scan_profile(user_id):
+    user_cache.delete('profile', user_id)
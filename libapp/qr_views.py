@@ -1,23 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404, HttpResponseNotModified, StreamingHttpResponse
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q
 from django.core.paginator import Paginator
 import json
-import qrcode
 from io import BytesIO
 from django.core.files.base import ContentFile
 import csv
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from .models import CustomUser, UserQRCode, QRScanLog, Book
+from .models import CustomUser, UserQRCode, QRScanLog, Book, Loan
 from .decorators import librarian_required
+from .db_router import read_alias, read_replica
+from .qr_tokens import QRTokenError, get_scan_profile, is_token, parse_qr_data
+from .qr_service import qr_service
 
 
 @login_required
@@ -31,33 +28,15 @@ def generate_user_qr(request):
         defaults={'qr_code_data': ''}
     )
     
-    # Generate QR code image if not exists
-    if not qr_code.qr_code_image:
-        qr_data = qr_code.generate_qr_data()
-        qr_code.qr_code_data = qr_data
-        
-        # Generate QR code image
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save image to model
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        qr_code.qr_code_image.save(
-            f'qr_{user.username}_{user.id}.png',
-            ContentFile(buffer.getvalue()),
-            save=True
-        )
+    # Upgrade legacy JSON codes to signed tokens
+    if not is_token(qr_code.qr_code_data):
+        qr_code.qr_code_data = qr_code.generate_qr_data()
+    
+    # Images are content-addressed, so a changed payload always gets a matching image
+    image_name = qr_service.get_or_create(qr_code.qr_code_data)
+    if qr_code.qr_code_image.name != image_name:
+        qr_code.qr_code_image.name = image_name
+        qr_code.save(update_fields=['qr_code_data', 'qr_code_image', 'updated_date'])
     
     return render(request, 'libapp/user_qr_code.html', {
         'qr_code': qr_code,
@@ -66,6 +45,24 @@ def generate_user_qr(request):
     })
 
 
+@login_required
+def qr_image(request, digest):
+    """Serve a content-addressed QR image with long-lived immutable cache headers"""
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = FileResponse(open(qr_service.path(digest), 'rb'), content_type='image/png')
+        except FileNotFoundError:
+            raise Http404('QR image not found')
+    
+    response['ETag'] = etag
+    # The URL is derived from the image content, so it can never change
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
 @librarian_required
 def qr_scanner(request):
     """QR code scanner interface for librarians"""
@@ -82,16 +79,14 @@ def scan_qr_code(request):
             location = request.POST.get('location', '')
             notes = request.POST.get('notes', '')
             
-            # Parse QR code data
-            user_data = json.loads(qr_data)
-            user_id = user_data.get('user_id')
-            
-            # Get user
-            scanned_user = get_object_or_404(CustomUser, id=user_id)
+            # Verify the signed token in-process; legacy JSON codes resolve to a user id the same way.
+            # The profile is loaded before the log row so an unknown user is reported, not an FK error
+            user_id, _ = parse_qr_data(qr_data)
+            scanned_user = get_scan_profile(user_id)
             
             # Create scan log
             scan_log = QRScanLog.objects.create(
-                scanned_user=scanned_user,
+                scanned_user_id=user_id,
                 scanned_by=request.user,
                 scan_type=scan_type,
                 location=location,
@@ -102,24 +97,22 @@ def scan_qr_code(request):
             
             # Get user's recent activity
             recent_scans = QRScanLog.objects.filter(
-                scanned_user=scanned_user
+                scanned_user_id=user_id
             ).order_by('-scan_timestamp')[:10]
             
-            # Get user's borrowed books
-            borrowed_books = []
-            if scanned_user.books:
-                for book_data in scanned_user.books:
-                    if isinstance(book_data, dict) and book_data.get('book_id'):
-                        try:
-                            book = Book.objects.get(id=book_data['book_id'])
-                            borrowed_books.append({
-                                'book': book,
-                                'borrow_date': book_data.get('borrow_date'),
-                                'due_date': book_data.get('due_date'),
-                                'is_overdue': book_data.get('is_overdue', False)
-                            })
-                        except Book.DoesNotExist:
-                            continue
+            # Get user's borrowed books from the loan index, which is always current
+            now = timezone.now()
+            borrowed_books = [
+                {
+                    'book': loan.book,
+                    'borrow_date': loan.start_date,
+                    'due_date': loan.end_date,
+                    'is_overdue': loan.end_date < now,
+                }
+                for loan in Loan.objects.filter(
+                    user_id=user_id, returned_at__isnull=True, book__isnull=False,
+                ).select_related('book').order_by('end_date')
+            ]
             
             return render(request, 'libapp/user_details.html', {
                 'scanned_user': scanned_user,
@@ -129,7 +122,10 @@ def scan_qr_code(request):
                 'scan_type': scan_type
             })
             
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
+        except CustomUser.DoesNotExist:
+            messages.error(request, 'QR code does not belong to a registered user.')
+            return redirect('qr_scanner')
+        except (QRTokenError, KeyError, ValueError) as e:
             messages.error(request, f'Invalid QR code data: {str(e)}')
             return redirect('qr_scanner')
         except Exception as e:
@@ -203,6 +199,7 @@ def qr_tracking_dashboard(request):
 
 
 @librarian_required
+@read_replica
 def export_scan_data(request):
     """Export scan data in CSV or PDF format"""
     export_format = request.GET.get('format', 'csv')
@@ -231,6 +228,9 @@ def export_scan_data(request):
     if scan_type_filter:
         scans = scans.filter(scan_type=scan_type_filter)
     
+    # The CSV body streams after this view returns, so bind the read alias now
+    scans = scans.using(read_alias())
+    
     if export_format == 'csv':
         return export_csv(scans)
     elif export_format == 'pdf':
@@ -240,37 +240,67 @@ def export_scan_data(request):
         return redirect('qr_tracking_dashboard')
 
 
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a streaming response"""
+    def write(self, value):
+        return value
+
+
+def _export_rows(scans):
+    """
+    Yield (id, user, email, phone, scanned_by, type, timestamp, location, notes, ip)
+    tuples. iterator() reads through a server-side cursor on PostgreSQL and in
+    chunks elsewhere, so large exports never hold every row in memory.
+    """
+    scan_types = dict(QRScanLog.SCAN_TYPE_CHOICES)
+    rows = scans.values_list(
+        'id', 'scanned_user__username', 'scanned_user__email', 'scanned_user__phone',
+        'scanned_by__username', 'scan_type', 'scan_timestamp', 'location', 'notes', 'ip_address',
+    )
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield row[:5] + (scan_types.get(row[5], row[5]),) + row[6:]
+
+
 def export_csv(scans):
     """Export scan data as CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="qr_scan_logs.csv"'
+    writer = csv.writer(_Echo())
     
-    writer = csv.writer(response)
-    writer.writerow([
-        'Scan ID', 'Scanned User', 'User Email', 'User Phone', 'Scanned By',
-        'Scan Type', 'Scan Date', 'Scan Time', 'Location', 'Notes', 'IP Address'
-    ])
-    
-    for scan in scans:
-        writer.writerow([
-            scan.id,
-            scan.scanned_user.username,
-            scan.scanned_user.email,
-            scan.scanned_user.phone,
-            scan.scanned_by.username,
-            scan.get_scan_type_display(),
-            scan.scan_date,
-            scan.scan_time,
-            scan.location or '',
-            scan.notes or '',
-            scan.ip_address or ''
+    def stream():
+        yield writer.writerow([
+            'Scan ID', 'Scanned User', 'User Email', 'User Phone', 'Scanned By',
+            'Scan Type', 'Scan Date', 'Scan Time', 'Location', 'Notes', 'IP Address'
         ])
-    
+        for scan_id, username, email, phone, scanned_by, scan_type, timestamp, location, notes, ip_address in _export_rows(scans):
+            yield writer.writerow([
+                scan_id,
+                username,
+                email,
+                phone,
+                scanned_by,
+                scan_type,
+                timestamp.date(),
+                timestamp.time(),
+                location or '',
+                notes or '',
+                ip_address or ''
+            ])
+    
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="qr_scan_logs.csv"'
     return response
 
 
 def export_pdf(scans):
     """Export scan data as PDF"""
+    # reportlab is heavy; load it only when a PDF is actually requested
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="qr_scan_logs.pdf"'
     
@@ -305,16 +335,16 @@ def export_pdf(scans):
     # Table data
     table_data = [['Scan ID', 'User', 'Email', 'Scanned By', 'Type', 'Date', 'Time', 'Location']]
     
-    for scan in scans:
+    for scan_id, username, email, _, scanned_by, scan_type, timestamp, location, _, _ in _export_rows(scans):
         table_data.append([
-            str(scan.id),
-            scan.scanned_user.username,
-            scan.scanned_user.email,
-            scan.scanned_by.username,
-            scan.get_scan_type_display(),
-            str(scan.scan_date),
-            str(scan.scan_time),
-            scan.location or 'N/A'
+            str(scan_id),
+            username,
+            email,
+            scanned_by,
+            scan_type,
+            str(timestamp.date()),
+            str(timestamp.time()),
+            location or 'N/A'
         ])
     
     # Create table
@@ -0,0 +1,163 @@
+"""
+Online Reader Service for ReadOps Library Management System
+Extracts text and page images from stored PDFs one page at a time and caches them on disk
+"""
+
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.utils.html import linebreaks
+
+from .file_utils import atomic_write
+
+# Scale of rendered page images relative to 72 dpi (1.5 -> 108 dpi)
+PAGE_IMAGE_SCALE = 1.5
+PREFETCH_PAGES = 2
+
+
+class ReaderError(Exception):
+    """Raised when a stored PDF cannot be opened or parsed"""
+
+
+class BookReaderService:
+    """
+    Per-page reader pipeline for DigitalBook PDFs.
+    Artifacts live under READER_CACHE_DIR/<book id>/<file fingerprint>/, so a
+    replaced PDF gets a fresh cache and unchanged books are never re-extracted.
+    """
+
+    @property
+    def cache_root(self):
+        # Outside MEDIA_ROOT: extracted pages of paid books must only be reachable through the access checks
+        return getattr(settings, 'READER_CACHE_DIR', os.path.join(settings.BASE_DIR, 'reader_cache'))
+
+    def has_pdf(self, book):
+        return bool(book.pdf_file) and os.path.exists(book.pdf_file.path)
+
+    def fingerprint(self, book):
+        """Identify the current PDF by name, size and modification time"""
+        stat_result = os.stat(book.pdf_file.path)
+        key = f'{book.pdf_file.name}:{stat_result.st_size}:{stat_result.st_mtime_ns}'
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+    def book_dir(self, book):
+        return os.path.join(self.cache_root, str(book.id), self.fingerprint(book))
+
+    def page_path(self, book, page_number, suffix):
+        return os.path.join(self.book_dir(book), f'page_{page_number:05d}.{suffix}')
+
+    def _open_pdf(self, book):
+        from pypdf import PdfReader
+        try:
+            return PdfReader(book.pdf_file.path)
+        except Exception as e:
+            # pypdf reports damaged files through many exception types
+            raise ReaderError(f'Could not read the PDF for "{book.title}": {e}') from e
+
+    def get_manifest(self, book):
+        """
+        Return {'page_count', 'fingerprint'} for the book.
+        The PDF is only opened the first time; later calls read a small JSON file.
+        Raises ReaderError when the PDF is damaged or unreadable.
+        """
+        manifest_path = os.path.join(self.book_dir(book), 'manifest.json')
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        reader = self._open_pdf(book)
+        try:
+            page_count = len(reader.pages)
+        except Exception as e:
+            raise ReaderError(f'Could not read the PDF for "{book.title}": {e}') from e
+        manifest = {
+            'page_count': page_count,
+            'fingerprint': self.fingerprint(book),
+        }
+        atomic_write(manifest_path, json.dumps(manifest).encode('utf-8'))
+        return manifest
+
+    def get_page_text(self, book, page_number):
+        """Extract the text of a single page once, then serve it from the cache"""
+        text_path = self.page_path(book, page_number, 'txt')
+        try:
+            with open(text_path, 'r', encoding='utf-8') as text_file:
+                return text_file.read()
+        except FileNotFoundError:
+            pass
+
+        try:
+            text = self._open_pdf(book).pages[page_number - 1].extract_text() or ''
+        except ReaderError:
+            raise
+        except Exception as e:
+            raise ReaderError(f'Could not extract page {page_number} of "{book.title}": {e}') from e
+        atomic_write(text_path, text.encode('utf-8'))
+        return text
+
+    def get_page_image_path(self, book, page_number):
+        """
+        Render a page to PNG once and return its cached path.
+        Returns None when the optional pypdfium2 renderer is not installed.
+        Raises ReaderError when pdfium cannot open or render the file (damaged or encrypted).
+        """
+        image_path = self.page_path(book, page_number, 'png')
+        if os.path.exists(image_path):
+            return image_path
+
+        try:
+            import pypdfium2
+        except ImportError:
+            return None
+
+        from io import BytesIO
+        try:
+            pdf = pypdfium2.PdfDocument(book.pdf_file.path)
+            try:
+                image = pdf[page_number - 1].render(scale=PAGE_IMAGE_SCALE).to_pil()
+            finally:
+                pdf.close()
+        except pypdfium2.PdfiumError as e:
+            raise ReaderError(f'Could not render page {page_number} of "{book.title}": {e}') from e
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+        atomic_write(image_path, buffer.getvalue())
+        return image_path
+
+    def images_available(self):
+        try:
+            import pypdfium2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def get_page(self, book, page_number):
+        """
+        Build the payload for one page. Raises IndexError for pages outside the book.
+        Only the requested page is touched, so cost does not grow with book length.
+        """
+        page_count = self.get_manifest(book)['page_count']
+        if page_number < 1 or page_number > page_count:
+            raise IndexError(f'Page {page_number} is outside 1-{page_count}')
+
+        text = self.get_page_text(book, page_number)
+        return {
+            'page': page_number,
+            'page_count': page_count,
+            'text': text,
+            'html': linebreaks(text, autoescape=True),
+            'has_previous': page_number > 1,
+            'has_next': page_number < page_count,
+            'prefetch': [
+                number for number in range(page_number + 1, page_number + 1 + PREFETCH_PAGES)
+                if number <= page_count
+            ],
+        }
+
+
+# Create a global instance
+reader_service = BookReaderService()
@@ -0,0 +1,169 @@
+"""
+Response Cache for ReadOps Library Management System
+Caches catalog page responses per view, query string and user class,
+invalidated through a catalog version counter bumped by model signals
+"""
+
+import hashlib
+import re
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .cache_service import CacheNamespace, get_namespace
+
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+# Query parameters that never change the rendered page
+IGNORED_PARAMS = {'csrfmiddlewaretoken'}
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+# Stored pages hold this marker where the CSRF token was; each response gets its own token
+CSRF_PLACEHOLDER = b'__readops_csrf_token__'
+
+catalog_cache = get_namespace('catalog', timeout=RESPONSE_CACHE_TIMEOUT)
+
+
+def user_class(user):
+    if not user.is_authenticated:
+        return 'anonymous'
+    return 'librarian' if getattr(user, 'is_librarian', False) else 'member'
+
+
+def normalize_query(query_dict):
+    """Sort parameters and drop empty or irrelevant ones so equivalent URLs share an entry"""
+    items = sorted(
+        (key, value)
+        for key in query_dict
+        if key not in IGNORED_PARAMS
+        for value in query_dict.getlist(key)
+        if value.strip()
+    )
+    return urlencode(items)
+
+
+def user_namespace(user_id):
+    return CacheNamespace(f'user:{user_id}')
+
+
+def invalidate_catalog():
+    """Retire every cached catalog response once the current transaction commits"""
+    transaction.on_commit(catalog_cache.invalidate)
+
+
+def invalidate_user(user_id):
+    """Retire the cached pages personalised for one user (cart, loans, digital access)"""
+    transaction.on_commit(user_namespace(user_id).invalidate)
+
+
+def _store_body(request, response):
+    """
+    Return the response body with the CSRF token replaced by a placeholder,
+    or None if the page used a token that cannot be located safely.
+    """
+    body = response.content
+    match = CSRF_INPUT_RE.search(body)
+    if match:
+        return body.replace(match.group(1), CSRF_PLACEHOLDER)
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return None
+    return body
+
+
+def cache_catalog_page(view_func=None, *, personal=True, timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    Cache a GET view's response in the catalog namespace.
+
+    Entries are keyed on the view, its URL arguments, the normalized query
+    string and the user class (anonymous, member or librarian). Pages that
+    render per-user chrome (`personal=True`) are additionally keyed on the
+    user id and that user's version for authenticated requests. Every
+    response carries an ETag derived from the stored body so browsers can
+    revalidate with 304s. Coroutine views get an async wrapper.
+    """
+    def decorator(func):
+        view_name = f'{func.__module__}.{func.__qualname__}'
+
+        def lookup(request, args, kwargs):
+            """Return (key_parts, entry or None), or None when the request must bypass the cache"""
+            # Pending flash messages are rendered once and must not be cached or skipped
+            if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+                return None
+
+            key_parts = [
+                view_name,
+                urlencode(sorted(kwargs.items())),
+                *args,
+                normalize_query(request.GET),
+                user_class(request.user),
+            ]
+            if personal and request.user.is_authenticated:
+                key_parts += [request.user.pk, user_namespace(request.user.pk).version()]
+            return key_parts, catalog_cache.get(*key_parts)
+
+        def store(request, key_parts, response):
+            """Cache a freshly rendered response; None if it must be served uncached"""
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return None
+            body = _store_body(request, response)
+            if body is None:
+                return None
+            entry = {
+                'body': body,
+                'content_type': response['Content-Type'],
+                'etag': 'W/"%s"' % hashlib.sha1(body).hexdigest()[:20],
+            }
+            catalog_cache.set(*key_parts, value=entry, timeout=timeout)
+            return entry
+
+        def respond(request, entry):
+            response = get_conditional_response(request, etag=entry['etag'])
+            if response is None:
+                body = entry['body']
+                if CSRF_PLACEHOLDER in body:
+                    body = body.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii'))
+                response = HttpResponse(body, content_type=entry['content_type'])
+            response['ETag'] = entry['etag']
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        if iscoroutinefunction(func):
+            # Session, user and cache lookups are synchronous; only the view itself runs on the event loop
+            @wraps(func)
+            async def async_wrapper(request, *args, **kwargs):
+                found = await sync_to_async(lookup)(request, args, kwargs)
+                if found is None:
+                    return await func(request, *args, **kwargs)
+                key_parts, entry = found
+                if entry is None:
+                    response = await func(request, *args, **kwargs)
+                    entry = await sync_to_async(store)(request, key_parts, response)
+                    if entry is None:
+                        return response
+                return respond(request, entry)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            found = lookup(request, args, kwargs)
+            if found is None:
+                return func(request, *args, **kwargs)
+            key_parts, entry = found
+            if entry is None:
+                response = func(request, *args, **kwargs)
+                entry = store(request, key_parts, response)
+                if entry is None:
+                    return response
+            return respond(request, entry)
+
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
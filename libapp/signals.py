@@ -0,0 +1,101 @@
+"""
+Model signal handlers for ReadOps Library Management System
+"""
+
+import os
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_service import bump_model_version
+from .models import Book, CatalogChange, CustomUser, DigitalBook, DigitalBookAccess, Fine, Loan, is_journaled_change
+from .qr_tokens import invalidate_scan_profile
+from .response_cache import invalidate_catalog, invalidate_user
+from .thumbnails import manifest_name, thumbnail_service
+
+
+def _queue_thumbnails(image_file, update_fields, field_name):
+    if update_fields is not None and field_name not in update_fields:
+        return
+    name = image_file.name if image_file else ''
+    if not thumbnail_service.has_source(name):
+        return
+    if not os.path.exists(os.path.join(thumbnail_service.media_root, manifest_name(name))):
+        thumbnail_service.generate_in_background(name)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, update_fields=None, **kwargs):
+    _queue_thumbnails(instance.image, update_fields, 'image')
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=DigitalBook)
+def digital_book_saved(sender, instance, update_fields=None, **kwargs):
+    _queue_thumbnails(instance.cover_image, update_fields, 'cover_image')
+    invalidate_catalog()
+
+
+# Books are tombstoned rather than deleted (Book.delete, BookQuerySet.delete),
+# so only digital books send post_delete
+@receiver(post_delete, sender=DigitalBook)
+def catalog_deleted(sender, instance, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=DigitalBook)
+def catalog_journal_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        action = CatalogChange.INSERT
+    elif getattr(instance, 'deleted_at', None):
+        # Book.delete() writes deleted_at only when it tombstones the row; later
+        # saves of a tombstone change nothing the feed serves
+        if update_fields is None or 'deleted_at' not in update_fields:
+            return
+        action = CatalogChange.DELETE
+    elif not is_journaled_change(sender, update_fields):
+        return
+    else:
+        action = CatalogChange.UPDATE
+    CatalogChange.record(sender, [instance.pk], action)
+
+
+@receiver(post_delete, sender=DigitalBook)
+def catalog_journal_deleted(sender, instance, **kwargs):
+    CatalogChange.record(sender, [instance.pk], CatalogChange.DELETE)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    # Cart, loans and notification counts are rendered into cached pages
+    invalidate_user(instance.pk)
+    invalidate_scan_profile(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_loans_changed(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'books' not in update_fields):
+        return
+    Loan.sync_for_user(instance)
+
+
+@receiver(post_save, sender=DigitalBookAccess)
+@receiver(post_delete, sender=DigitalBookAccess)
+def digital_access_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=DigitalBook)
+@receiver(post_delete, sender=DigitalBook)
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=Fine)
+@receiver(post_delete, sender=Fine)
+def model_changed(sender, **kwargs):
+    # Cached dashboard fragments are keyed on these version counters
+    bump_model_version(sender)
@@ -57,12 +57,7 @@ class SMSService:
                 print("📱 SMS disabled in settings")
                 return True  # Return success but don't send
             
-            # Clean phone number (remove spaces, dashes, etc.)
-            clean_phone = ''.join(filter(str.isdigit, phone_number))
-            
-            # Add country code if not present (assuming India +91)
-            if not clean_phone.startswith('91') and len(clean_phone) == 10:
-                clean_phone = '91' + clean_phone
+            clean_phone = self._clean_phone(phone_number)
             
             # Send SMS based on provider
             if self.provider == 'twilio':
@@ -86,6 +81,15 @@ class SMSService:
             print(f"❌ SMS sending failed: {str(e)}")
             return False
     
+    def _clean_phone(self, phone_number):
+        # Clean phone number (remove spaces, dashes, etc.)
+        clean_phone = ''.join(filter(str.isdigit, phone_number))
+        
+        # Add country code if not present (assuming India +91)
+        if not clean_phone.startswith('91') and len(clean_phone) == 10:
+            clean_phone = '91' + clean_phone
+        return clean_phone
+    
     def _send_twilio_sms(self, phone_number, message):
         """Send SMS using Twilio"""
         try:
@@ -108,61 +112,90 @@ class SMSService:
             print(f"❌ Twilio SMS failed: {str(e)}")
             return False
     
+    def _textlocal_request(self, phone_number, message):
+        """Headers and form data for the TextLocal API"""
+        data = {
+            'apikey': self.api_key,
+            'numbers': phone_number,
+            'message': message,
+            'sender': self.sender
+        }
+        return {}, data
+    
+    def _textlocal_result(self, result, phone_number):
+        if result.get('status') == 'success':
+            print(f"📱 TextLocal SMS sent successfully")
+            print(f"✅ SMS SENT SUCCESSFULLY TO: {phone_number}")
+            return True
+        print(f"❌ TextLocal SMS failed: {result.get('errors', 'Unknown error')}")
+        return False
+    
     def _send_textlocal_sms(self, phone_number, message):
         """Send SMS using TextLocal"""
         try:
-            data = {
-                'apikey': self.api_key,
-                'numbers': phone_number,
-                'message': message,
-                'sender': self.sender
-            }
-            
+            headers, data = self._textlocal_request(phone_number, message)
             response = requests.post(self.api_url, data=data)
-            result = response.json()
-            
-            if result.get('status') == 'success':
-                print(f"📱 TextLocal SMS sent successfully")
-                print(f"✅ SMS SENT SUCCESSFULLY TO: {phone_number}")
-                return True
-            else:
-                print(f"❌ TextLocal SMS failed: {result.get('errors', 'Unknown error')}")
-                return False
-                
+            return self._textlocal_result(response.json(), phone_number)
         except Exception as e:
             print(f"❌ TextLocal SMS failed: {str(e)}")
             return False
     
+    def _fast2sms_request(self, phone_number, message):
+        """Headers and form data for the Fast2SMS API"""
+        headers = {
+            'authorization': self.api_key,
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        
+        data = {
+            'route': 'q',
+            'message': message,
+            'language': 'english',
+            'numbers': phone_number
+        }
+        return headers, data
+    
+    def _fast2sms_result(self, result, phone_number):
+        if result.get('return') == True:
+            print(f"📱 Fast2SMS sent successfully")
+            print(f"✅ SMS SENT SUCCESSFULLY TO: {phone_number}")
+            return True
+        print(f"❌ Fast2SMS failed: {result.get('message', 'Unknown error')}")
+        return False
+    
     def _send_fast2sms(self, phone_number, message):
         """Send SMS using Fast2SMS"""
         try:
-            headers = {
-                'authorization': self.api_key,
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            
-            data = {
-                'route': 'q',
-                'message': message,
-                'language': 'english',
-                'numbers': phone_number
-            }
-            
+            headers, data = self._fast2sms_request(phone_number, message)
             response = requests.post(self.api_url, headers=headers, data=data)
-            result = response.json()
-            
-            if result.get('return') == True:
-                print(f"📱 Fast2SMS sent successfully")
-                print(f"✅ SMS SENT SUCCESSFULLY TO: {phone_number}")
-                return True
-            else:
-                print(f"❌ Fast2SMS failed: {result.get('message', 'Unknown error')}")
-                return False
-                
+            return self._fast2sms_result(response.json(), phone_number)
         except Exception as e:
             print(f"❌ Fast2SMS failed: {str(e)}")
             return False
     
+    async def asend_sms(self, phone_number, message):
+        """
+        Async variant of send_sms for async views. The HTTP providers are
+        called through the shared async client; the Twilio SDK and mock mode
+        have no async API and go through send_sms on a worker thread.
+        """
+        if self.provider not in ('textlocal', 'fast2sms') or not getattr(settings, 'SMS_ENABLED', True):
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self.send_sms, thread_sensitive=False)(phone_number, message)
+        
+        from .http_client import post_json
+        clean_phone = self._clean_phone(phone_number)
+        if self.provider == 'textlocal':
+            build, check, label = self._textlocal_request, self._textlocal_result, 'TextLocal SMS'
+        else:
+            build, check, label = self._fast2sms_request, self._fast2sms_result, 'Fast2SMS'
+        try:
+            headers, data = build(clean_phone, message)
+            return check(await post_json(self.api_url, data=data, headers=headers), clean_phone)
+        except Exception as e:
+            print(f"❌ {label} failed: {str(e)}")
+            return False
+    
     def send_registration_sms(self, user):
         """Send welcome SMS after successful registration"""
         message = f"""
@@ -0,0 +1,40 @@
+"""
+SQLite Profile for ReadOps Library Management System
+Applies the production PRAGMAs from settings.SQLITE_PRAGMAS to every new SQLite connection
+"""
+
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE_RE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def apply_pragmas(cursor, pragmas):
+    """Run `PRAGMA name = value` for each entry; works on any DB-API SQLite cursor"""
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME_RE.match(name) or not PRAGMA_VALUE_RE.match(str(value)):
+            raise ValueError(f'Invalid SQLite pragma {name}={value!r}')
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def profile_pragmas():
+    if getattr(settings, 'SQLITE_PROFILE', 'default') != 'production':
+        return {}
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = profile_pragmas()
+    if connection.is_in_memory_db():
+        # WAL and mmap do not apply to in-memory test databases
+        pragmas = {name: value for name, value in pragmas.items() if name not in ('journal_mode', 'mmap_size')}
+    if pragmas:
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, pragmas)
@@ -0,0 +1,63 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from libapp.fragment_cache import FRAGMENT_CACHE_TIMEOUT, cached_fragment
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, depends, vary, timeout):
+        self.nodelist = nodelist
+        self.name = name
+        self.depends = depends
+        self.vary = vary
+        self.timeout = timeout
+
+    def render(self, context):
+        depends = self.depends.resolve(context) if self.depends else ''
+        if isinstance(depends, str):
+            depends = depends.split(',')
+        vary = [value.resolve(context) for value in self.vary]
+        timeout = self.timeout.resolve(context) if self.timeout else FRAGMENT_CACHE_TIMEOUT
+        html = cached_fragment(
+            self.name.resolve(context),
+            depends,
+            lambda: self.nodelist.render(context),
+            vary=vary,
+            csrf_token=context.get('csrf_token'),
+            timeout=int(timeout),
+        )
+        return mark_safe(html)
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    Cache the enclosed block until a model it depends on changes.
+
+    Usage:
+        {% cachefragment "dashboard_books" depends="Book" timeout=600 page %}
+            ...
+        {% endcachefragment %}
+
+    Extra positional arguments after the name are added to the cache key.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+
+    name = parser.compile_filter(bits[1])
+    depends = timeout = None
+    vary = []
+    for bit in bits[2:]:
+        if bit.startswith('depends='):
+            depends = parser.compile_filter(bit[len('depends='):])
+        elif bit.startswith('timeout='):
+            timeout = parser.compile_filter(bit[len('timeout='):])
+        else:
+            vary.append(parser.compile_filter(bit))
+
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(nodelist, name, depends, vary, timeout)
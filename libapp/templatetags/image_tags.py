@@ -0,0 +1,66 @@
+from urllib.parse import unquote
+
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from libapp.thumbnails import THUMBNAIL_FORMATS, thumbnail_service
+
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 768px) 100vw, 300px'
+
+
+def _image_name(image):
+    """Accept an ImageField file or a media URL (as stored in cart items)"""
+    if not image:
+        return '', ''
+    if isinstance(image, str):
+        if image.startswith(settings.MEDIA_URL):
+            return unquote(image[len(settings.MEDIA_URL):]), image
+        return '', image
+    return image.name, image.url
+
+
+@register.simple_tag
+def srcset(image, extension='jpg'):
+    """Usage: <img srcset="{% srcset book.image 'webp' %}">"""
+    name, _ = _image_name(image)
+    return thumbnail_service.srcset(name, extension)
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes=DEFAULT_SIZES, css_class=''):
+    """
+    Render a <picture> with WebP and JPEG srcsets for a cover image.
+    Falls back to a plain <img> of the original until variants exist.
+    Usage: {% responsive_image book.image alt=book.title css_class="book-image" %}
+    """
+    name, url = _image_name(image)
+    if not url:
+        return ''
+    manifest = thumbnail_service.get_manifest(name)
+    if not manifest:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', url, alt, css_class)
+
+    sources = []
+    for extension, _, mime_type in THUMBNAIL_FORMATS[:-1]:
+        sources.append((mime_type, thumbnail_service.srcset(name, extension), sizes))
+
+    fallback_extension = THUMBNAIL_FORMATS[-1][0]
+    fallback_variants = manifest['variants'][fallback_extension]
+    # Middle width as src for browsers without srcset support
+    fallback_src = default_storage.url(fallback_variants[len(fallback_variants) // 2][1])
+
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', sources),
+        fallback_src,
+        thumbnail_service.srcset(name, fallback_extension),
+        sizes,
+        manifest['width'],
+        manifest['height'],
+        alt,
+        css_class,
+    )
@@ -1,3 +1,1195 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.middleware.csrf import _does_token_match, get_token
+from django.template import RequestContext, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .book_import import CoverSource
+from .book_indexer import search_pages
+from .catalog_loader import CatalogLoader, read_catalog
+from .file_serving import serve_file
+from .file_utils import atomic_write
+from .cache_service import CacheNamespace, model_version
+from .db_router import (
+    PIN_COOKIE, REPLICA_ALIAS, PrimaryPinMiddleware, ReadReplicaRouter, _wrote, read_alias, replica_reads,
+)
+from .free_books_service import (
+    CircuitBreaker, FreeBooksService, normalize_search_query, platform_links, search_cache,
+)
+from .fragment_cache import cached_value, fragment_hit_rates, reset_fragment_stats
+from .admin import BookAdmin
+from .models import (
+    Book, CatalogChange, CustomUser, DigitalBook, DigitalBookAccess, DigitalBookPage, Fine, Loan, MobileNotification, QRScanLog,
+    UserQRCode,
+)
+from .qr_service import payload_digest, qr_service
+from .qr_tokens import get_scan_profile, make_token
+from .reader_service import reader_service
+from .response_cache import CSRF_INPUT_RE, CSRF_PLACEHOLDER, cache_catalog_page, invalidate_user
+from .sms_service import sms_service
+from .sqlite_profile import profile_pragmas
+from .thumbnails import thumbnail_service
+
+
+def _user(username, **extra):
+    return CustomUser.objects.create_user(username, f'{username}@example.com', 'pw', phone='9999999999', **extra)
+
+
+def _book(title='Book', quantity=1):
+    return Book.objects.create(
+        title=title, description='d', author='Author', quantity=quantity, department='CS', subject='Programming',
+    )
+
+
+class QRScanTests(TestCase):
+    def setUp(self):
+        self.librarian = _user('librarian', is_librarian=True)
+        self.member = _user('member')
+        self.client.force_login(self.librarian)
+
+    def scan(self, user_id):
+        return self.client.post(reverse('scan_qr_code'), {'qr_data': make_token(user_id)})
+
+    def test_scan_shows_current_loans(self):
+        book = _book('Dune')
+        self.assertEqual(self.scan(self.member.pk).context['borrowed_books'], [])
+
+        now = timezone.now()
+        self.member.books = [{
+            'id': book.pk, 'title': book.title,
+            'start_date': now.isoformat(), 'end_date': (now + timezone.timedelta(days=7)).isoformat(),
+        }]
+        self.member.save()
+
+        response = self.scan(self.member.pk)
+        self.assertEqual([info['book'] for info in response.context['borrowed_books']], [book])
+        self.assertNotIn('password', response.context['scanned_user'])
+
+    def test_profile_is_dropped_when_the_user_is_saved(self):
+        self.assertEqual(get_scan_profile(self.member.pk)['first_name'], '')
+        self.member.first_name = 'Ada'
+        self.member.save()
+        self.assertEqual(get_scan_profile(self.member.pk)['first_name'], 'Ada')
+
+    def test_token_for_deleted_user_is_reported_without_logging(self):
+        user_id = self.member.pk
+        self.member.delete()
+
+        response = self.scan(user_id)
+        self.assertRedirects(response, reverse('qr_scanner'))
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ['QR code does not belong to a registered user.'],
+        )
+        self.assertFalse(QRScanLog.objects.exists())
+
+
+class ScanExportTests(TestCase):
+    def setUp(self):
+        librarian = _user('librarian', is_librarian=True)
+        self.client.force_login(librarian)
+        QRScanLog.objects.bulk_create([
+            QRScanLog(scanned_user=_user(username), scanned_by=librarian, scan_type='CHECK_IN')
+            for username in ('ada', 'alan', 'grace')
+        ])
+
+    def test_csv_export_streams_the_filtered_rows(self):
+        response = self.client.get(reverse('export_scan_data'), {'format': 'csv', 'user_search': 'a'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['Scan ID', 'Scanned User'])
+        self.assertEqual(sorted(line.split(',')[1] for line in lines[1:]), ['ada', 'alan', 'grace'])
+
+        response = self.client.get(reverse('export_scan_data'), {'format': 'csv', 'user_search': 'gra'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram indexes are only created on PostgreSQL')
+    def test_trigram_indexes_exist(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname LIKE %s", ['%_trgm'])
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertIn('libapp_book_title_trgm', names)
+
+
+class FileServingTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'book.pdf')
+        with open(self.path, 'wb') as book_file:
+            book_file.write(b'0123456789')
+        self.empty = os.path.join(directory, 'empty.pdf')
+        open(self.empty, 'wb').close()
+
+    def serve(self, path=None, **headers):
+        request = RequestFactory().get('/', **{f'HTTP_{name.upper()}': value for name, value in headers.items()})
+        return serve_file(request, path or self.path, content_type='application/pdf', filename='book.pdf')
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ranges(self):
+        response = self.serve(range='bytes=2-4')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 2-4/10'))
+        self.assertEqual(self.body(response), b'234')
+        self.assertEqual(self.body(self.serve(range='bytes=-3')), b'789')
+
+        for path, header in ((self.path, 'bytes=10-'), (self.empty, 'bytes=-5'), (self.empty, 'bytes=0-')):
+            response = self.serve(path, range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{os.path.getsize(path)}')
+
+    def test_if_range_and_conditional_requests(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(range='bytes=0-0', if_range=etag).status_code, 206)
+        stale = self.serve(range='bytes=0-0', if_range='"stale"')
+        self.assertEqual((stale.status_code, self.body(stale)), (200, b'0123456789'))
+        self.assertEqual(self.serve(if_none_match=etag).status_code, 304)
+
+    def test_content_disposition_is_escaped(self):
+        request = RequestFactory().get('/')
+        for filename, expected in (
+            ('a "quoted" \\ name.pdf', 'inline; filename="a \\"quoted\\" \\\\ name.pdf"'),
+            ('café.pdf', "inline; filename*=utf-8''caf%C3%A9.pdf"),
+        ):
+            response = serve_file(request, self.path, filename=filename)
+            self.assertEqual(response['Content-Disposition'], expected)
+
+
+class OnlineReaderTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        reader_cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, reader_cache)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, READER_CACHE_DIR=reader_cache)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.member = _user('reader')
+        self.client.force_login(self.member)
+        self.book = DigitalBook.objects.create(
+            title='Broken', author='Author', description='d', book_type='OTHER', category='Test',
+        )
+        self.book.pdf_file.save('broken.pdf', ContentFile(b'%PDF-1.4 this is not a pdf'))
+        now = timezone.now()
+        DigitalBookAccess.objects.create(
+            user=self.member, digital_book=self.book, access_type='ONLINE_READING', status='ACTIVE',
+            payment_amount=0, access_start_date=now, access_end_date=now + timezone.timedelta(days=1),
+        )
+
+    def test_reader_cache_is_not_publicly_served(self):
+        from library import settings as project_settings
+        media_root = os.path.join(os.path.abspath(project_settings.MEDIA_ROOT), '')
+        self.assertFalse(os.path.abspath(project_settings.READER_CACHE_DIR).startswith(media_root))
+
+    def test_damaged_pdf_falls_back_to_sample_content(self):
+        response = self.client.get(reverse('online_reader', args=[self.book.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('content', response.context)
+        self.assertNotIn('page_count', response.context)
+
+        response = self.client.get(reverse('reader_page', args=[self.book.pk, 1]))
+        self.assertEqual(response.status_code, 404)
+
+    @skipUnless(reader_service.images_available(), 'pypdfium2 is not installed')
+    def test_page_image_of_an_unrenderable_pdf_is_not_found(self):
+        # pypdf accepted the file (say, an encrypted one) but pdfium cannot open it
+        manifest = {'page_count': 1, 'fingerprint': reader_service.fingerprint(self.book)}
+        atomic_write(os.path.join(reader_service.book_dir(self.book), 'manifest.json'), json.dumps(manifest).encode())
+
+        response = self.client.get(reverse('reader_page_image', args=[self.book.pk, 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BookContentSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = DigitalBook.objects.bulk_create([
+            DigitalBook(title=f'Book {i}', author='Author', description='d', book_type='OTHER', category='Test',
+                        is_active=i != 1)
+            for i in range(3)
+        ])
+        DigitalBookPage.objects.bulk_create([
+            DigitalBookPage(digital_book=book, page_number=1, text='the quantum harmonic oscillator')
+            for book in cls.books
+        ])
+
+    def test_results_are_limited_to_the_queryset_without_binding_every_id(self):
+        active = DigitalBook.objects.filter(is_active=True)
+        with CaptureQueriesContext(connection) as queries:
+            hits = search_pages('harmonic', books=active)
+        self.assertEqual(sorted(hit['book_id'] for hit in hits), [self.books[0].pk, self.books[2].pk])
+        # One statement with the restriction as a subquery, on the FTS path and the fallback alike
+        self.assertIn('FROM "libapp_digitalbook"', queries[-1]['sql'])
+
+    def test_short_queries_use_the_fallback_with_the_same_restriction(self):
+        hits = search_pages('os', books=DigitalBook.objects.filter(is_active=True))
+        self.assertEqual(sorted(hit['book_id'] for hit in hits), [self.books[0].pk, self.books[2].pk])
+
+
+class BookImportCoverTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.media_root, 'book_covers'))
+        with open(os.path.join(self.media_root, 'book_covers', 'dune.jpg'), 'wb') as image_file:
+            image_file.write(b'jpeg')
+        self.client.force_login(_user('librarian', is_librarian=True))
+
+    def upload(self, *rows):
+        sheet = 'title,author,subject,image\n' + ''.join(f'{row}\n' for row in rows)
+        return self.client.post(reverse('import_books'), {
+            'file': SimpleUploadedFile('books.csv', sheet.encode(), content_type='text/csv'),
+        }).json()
+
+    def test_web_import_never_fetches_urls(self):
+        with mock.patch('requests.get') as get:
+            report = self.upload('Dune,Herbert,SF,http://169.254.169.254/latest/meta-data/')
+        get.assert_not_called()
+        self.assertEqual(report['inserted'], 1)
+        self.assertIn('only fetched by the import_books command', report['errors'][0]['message'])
+
+    def test_web_import_reads_media_paths_but_not_outside_them(self):
+        report = self.upload('Dune,Herbert,SF,book_covers/dune.jpg', 'Emma,Austen,Novel,../../etc/passwd')
+        self.assertEqual(report['covers'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [3])
+
+    def test_directory_references_cannot_escape(self):
+        covers = CoverSource(directory=os.path.join(self.media_root, 'book_covers'))
+        self.assertEqual(covers.read('dune.jpg'), b'jpeg')
+        for reference in ('../book_covers/dune.jpg', os.path.join(self.media_root, 'book_covers', 'dune.jpg')):
+            with self.assertRaises(FileNotFoundError):
+                covers.read(reference)
+
+
+
+class BatchGenerationTests(TestCase):
+    """The batch commands with two workers, so their process pools really run"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_qr_codes_are_rendered_once_per_payload(self):
+        users = [_user('first'), _user('second')]
+        call_command('generate_qr_codes', workers=2, stdout=StringIO())
+
+        for user in users:
+            qr_code = UserQRCode.objects.get(user=user)
+            self.assertEqual(qr_code.qr_code_image.name, qr_service.storage_name(payload_digest(qr_code.qr_code_data)))
+            with open(qr_service.path(payload_digest(qr_code.qr_code_data)), 'rb') as image_file:
+                self.assertEqual(image_file.read(8), b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(
+            [name for _, _, files in os.walk(self.media_root) for name in files if name.endswith('.tmp')], [],
+        )
+
+        out = StringIO()
+        call_command('generate_qr_codes', workers=2, stdout=out)
+        self.assertIn('Rendered 0 images and updated 0 of 2', out.getvalue())
+
+    def test_sample_pdfs_are_rendered_for_missing_files_unless_forced(self):
+        DigitalBook.objects.bulk_create([
+            DigitalBook(title=f'Free {i}', author='Author', description='d', book_type='OTHER', category='Test',
+                        is_free=True)
+            for i in range(2)
+        ])
+
+        def run(*args):
+            out = StringIO()
+            call_command('create_sample_pdf_content', *args, workers=2, stdout=out)
+            return out.getvalue()
+
+        self.assertIn('created 2 sample PDF files', run())
+        for book in DigitalBook.objects.all():
+            self.assertTrue(os.path.isfile(book.pdf_file.path))
+        self.assertEqual(DigitalBookPage.objects.filter(text__contains='Free 0').count(), 1)
+        self.assertIn('Rendering 0 PDFs', run())
+        self.assertIn('created 2 sample PDF files', run('--force'))
+
+    def test_thumbnail_variants_and_manifests_are_written(self):
+        from PIL import Image
+
+        os.makedirs(os.path.join(self.media_root, 'book_covers'))
+        for index, size in enumerate([(400, 600), (200, 300)]):
+            Image.new('RGB', size, 'red').save(os.path.join(self.media_root, 'book_covers', f'{index}.png'))
+            Book.objects.filter(pk=_book(f'Book {index}').pk).update(image=f'book_covers/{index}.png')
+        Book.objects.filter(pk=_book('Missing').pk).update(image='book_covers/missing.png')
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=2, stdout=out)
+        self.assertIn('Generated thumbnails for 2 images (0 errors)', out.getvalue())
+        self.assertIn('1 referenced images are missing', out.getvalue())
+
+        large = thumbnail_service.get_manifest('book_covers/0.png')
+        self.assertEqual([width for width, _ in large['variants']['webp']], [160, 320])
+        small = thumbnail_service.get_manifest('book_covers/1.png')
+        self.assertEqual([width for width, _ in small['variants']['jpg']], [160])
+        for _, name in large['variants']['webp'] + small['variants']['jpg']:
+            self.assertTrue(os.path.isfile(os.path.join(self.media_root, name)))
+
+
+
+class CatalogLoaderTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'catalog.jsonl')
+        rows = [
+            {'title': f'Book {i}', 'author': 'Author', 'description': 'd', 'book_type': 'OTHER', 'category': 'Test'}
+            for i in range(5)
+        ]
+        rows[3] = {'author': 'Nobody'}
+        rows[4]['download_price'] = 'free'
+        with open(self.path, 'w', encoding='utf-8') as catalog_file:
+            catalog_file.writelines(json.dumps(row) + '\n' for row in rows)
+
+    def test_files_are_loaded_in_batches_with_file_row_numbers(self):
+        loader = CatalogLoader(DigitalBook, batch_size=2)
+        with mock.patch.object(loader, 'load', wraps=loader.load) as load:
+            summary = loader.load_stream(read_catalog(self.path))
+        self.assertEqual([len(call.args[0]) for call in load.call_args_list], [2, 2, 1])
+        self.assertEqual((summary.inserted, summary.updated, summary.unchanged), (3, 0, 0))
+        self.assertEqual([row for row, _ in summary.errors], [4, 5])
+        self.assertEqual(DigitalBook.objects.count(), 3)
+
+        summary = loader.load_stream(read_catalog(self.path))
+        self.assertEqual((summary.inserted, summary.updated, summary.unchanged), (0, 0, 3))
+
+    def test_load_catalog_command_reports_errors(self):
+        out = StringIO()
+        call_command('load_catalog', self.path, batch_size=2, stdout=out)
+        self.assertIn('Row 4: Missing required field "title"', out.getvalue())
+        self.assertIn('DigitalBook: 3 inserted, 0 updated, 0 unchanged, 2 errors', out.getvalue())
+
+    def test_sample_book_commands_fail_on_rejected_rows(self):
+        call_command('add_digital_books', stdout=StringIO())
+        self.assertTrue(DigitalBook.objects.exists())
+
+        rejected = ValidationError('Missing required field "title"')
+        for command in ('add_digital_books', 'add_free_educational_books'):
+            with mock.patch.object(CatalogLoader, 'clean_row', side_effect=rejected), \
+                    self.assertRaisesMessage(CommandError, 'books could not be saved'):
+                call_command(command, stdout=StringIO())
+
+
+def _file_cache(location):
+    return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+
+
+class CacheNamespaceTests(TestCase):
+    """Runs against the configured default cache (locmem unless CACHE_BACKEND says otherwise)"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.namespace = CacheNamespace('tests')
+
+    def test_invalidate_orphans_existing_entries(self):
+        self.namespace.set('page', 1, value='old')
+        self.assertEqual(self.namespace.get('page', 1), 'old')
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get('page', 1))
+
+    def test_get_or_set_computes_once_and_never_stores_none(self):
+        compute = mock.Mock(return_value='value')
+        self.assertEqual(self.namespace.get_or_set('key', default=compute), 'value')
+        self.assertEqual(self.namespace.get_or_set('key', default=compute), 'value')
+        self.assertEqual(compute.call_count, 1)
+        self.assertIsNone(self.namespace.get_or_set('missing', default=lambda: None))
+        self.assertEqual(self.namespace.get_or_set('missing', default='now'), 'now')
+
+    def test_incr_creates_and_adds(self):
+        self.assertEqual(self.namespace.incr('hits'), 1)
+        self.assertEqual(self.namespace.incr('hits', delta=2), 3)
+
+    def test_unsafe_key_parts_are_hashed(self):
+        self.namespace.set('q', 'a b/ü', value='x')
+        self.assertEqual(self.namespace.get('q', 'a b/ü'), 'x')
+
+    def test_invalidation_reaches_other_processes_only_through_a_shared_tier(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        # Two aliases on one directory stand in for two workers sharing the file tier
+        with override_settings(CACHES={'default': _file_cache(location), 'worker': _file_cache(location)}):
+            here, there = CacheNamespace('tests'), CacheNamespace('tests', alias='worker')
+            there.set('page', value='cached')
+            here.invalidate()
+            self.assertIsNone(there.get('page'))
+            caches['worker'].close()
+
+    @skipUnless(os.environ.get('REDIS_URL'), 'set REDIS_URL to test the Redis tier')
+    def test_redis_tier(self):
+        redis = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['REDIS_URL']}
+        with override_settings(CACHES={'default': redis, 'worker': redis}):
+            here, there = CacheNamespace('tests'), CacheNamespace('tests', alias='worker')
+            there.set('page', value='cached')
+            self.assertEqual(here.get('page'), 'cached')
+            here.invalidate()
+            self.assertIsNone(there.get('page'))
+            self.assertEqual(here.incr('hits'), 1)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        reset_fragment_stats()
+
+    def test_values_follow_model_versions_and_hit_rates_are_counted(self):
+        compute = mock.Mock(side_effect=lambda: Book.objects.count())
+        self.assertEqual(cached_value('books', [Book], compute), 0)
+        self.assertEqual(cached_value('books', [Book], compute), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            _book()
+        self.assertEqual(cached_value('books', ['Book'], compute), 1)
+        cached_value('users', [CustomUser], lambda: 'x')
+
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual(fragment_hit_rates(), {
+            'books': {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3},
+            'users': {'hits': 0, 'misses': 1, 'hit_rate': 0.0},
+        })
+        reset_fragment_stats()
+        self.assertEqual(fragment_hit_rates(), {})
+
+    def test_cachefragment_tag_reuses_html_and_refills_the_csrf_token(self):
+        template = Template(
+            '{% load fragment_tags %}'
+            '{% cachefragment "book_titles" depends="Book" page %}'
+            '{% for book in books %}{{ book.title }};{% endfor %}{% csrf_token %}'
+            '{% endcachefragment %}'
+        )
+        _book('Dune')
+
+        def render(page=1):
+            request = RequestFactory().get('/')
+            return template.render(RequestContext(request, {'books': Book.objects.order_by('pk'), 'page': page})), request
+
+        html, request = render()
+        self.assertIn('Dune;', html)
+        with self.assertNumQueries(0):
+            cached_html, cached_request = render()
+        token = CSRF_INPUT_RE.search(cached_html.encode()).group(1).decode()
+        self.assertTrue(_does_token_match(token, cached_request.META['CSRF_COOKIE']))
+        self.assertNotEqual(cached_html, html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _book('Solaris')
+        self.assertIn('Dune;Solaris;', render()[0])
+        self.assertIn('Dune;Solaris;', render(page=2)[0])
+        self.assertEqual(fragment_hit_rates()['book_titles'], {'hits': 1, 'misses': 3, 'hit_rate': 0.25})
+
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        self.rendered = []
+
+    def cached_view(self, **options):
+        @cache_catalog_page(**options)
+        def view(request):
+            self.rendered.append(request.user)
+            token = get_token(request)
+            return HttpResponse(f'<input type="hidden" name="csrfmiddlewaretoken" value="{token}">')
+        return view
+
+    def get(self, view, user, **extra):
+        request = self.factory.get('/catalog/', **extra)
+        request.user = user
+        return request, view(request)
+
+    def test_personal_pages_are_keyed_per_user_and_shared_pages_per_user_class(self):
+        first, second, anonymous = _user('first'), _user('second'), AnonymousUser()
+        personal = self.cached_view()
+        for user in (first, first, second, anonymous, anonymous):
+            self.get(personal, user)
+        self.assertEqual(self.rendered, [first, second, anonymous])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_user(first.pk)
+        self.get(personal, first)
+        self.get(personal, second)
+        self.assertEqual(self.rendered, [first, second, anonymous, first])
+
+        # Both stubs share a qualified name, and so a key prefix
+        caches['default'].clear()
+        self.rendered.clear()
+        shared = self.cached_view(personal=False)
+        for user in (first, second, anonymous, _user('librarian', is_librarian=True)):
+            self.get(shared, user)
+        self.assertEqual(len(self.rendered), 3)
+
+    def test_cached_pages_get_the_csrf_token_of_each_request(self):
+        view = self.cached_view(personal=False)
+        first_request, first = self.get(view, AnonymousUser())
+        second_request, second = self.get(view, AnonymousUser())
+        self.assertEqual(len(self.rendered), 1)
+
+        tokens = [CSRF_INPUT_RE.search(response.content).group(1).decode() for response in (first, second)]
+        self.assertNotIn(CSRF_PLACEHOLDER, second.content)
+        self.assertNotEqual(tokens[0], tokens[1])
+        self.assertTrue(_does_token_match(tokens[1], second_request.META['CSRF_COOKIE']))
+
+    def test_revalidation_of_a_cached_page_is_a_304(self):
+        view = self.cached_view(personal=False)
+        _, response = self.get(view, AnonymousUser())
+        _, revalidated = self.get(view, AnonymousUser(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        self.assertEqual(len(self.rendered), 1)
+
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    """Routing decisions only; the replica alias is never connected to"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReadReplicaRouter()
+        # Writes made by earlier tests outside a request leave the process on the primary
+        token = _wrote.set(False)
+        self.addCleanup(_wrote.reset, token)
+
+    def with_replica(self):
+        return mock.patch.dict(settings.DATABASES, {REPLICA_ALIAS: settings.DATABASES['default']})
+
+    def request(self, view, method='get', cookies=None):
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies or {})
+        return PrimaryPinMiddleware(view)(request)
+
+    def routed_view(self, write=False):
+        """A view recording where a read goes before and after an optional write"""
+        self.routes = []
+
+        def view(request):
+            with replica_reads():
+                self.routes.append(self.router.db_for_read(Book))
+                if write:
+                    self.routes.append(self.router.db_for_write(Book))
+                    self.routes.append(self.router.db_for_read(Book))
+            self.routes.append(self.router.db_for_read(Book))
+            return HttpResponse()
+        return view
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        with self.with_replica():
+            self.request(self.routed_view(write=True), 'post')
+        self.assertEqual(self.routes, [REPLICA_ALIAS, 'default', 'default', 'default'])
+        self.assertFalse(self.router.allow_migrate(REPLICA_ALIAS, 'libapp'))
+        self.assertTrue(self.router.allow_migrate('default', 'libapp'))
+
+    def test_a_write_pins_the_client_to_the_primary_on_its_next_request(self):
+        with self.with_replica():
+            response = self.request(self.routed_view(write=True), 'post')
+            pin = response.cookies[PIN_COOKIE]
+            self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+
+            self.request(self.routed_view(), cookies={PIN_COOKIE: pin.value})
+            self.assertEqual(self.routes, ['default', 'default'])
+            response = self.request(self.routed_view())
+            self.assertEqual(self.routes, [REPLICA_ALIAS, 'default'])
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_request_state_does_not_leak_between_requests(self):
+        with self.with_replica():
+            self.request(self.routed_view(write=True), 'post', cookies={PIN_COOKIE: '1'})
+            with replica_reads():
+                self.assertEqual(read_alias(), REPLICA_ALIAS)
+
+    async def test_async_requests_are_pinned_too(self):
+        async def view(request):
+            self.router.db_for_write(Book)
+            return HttpResponse()
+
+        with self.with_replica():
+            response = await PrimaryPinMiddleware(view)(self.factory.post('/'))
+            self.assertIn(PIN_COOKIE, response.cookies)
+            with replica_reads():
+                self.assertEqual(read_alias(), REPLICA_ALIAS)
+
+    def test_without_a_replica_everything_uses_the_primary(self):
+        with mock.patch.dict(settings.DATABASES):
+            settings.DATABASES.pop(REPLICA_ALIAS, None)
+            response = self.request(self.routed_view(write=True), 'post')
+        self.assertEqual(self.routes, ['default'] * 4)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class AsyncViewTests(TestCase):
+    """The coroutine views, through the async test client with the outbound HTTP client stubbed"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.member = _user('member')
+
+    async def test_anonymous_users_are_sent_to_login(self):
+        response = await self.async_client.get(reverse('test_email'))
+        self.assertRedirects(response, f"{settings.LOGIN_URL}?next={reverse('test_email')}", fetch_redirect_response=False)
+
+    @override_settings(SMS_ENABLED=True)
+    async def test_sms_is_sent_through_the_async_client(self):
+        post_json = mock.AsyncMock(return_value={'return': True})
+        with mock.patch.multiple(sms_service, provider='fast2sms', api_url='https://sms.test/send', api_key='key'), \
+                mock.patch('libapp.http_client.post_json', post_json):
+            self.assertTrue(await sms_service.asend_sms('9999999999', 'ReadOps test'))
+
+            # The test SMS page only renders its form
+            await sync_to_async(self.async_client.force_login)(self.member)
+            response = await self.async_client.post(reverse('test_sms'))
+        self.assertEqual(response.status_code, 200)
+        post_json.assert_awaited_once()
+        self.assertEqual(post_json.await_args.args, ('https://sms.test/send',))
+        self.assertEqual(post_json.await_args.kwargs['data']['numbers'], '919999999999')
+
+    async def test_explore_without_hits_awaits_free_book_suggestions(self):
+        get_json = mock.AsyncMock(return_value={'docs': [
+            {'title': 'Solaris', 'author_name': ['Lem'], 'key': '/works/1', 'ebook_count_i': 2},
+        ]})
+        with mock.patch('libapp.http_client.get_json', get_json):
+            response = await self.async_client.get(reverse('explore'), {'q': 'solaris'})
+        get_json.assert_awaited_once()
+        self.assertTrue(response.context['no_results'])
+        found = response.context['free_books_suggestions']['free_books_found']
+        self.assertIn('Solaris', [book['title'] for book in found])
+
+
+class _OpenLibraryStub(BaseHTTPRequestHandler):
+    """Answers like Open Library's search API, fails, or hangs, as the server's mode says"""
+
+    def do_GET(self):
+        self.server.hits += 1
+        if self.server.mode == 'hang':
+            self.server.release.wait(5)
+            return
+        if self.server.mode == 'error':
+            self.send_error(503)
+            return
+        body = json.dumps({'docs': [
+            {'title': self.server.title, 'author_name': ['Lem'], 'key': '/works/1', 'ebook_count_i': 1},
+        ]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FreeBooksServiceTests(SimpleTestCase):
+    deadline = 0.5
+
+    def setUp(self):
+        caches['default'].clear()
+        self.stub = ThreadingHTTPServer(('127.0.0.1', 0), _OpenLibraryStub)
+        self.stub.daemon_threads = True
+        self.stub.mode, self.stub.title, self.stub.hits = 'ok', 'Solaris', 0
+        self.stub.release = threading.Event()
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        self.addCleanup(self.stub.release.set)
+
+        url = f'http://127.0.0.1:{self.stub.server_port}/search.json'
+        with override_settings(OPEN_LIBRARY_SEARCH_URL=url, FREE_BOOKS_SEARCH_DEADLINE=self.deadline):
+            self.service = FreeBooksService()
+
+    def titles(self, results):
+        return [result['title'] for result in results if not result['is_direct_link']]
+
+    def cached_entry(self, query, limit=5):
+        return search_cache.get(normalize_search_query(query), limit)
+
+    def test_deadline_returns_partial_results_stored_as_stale(self):
+        self.stub.mode = 'hang'
+        started = time.monotonic()
+        results = self.service.search_free_books('solaris')
+        self.assertLess(time.monotonic() - started, self.deadline + 0.4)
+        # The direct links still come back; the hanging platform is left out
+        self.assertTrue(results)
+        self.assertEqual(self.titles(results), [])
+        self.assertEqual(self.cached_entry('solaris')['fetched_at'], 0)
+
+    async def test_async_deadline_returns_partial_results_stored_as_stale(self):
+        self.stub.mode = 'hang'
+        started = time.monotonic()
+        results = await self.service.asearch_free_books('solaris')
+        self.assertLess(time.monotonic() - started, self.deadline + 0.4)
+        self.assertEqual(self.titles(results), [])
+        self.assertEqual((await sync_to_async(self.cached_entry)('solaris'))['fetched_at'], 0)
+
+    def test_stale_entry_is_served_while_it_is_refreshed(self):
+        self.assertEqual(self.titles(self.service.search_free_books('Solaris')), ['Solaris'])
+        self.assertNotEqual(self.cached_entry('solaris')['fetched_at'], 0)
+        self.assertEqual(self.titles(self.service.search_free_books('  solaris ')), ['Solaris'])
+        self.assertEqual(self.stub.hits, 1)
+
+        self.service.results_fresh_seconds = 0
+        self.stub.title = 'Solaris (revised)'
+        self.assertEqual(self.titles(self.service.search_free_books('solaris')), ['Solaris'])
+        for _ in range(50):
+            if self.titles(self.cached_entry('solaris')['results']) == ['Solaris (revised)']:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.titles(self.cached_entry('solaris')['results']), ['Solaris (revised)'])
+        self.assertEqual(self.stub.hits, 2)
+
+    def test_platform_links_are_built_once_per_normalized_query(self):
+        platform_links.cache_clear()
+        first = self.service.get_platform_suggestions('Dune', 'Frank  Herbert')['platform_links']
+        again = self.service.get_platform_suggestions('dune frank', 'herbert')['platform_links']
+        self.assertIs(again, first)
+        self.assertEqual(platform_links.cache_info().hits, 1)
+        google = next(link for link in first if link.name == 'Google Books (Free)')
+        self.assertEqual(google.url, 'https://books.google.com/books?q=dune+frank+herbert&filter=free-ebooks')
+
+    def test_subject_platforms_search_for_the_query(self):
+        links = self.service.get_subject_specific_platforms('World History', 'Rome')
+        self.assertEqual([link.name for link in links], ['Project Gutenberg', 'Open Library', 'Internet Archive'])
+        self.assertTrue(all('query=rome' in link.url or 'q=rome' in link.url for link in links), links)
+        self.assertIs(self.service.get_subject_specific_platforms('world  history', 'ROME'), links)
+
+        general = self.service.get_subject_specific_platforms('Cooking')
+        self.assertEqual({link.reason for link in general}, {'General purpose free book platform'})
+        self.assertTrue(all('{query}' in link.url for link in general))
+
+    def test_breaker_opens_then_lets_one_trial_through(self):
+        breaker = self.service.breakers['open_library'] = CircuitBreaker(threshold=2, cooldown=0.3)
+        self.stub.mode = 'error'
+        # Each search uses a new query so none of them is answered from the cache
+        self.service.search_free_books('first')
+        self.assertEqual(breaker.state, 'closed')
+        self.service.search_free_books('second')
+        self.assertEqual(breaker.state, 'open')
+
+        self.service.search_free_books('third')
+        self.assertEqual(self.stub.hits, 2)
+
+        time.sleep(0.35)
+        self.assertEqual(breaker.state, 'half-open')
+        self.service.search_free_books('fourth')
+        self.assertEqual((self.stub.hits, breaker.state), (3, 'open'))
+
+        time.sleep(0.35)
+        self.stub.mode = 'ok'
+        self.assertEqual(self.titles(self.service.search_free_books('fifth')), ['Solaris'])
+        self.assertEqual((self.stub.hits, breaker.state), (4, 'closed'))
+
+
+
+class DashboardUsersApiTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(_user('librarian', is_librarian=True))
+        self.member = _user('member')
+        self.returned = _user('returned')
+        _user('idle')
+
+        now = timezone.now()
+        start_of_today = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), timezone.datetime.min.time()))
+
+        def entry(title, end_date, **extra):
+            return {'id': None, 'title': title, 'start_date': (now - timezone.timedelta(days=14)).isoformat(),
+                    'end_date': end_date.isoformat(), **extra}
+
+        self.member.books = [
+            entry('Late', now - timezone.timedelta(days=2)),
+            # Due today: overdue only once the day has passed, on both endpoints
+            entry('Due today', start_of_today),
+            entry('Later', now + timezone.timedelta(days=5)),
+        ]
+        self.member.save()
+        # The JSON list still holds a returned entry, but no Loan is open
+        self.returned.books = [entry('Done', now - timezone.timedelta(days=3), is_returned=True)]
+        self.returned.save()
+
+    def test_users_with_loans_come_from_open_loan_rows(self):
+        response = self.client.get(reverse('dashboard_users_api'), {'has_loans': '1'})
+        self.assertEqual(
+            [(row['username'], row['loans'], row['overdue']) for row in response.json()['results']],
+            [('member', 3, 1)],
+        )
+        response = self.client.get(reverse('dashboard_users_api'), {'q': 're'})
+        self.assertEqual([row['username'] for row in response.json()['results']], ['returned'])
+        self.assertEqual(response.json()['results'][0]['loans'], 0)
+
+    def test_loan_detail_uses_the_same_overdue_cutoff(self):
+        users = self.client.get(reverse('dashboard_users_api'), {'has_loans': '1'}).json()['results']
+        response = self.client.get(reverse('dashboard_user_loans_api', args=[self.member.pk]))
+        loans = response.json()['loans']
+        self.assertEqual([(loan['title'], loan['is_overdue']) for loan in loans],
+                         [('Late', True), ('Due today', False), ('Later', False)])
+        self.assertEqual(users[0]['overdue'], sum(loan['is_overdue'] for loan in loans))
+
+        self.assertEqual(self.client.get(reverse('dashboard_user_loans_api', args=[0])).status_code, 404)
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(reverse('dashboard_user_loans_api', args=[self.member.pk])).status_code, 302)
+
+
+class ApiETagTests(TestCase):
+    """Writes whose version bumps never reach this process, as from another worker, still change the ETag"""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def get(self, name, etag=None):
+        return self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag or '')
+
+    def test_catalog_writes_from_elsewhere_change_the_etag(self):
+        _book('Dune')
+        etag = self.get('api_books')['ETag']
+        self.assertEqual(self.get('api_books', etag).status_code, 304)
+
+        # TestCase never runs on_commit callbacks, so the version counters stay put
+        Book.objects.filter(title='Dune').update(quantity=5)
+        response = self.get('api_books', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['quantity'], 5)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_loan_writes_from_elsewhere_change_the_etag(self):
+        member = _user('member')
+        self.client.force_login(member)
+        etag = self.get('api_loans')['ETag']
+        self.assertEqual(self.get('api_loans', etag).status_code, 304)
+
+        now = timezone.now()
+        Loan.objects.create(user=member, title='Dune', start_date=now, end_date=now + timezone.timedelta(days=7))
+        response = self.get('api_loans', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([loan['title'] for loan in response.json()['results']], ['Dune'])
+
+
+@override_settings(CATALOG_CHANGES_SETTLE_SECONDS=0)
+class CatalogChangesTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def feed(self, cursor=None):
+        return self.client.get(reverse('api_catalog_changes'), {'since': cursor} if cursor else {}).json()
+
+    def test_bulk_writes_bump_the_version_and_reach_the_feed(self):
+        dune, emma = _book('Dune'), _book('Emma')
+        page = self.feed()
+        self.assertEqual([(change['op'], change['id']) for change in page['changes']],
+                         [('insert', dune.pk), ('insert', emma.pk)])
+
+        version = model_version(Book)
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(pk=dune.pk).update(quantity=3)
+        self.assertNotEqual(model_version(Book), version)
+
+        changes = self.feed(page['cursor'])['changes']
+        self.assertEqual([(change['op'], change['id'], change['data']['quantity']) for change in changes],
+                         [('update', dune.pk, 3)])
+
+    def test_updates_journal_without_reading_keys_and_skip_unexposed_fields(self):
+        dune = _book('Dune')
+        book = DigitalBook.objects.create(title='Gita', author='Vyasa', description='d', book_type='OTHER', category='Test')
+        journal = CatalogChange.objects.order_by('pk').last().pk
+        # Savepoint, INSERT ... SELECT into the journal, UPDATE, release
+        with self.assertNumQueries(4):
+            Book.objects.filter(pk=dune.pk, quantity__gt=0).update(quantity=0)
+        DigitalBook.objects.filter(pk=book.pk).update(pdf_file='digital_books/pdf/gita.pdf')
+        self.assertEqual(
+            list(CatalogChange.objects.filter(pk__gt=journal).values_list('model', 'object_id', 'action')),
+            [('book', dune.pk, 'update')],
+        )
+
+    def test_a_tombstone_is_journaled_once(self):
+        dune = _book('Dune')
+        dune.delete()
+        tombstone = Book.all_objects.get(pk=dune.pk)
+        tombstone.title = 'Dune (withdrawn)'
+        tombstone.save()
+        dune.delete()
+        self.assertEqual(list(CatalogChange.objects.filter(model='book', object_id=dune.pk).values_list('action', flat=True)),
+                         ['insert', 'delete'])
+        self.assertEqual([change['op'] for change in self.feed()['changes']], ['delete'])
+
+    def test_compaction_keeps_the_latest_entry_of_every_row(self):
+        dune, emma = _book('Dune'), _book('Emma')
+        Book.objects.filter(pk=dune.pk).update(quantity=3)
+        Book.objects.filter(pk=dune.pk).update(quantity=4)
+        self.assertEqual(CatalogChange.compact(timezone.now() + timezone.timedelta(seconds=1)), 2)
+        changes = self.feed()['changes']
+        self.assertEqual([(change['id'], change['data']['quantity']) for change in changes], [(emma.pk, 1), (dune.pk, 4)])
+
+    @skipUnless(connection.vendor == 'postgresql', 'ids only commit out of order on PostgreSQL')
+    def test_recent_entries_are_held_back_on_postgresql(self):
+        _book('Dune')
+        with override_settings(CATALOG_CHANGES_SETTLE_SECONDS=60):
+            self.assertEqual(self.feed()['changes'], [])
+        self.assertEqual(len(self.feed()['changes']), 1)
+
+
+class BookAdminActionTests(TestCase):
+    """Two copies of one title, one reader holding both and another holding the first"""
+
+    def setUp(self):
+        self.first, self.second = _book('Dune', quantity=0), _book('Dune', quantity=0)
+        self.both, self.one = _user('both'), _user('one')
+        now = timezone.now()
+
+        def entry(book, days):
+            start = now - timezone.timedelta(days=days)
+            return {'id': book.pk, 'title': book.title, 'start_date': start.isoformat(),
+                    'end_date': (start + timezone.timedelta(days=14)).isoformat()}
+
+        self.both.books = [entry(self.first, 2), entry(self.second, 1)]
+        self.both.save()
+        self.one.books = [entry(self.first, 3)]
+        self.one.save()
+        self.admin = BookAdmin(Book, admin.site)
+        self.admin.message_user = mock.Mock()
+        self.selected = Book.objects.filter(pk__in=[self.first.pk, self.second.pk])
+
+    def assert_loans_closed(self):
+        self.assertFalse(Loan.objects.filter(returned_at__isnull=True).exists())
+        self.assertEqual(Loan.objects.count(), 3)
+        for user in (self.both, self.one):
+            user.refresh_from_db()
+            self.assertEqual(user.books, [])
+
+    def test_mark_as_lost_fines_every_copy(self):
+        with self.assertNumQueries(12):
+            self.admin.mark_as_lost(None, self.selected)
+        fines = Fine.objects.order_by('user_id', 'book_id')
+        self.assertEqual([(fine.user_id, fine.book_id, fine.amount) for fine in fines], [
+            (self.both.pk, self.first.pk, 50), (self.both.pk, self.second.pk, 50), (self.one.pk, self.first.pk, 50),
+        ])
+        self.assert_loans_closed()
+        self.assertEqual(len(self.both.notifications), 2)
+        self.assertEqual(list(self.selected.values_list('quantity', flat=True)), [0, 0])
+
+    def test_return_restocks_and_notifies_per_copy(self):
+        with self.assertNumQueries(13):
+            self.admin.return_book_action(None, self.selected)
+        notifications = MobileNotification.objects.all()
+        self.assertEqual(len(notifications), 3)
+        self.assertEqual(len({notification.bima_id for notification in notifications}), 3)
+        self.assertTrue(all(notification.bima_id.startswith('BIMA-') for notification in notifications))
+        self.assertTrue(all(notification.expires_at > timezone.now() for notification in notifications))
+        self.assert_loans_closed()
+        self.assertEqual(list(self.selected.order_by('pk').values_list('quantity', flat=True)), [2, 1])
+        self.admin.message_user.assert_called_once_with(None, 'Successfully returned 3 books from users.')
+
+
+
+
+class StatusViewTests(TestCase):
+    def setUp(self):
+        self.client.force_login(_user('librarian', is_librarian=True))
+        self.now = timezone.now()
+
+    def lend(self, title, **due):
+        book = _book(title, quantity=0)
+        user = _user(f'reader{CustomUser.objects.count()}')
+        user.books = [{'id': book.pk, 'title': title, 'start_date': (self.now - timezone.timedelta(days=10)).isoformat(),
+                       'end_date': (self.now + timezone.timedelta(**due)).isoformat()}]
+        user.save()
+        return user
+
+    def status(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('status_view'))
+        return response, len(queries)
+
+    def test_counts_come_from_loan_rows(self):
+        self.lend('Late', days=-3)
+        self.lend('Current', days=4)
+        returned = self.lend('Returned', days=4)
+        returned.books = []
+        returned.save()
+        _book('On shelf')
+        Fine.objects.create(user=returned, book_title='Late', due_date=self.now, status='PENDING')
+
+        response, _ = self.status()
+        self.assertEqual(
+            {name: response.context[name] for name in (
+                'total_books', 'available_books', 'borrowed_books', 'returned_books', 'overdue_books', 'lost_books')},
+            {'total_books': 4, 'available_books': 1, 'borrowed_books': 2, 'returned_books': 1,
+             'overdue_books': 1, 'lost_books': 1},
+        )
+        self.assertEqual([(loan.title, loan.is_overdue) for loan in response.context['page_obj']],
+                         [('Late', True), ('Current', False)])
+        self.assertIsNotNone(Loan.objects.get(title='Returned').returned_at)
+
+    def test_query_count_does_not_grow_with_active_loans(self):
+        self.lend('First', days=1)
+        _, queries = self.status()
+        for index in range(5):
+            self.lend(f'Book {index}', days=-index)
+        response, more_queries = self.status()
+        self.assertEqual(len(response.context['page_obj']), 6)
+        self.assertEqual(more_queries, queries)
+        self.assertContains(response, 'reader6')
+
+
+class AdminChangelistTests(TestCase):
+    """Annotated columns, and query counts that stay flat as the page fills up"""
+
+    def setUp(self):
+        self.client.force_login(_user('admin', is_staff=True, is_superuser=True))
+
+    def add_rows(self, count):
+        for _ in range(count):
+            index = CustomUser.objects.count()
+            user = _user(f'reader{index}')
+            book = _book(f'Title {index}')
+            for amount, status in ((50, 'pending'), (25, 'pending'), (10, 'paid')):
+                Fine.objects.create(user=user, book_title=book.title, book_id=book.pk, amount=amount,
+                                    due_date=timezone.now(), status=status)
+
+    def changelist(self, model_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:libapp_{model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_counts_do_not_grow_with_the_rows_shown(self):
+        self.add_rows(2)
+        counts = {name: self.changelist(name)[1] for name in ('customuser', 'book', 'fine')}
+        self.add_rows(6)
+        self.assertEqual({name: self.changelist(name)[1] for name in counts}, counts)
+
+    def test_annotated_columns(self):
+        self.add_rows(1)
+        user = CustomUser.objects.get(username='reader1')
+        response, _ = self.changelist('customuser')
+        row = next(row for row in response.context['cl'].result_list if row.pk == user.pk)
+        self.assertEqual((row.pending_fines_count, row.pending_fines_total), (2, 75))
+        self.assertContains(response, '>₹75')
+
+        response, _ = self.changelist('book')
+        self.assertEqual([row.lost_count for row in response.context['cl'].result_list], [2])
+        self.assertContains(response, '2 lost')
+
+        response, _ = self.changelist('fine')
+        stats = response.context['fine_stats']
+        self.assertEqual(
+            (stats['total_count'], stats['pending_count'], stats['paid_count'], stats['pending_fines']),
+            (3, 2, 1, 75),
+        )
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_apply_only_to_the_production_profile(self):
+        with override_settings(SQLITE_PROFILE='default'):
+            self.assertEqual(profile_pragmas(), {})
+        with override_settings(SQLITE_PROFILE='production', SQLITE_PRAGMAS={'synchronous': 'NORMAL'}):
+            self.assertEqual(profile_pragmas(), {'synchronous': 'NORMAL'})
+
+    def test_production_is_the_default_profile_without_debug(self):
+        names = ['SQLITE_PROFILE', 'DB_CONN_MAX_AGE']
+        self.assertEqual(_settings_in_subprocess(names, env={'DEBUG': 'False'}),
+                         {'SQLITE_PROFILE': 'production', 'DB_CONN_MAX_AGE': 60})
+        self.assertEqual(_settings_in_subprocess(names, env={'DEBUG': 'True'}),
+                         {'SQLITE_PROFILE': 'default', 'DB_CONN_MAX_AGE': 0})
+
+    def test_new_file_connections_get_the_production_pragmas(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'tuned.sqlite3'),
+        }})
+        self.addCleanup(handler.close_all)
+        with override_settings(SQLITE_PROFILE='production'):
+            with handler['default'].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+
+
+def _settings_in_subprocess(names, env=None, blocked=()):
+    """Import library.settings in a fresh interpreter and return the named settings, or its error"""
+    probe = (
+        'import json, sys\n'
+        'for name in sys.argv[2:]: sys.modules[name] = None\n'
+        'try:\n'
+        '    import library.settings as s\n'
+        'except Exception as e:\n'
+        '    print(json.dumps({"error": f"{type(e).__name__}: {e}"})); sys.exit()\n'
+        'print(json.dumps({name: getattr(s, name) for name in sys.argv[1].split(",")}))'
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', probe, ','.join(names), *blocked],
+        capture_output=True, text=True, cwd=settings.BASE_DIR, env=dict(os.environ, **(env or {})),
+    )
+    if result.returncode:
+        raise AssertionError(result.stderr)
+    return json.loads(result.stdout)
+
+
+class CacheTierSettingsTests(SimpleTestCase):
+    def test_backend_follows_cache_backend(self):
+        for tier, backend in (
+            ('locmem', 'django.core.cache.backends.locmem.LocMemCache'),
+            ('file', 'django.core.cache.backends.filebased.FileBasedCache'),
+            ('redis', 'django.core.cache.backends.redis.RedisCache'),
+        ):
+            caches_setting = _settings_in_subprocess(
+                ['CACHES'], env={'CACHE_BACKEND': tier, 'REDIS_URL': 'redis://cache.test:6379/2'},
+            )['CACHES']
+            self.assertEqual(caches_setting['default']['BACKEND'], backend)
+        self.assertEqual(caches_setting['default']['LOCATION'], 'redis://cache.test:6379/2')
+
+    def test_redis_tier_without_the_package_is_a_configuration_error(self):
+        result = _settings_in_subprocess(['CACHES'], env={'CACHE_BACKEND': 'redis'}, blocked=['redis'])
+        self.assertEqual(
+            result['error'], 'ImproperlyConfigured: CACHE_BACKEND=redis needs the redis package (pip install redis)',
+        )
+
+
+class StartupImportTests(SimpleTestCase):
+    heavy_modules = ('PIL', 'qrcode', 'reportlab', 'pypdf', 'libapp.email_service')
+
+    def test_urlconf_does_not_import_heavy_modules(self):
+        # A fresh interpreter, since the test run itself has imported everything by now
+        probe = (
+            'import json, sys, django; django.setup(); import library.urls; '
+            'print(json.dumps([name for name in sys.argv[1:] if name in sys.modules]))'
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='library.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', probe, *self.heavy_modules],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout), [])
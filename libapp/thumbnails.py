@@ -0,0 +1,202 @@
+"""
+Cover Thumbnails for ReadOps Library Management System
+Builds WebP and JPEG variants of cover images at fixed widths, stored next to the originals
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .cache_service import get_namespace
+from .file_utils import atomic_write
+
+# Card grids render covers around 300px wide; 160 covers cart rows, 640 covers 2x screens
+THUMBNAIL_WIDTHS = (160, 320, 640)
+# (extension, Pillow format, MIME type), preferred format first
+THUMBNAIL_FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+THUMBNAIL_QUALITY = 80
+MANIFEST_SUFFIX = '.thumbs.json'
+MANIFEST_CACHE_TIMEOUT = 60 * 60 * 24
+MISSING_CACHE_TIMEOUT = 60
+
+manifest_cache = get_namespace('thumbnails', timeout=MANIFEST_CACHE_TIMEOUT)
+
+
+def manifest_name(name):
+    return os.path.splitext(name)[0] + MANIFEST_SUFFIX
+
+
+def variant_name(name, digest, width, extension):
+    """book_covers/dune.jpg -> book_covers/dune.<digest>.320w.webp"""
+    return f'{os.path.splitext(name)[0]}.{digest}.{width}w.{extension}'
+
+
+def _read_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def build_variants(media_root, name, force=False):
+    """
+    Render every width/format variant of one image and write its manifest.
+    Takes media_root explicitly rather than reading settings, because
+    generate_all calls it from ProcessPoolExecutor workers.
+    Variants are named by a hash of the original's bytes, so an unchanged
+    image is skipped and a replaced one never collides with stale files.
+    """
+    from PIL import Image, ImageOps
+
+    source_path = os.path.join(media_root, name)
+    with open(source_path, 'rb') as source_file:
+        data = source_file.read()
+    digest = hashlib.sha1(data).hexdigest()[:12]
+
+    manifest_path = os.path.join(media_root, manifest_name(name))
+    previous = _read_manifest(manifest_path)
+    if previous and previous.get('digest') == digest and not force:
+        return previous
+
+    image = Image.open(BytesIO(data))
+    largest = max(THUMBNAIL_WIDTHS)
+    if image.format == 'JPEG' and image.width > largest * 2:
+        # Let the JPEG decoder downscale by a power of two instead of decoding full size
+        image.draft('RGB', (largest, round(image.height * largest / image.width)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    if image.mode == 'RGBA':
+        # JPEG has no alpha channel; flatten onto white like the page background
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    original_width, original_height = image.size
+    widths = [width for width in THUMBNAIL_WIDTHS if width < original_width] or [original_width]
+
+    variants = {extension: [] for extension, _, _ in THUMBNAIL_FORMATS}
+    for width in widths:
+        height = max(1, round(original_height * width / original_width))
+        if width == original_width:
+            resized = image
+        else:
+            resized = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for extension, pil_format, _ in THUMBNAIL_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, quality=THUMBNAIL_QUALITY, optimize=True)
+            output_name = variant_name(name, digest, width, extension)
+            atomic_write(os.path.join(media_root, output_name), buffer.getvalue())
+            variants[extension].append([width, output_name])
+
+    # Remove variants of a previous version of the same file
+    if previous and previous.get('digest') != digest:
+        for entries in previous.get('variants', {}).values():
+            for _, old_name in entries:
+                try:
+                    os.remove(os.path.join(media_root, old_name))
+                except FileNotFoundError:
+                    pass
+
+    manifest = {
+        'source': name,
+        'digest': digest,
+        'width': original_width,
+        'height': original_height,
+        'variants': variants,
+    }
+    atomic_write(manifest_path, json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+
+def _build_for_pool(job):
+    media_root, name, force = job
+    try:
+        return name, build_variants(media_root, name, force), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+class ThumbnailService:
+    """
+    Generates and looks up responsive cover variants.
+    Templates only need the manifest, which is cached so rendering a grid
+    of covers does not touch the disk once per image.
+    """
+
+    @property
+    def media_root(self):
+        return settings.MEDIA_ROOT
+
+    def has_source(self, name):
+        return bool(name) and os.path.isfile(os.path.join(self.media_root, name))
+
+    def get_manifest(self, name):
+        if not name:
+            return None
+        manifest = manifest_cache.get('manifest', name)
+        if manifest is None:
+            manifest = _read_manifest(os.path.join(self.media_root, manifest_name(name))) or {}
+            manifest_cache.set(
+                'manifest', name, value=manifest,
+                timeout=MANIFEST_CACHE_TIMEOUT if manifest else MISSING_CACHE_TIMEOUT,
+            )
+        return manifest or None
+
+    def generate(self, name, force=False):
+        manifest = build_variants(self.media_root, name, force)
+        manifest_cache.set('manifest', name, value=manifest)
+        return manifest
+
+    def generate_in_background(self, name):
+        """Build variants for a fresh upload once the saving transaction commits"""
+        def run():
+            try:
+                self.generate(name)
+            except Exception as e:
+                print(f"Error generating thumbnails for {name}: {str(e)}")
+
+        transaction.on_commit(lambda: threading.Thread(target=run, daemon=True).start())
+
+    def generate_all(self, names, workers=None, force=False, progress=None):
+        """
+        Render variants for many images in a process pool.
+        Returns (generated, errors).
+        """
+        jobs = [(self.media_root, name, force) for name in names if self.has_source(name)]
+        generated = 0
+        errors = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for name, manifest, error in executor.map(_build_for_pool, jobs, chunksize=8):
+                if error:
+                    errors.append((name, error))
+                else:
+                    manifest_cache.set('manifest', name, value=manifest)
+                    generated += 1
+                if progress:
+                    progress(name, error)
+        return generated, errors
+
+    def srcset(self, name, extension):
+        manifest = self.get_manifest(name)
+        if not manifest:
+            return ''
+        return ', '.join(
+            f'{default_storage.url(variant)} {width}w'
+            for width, variant in manifest['variants'].get(extension, [])
+        )
+
+
+# Create a global instance
+thumbnail_service = ThumbnailService()
@@ -1,8 +1,34 @@
-from django.urls import path
-from .views import *
-from .advanced_views import *
-from .digital_views import *
-from .qr_views import *
+from django.urls import path, re_path
+from .views import (
+    home, explore, explore_view, free_books_suggestions, book_request_view, get_subjects_view,
+    get_books_view, login_view, register, signup, update_user, login_user, logout_view,
+    user_dashboard, return_book_view, aboutus_view, login_librarian, update_book_details,
+    save_book_details, render_add_new_book_page, save_new_book, import_books_view,
+    librarian_dashboard, dashboard_books_api, dashboard_users_api, dashboard_user_loans_api,
+    remind_user, status_view, report_lost_book, payment_view, pay_fine, pay_lost_book, add_fine,
+    payment_receipt, view_payments, view_payment, generate_barcode, add_to_cart,
+    remove_from_cart, cart_view, checkout_cart, extend_book, ai_recommendations, ai_search,
+    mobile_notification, respond_notification, create_book_borrow_notification,
+    create_book_return_notification, my_notifications, test_sms, test_email,
+)
+from .advanced_views import (
+    analytics_dashboard, smart_recommendations, inventory_management, user_behavior_analysis,
+    advanced_search, similar_books, notification_management, reading_insights, book_analytics,
+    export_user_data, bulk_operations, bulk_operations_ldashboard_redirect,
+)
+from .digital_views import (
+    digital_library, digital_book_detail, create_payment_request, payment_qr, verify_payment,
+    confirm_payment, online_reader, online_reader_file, reader_page, reader_page_image,
+    download_book, my_digital_books, add_digital_book,
+)
+from .qr_views import (
+    generate_user_qr, qr_image, qr_scanner, scan_qr_code, qr_tracking_dashboard,
+    export_scan_data, user_scan_history,
+)
+from .api_views import (
+    books_api, book_detail_api, digital_books_api, digital_book_detail_api, availability_api, loans_api,
+    catalog_changes_api,
+)
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -30,7 +56,11 @@ urlpatterns = [
     path('save_book_details/<int:book_pk>/', save_book_details, name='save_book_details'),
     path('add_book/', render_add_new_book_page, name='add_new_book'),
     path('save_book/', save_new_book, name='save_new_book'),
+    path('books/import/', import_books_view, name='import_books'),
     path('ldashboard/', librarian_dashboard, name='librarian_dashboard'),
+    path('ldashboard/books/', dashboard_books_api, name='dashboard_books_api'),
+    path('ldashboard/users/', dashboard_users_api, name='dashboard_users_api'),
+    path('ldashboard/users/<int:user_id>/loans/', dashboard_user_loans_api, name='dashboard_user_loans_api'),
     path('remind_user/', remind_user, name='remind_user'),
     path('status/', status_view, name='status_view'),
     path('report_lost/<int:book_id>/', report_lost_book, name='report_lost'),
@@ -80,14 +110,26 @@ urlpatterns = [
     path('verify-payment/<int:payment_id>/', verify_payment, name='verify_payment'),
     path('confirm-payment/<int:payment_id>/', confirm_payment, name='confirm_payment'),
     path('online-reader/<int:book_id>/', online_reader, name='online_reader'),
+    path('online-reader/<int:book_id>/file/', online_reader_file, name='online_reader_file'),
+    path('online-reader/<int:book_id>/page/<int:page_number>/', reader_page, name='reader_page'),
+    path('online-reader/<int:book_id>/page/<int:page_number>/image/', reader_page_image, name='reader_page_image'),
     path('download-book/<int:book_id>/', download_book, name='download_book'),
     path('my-digital-books/', my_digital_books, name='my_digital_books'),
     path('add-digital-book/', add_digital_book, name='add_digital_book'),
     # QR Code functionality
     path('my-qr-code/', generate_user_qr, name='generate_user_qr'),
+    re_path(r'^qr/(?P<digest>[0-9a-f]{64})\.png$', qr_image, name='qr_image'),
     path('qr-scanner/', qr_scanner, name='qr_scanner'),
     path('scan-qr-code/', scan_qr_code, name='scan_qr_code'),
     path('qr-tracking/', qr_tracking_dashboard, name='qr_tracking_dashboard'),
     path('export-scan-data/', export_scan_data, name='export_scan_data'),
     path('user-scan-history/<int:user_id>/', user_scan_history, name='user_scan_history'),
+    # Read API for mobile and kiosk clients
+    path('api/v1/books/', books_api, name='api_books'),
+    path('api/v1/books/<int:book_id>/', book_detail_api, name='api_book_detail'),
+    path('api/v1/digital-books/', digital_books_api, name='api_digital_books'),
+    path('api/v1/digital-books/<int:book_id>/', digital_book_detail_api, name='api_digital_book_detail'),
+    path('api/v1/availability/', availability_api, name='api_availability'),
+    path('api/v1/loans/', loans_api, name='api_loans'),
+    path('api/v1/catalog/changes/', catalog_changes_api, name='api_catalog_changes'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.shortcuts import redirect, render, get_object_or_404
 from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed
+from django.core.paginator import Paginator
 from decimal import Decimal
 from .models import Book
 from .forms import BookRequestForm
@@ -9,13 +10,22 @@ from .forms import UserUpdateForm
 from django.contrib import messages
 from django.contrib.auth import authenticate,login as auth_login,logout as auth_logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db.models import BooleanField, Count, Exists, ExpressionWrapper, OuterRef, Q
 from django.utils import timezone
-from .models import CustomUser, Fine, Payment, MobileNotification
-from .email_service import email_service
+from .models import CustomUser, Fine, Loan, Payment, MobileNotification
 from django.contrib.auth.decorators import user_passes_test
 from django.urls import reverse
-from .decorators import check_fine_access, require_no_excessive_fines
+from .decorators import async_login_required, check_fine_access, require_no_excessive_fines
+from .book_import import CoverSource, import_books, iter_book_rows
+from .response_cache import cache_catalog_page, normalize_query
+from .fragment_cache import cached_value
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from importlib import import_module
+
+# The templated email module is only needed by the few views that send mail
+email_service = SimpleLazyObject(lambda: import_module('libapp.email_service').email_service)
 
 
 # Create your views here.
@@ -45,61 +55,61 @@ def home(request):
     
     return render(request, 'libapp/home.html', context)
     
+def _overdue_cutoff():
+    """
+    Start of the local day: the librarian dashboard counts a loan as overdue once its due day has passed,
+    so the cached user list and the per-user loan detail agree until midnight
+    """
+    return timezone.make_aware(timezone.datetime.combine(timezone.localdate(), timezone.datetime.min.time()))
+
+def _with_overdue_flag(loans, now):
+    return loans.annotate(
+        is_overdue=ExpressionWrapper(Q(returned_at__isnull=True, end_date__lt=now), output_field=BooleanField())
+    )
+
+STATUS_PAGE_SIZE = 25
+
 @login_required
 @user_passes_test(lambda u: u.is_librarian)
 def status_view(request):
-    # Get all books in the system
-    all_books = Book.objects.all()
-    
-    # Get statistics
-    total_books = all_books.count()
-    available_books = all_books.filter(quantity__gt=0).count()
-    borrowed_books = 0
-    returned_books = 0
-    
-    # Count lost books (books with quantity = 0 and have associated fines)
-    lost_books = 0
+    now = timezone.now()
+    book_stats = Book.objects.aggregate(
+        total_books=Count('id'),
+        available_books=Count('id', filter=Q(quantity__gt=0)),
+    )
+    loan_stats = Loan.objects.aggregate(
+        borrowed_books=Count('id', filter=Q(returned_at__isnull=True)),
+        returned_books=Count('id', filter=Q(returned_at__isnull=False)),
+        overdue_books=Count('id', filter=Q(returned_at__isnull=True, end_date__lt=now)),
+    )
     # Fine.status choices use 'PENDING' uppercase; use matching value
-    lost_books_fines = Fine.objects.filter(status='PENDING').values('book_title').distinct()
-    lost_books = len(lost_books_fines)
-    
-    # Count borrowed books
-    users_with_books = CustomUser.objects.filter(books__isnull=False)
-    
-    # Process user book data to include return status
-    for user in users_with_books:
-        for book in user.books:
-            # Calculate if the book is overdue
-            end_date_str = book.get('end_date')
-            if end_date_str:
-                end_date = timezone.datetime.fromisoformat(end_date_str)
-                current_date = timezone.now()
-                
-                # Check if book is returned
-                if book.get('is_returned', False):
-                    returned_books += 1
-                    book['is_returned'] = True
-                    book['is_overdue'] = False
-                else:
-                    borrowed_books += 1
-                    book['is_returned'] = False
-                    book['is_overdue'] = end_date < current_date
-    
+    lost_books = Fine.objects.filter(status='PENDING').values('book_title').distinct().count()
+
+    active_loans = _with_overdue_flag(
+        Loan.objects.filter(returned_at__isnull=True)
+        .select_related('user')
+        .only('title', 'start_date', 'end_date', 'user__username', 'user__email')
+        .order_by('end_date', 'pk'),
+        now,
+    )
+    page_obj = Paginator(active_loans, STATUS_PAGE_SIZE).get_page(request.GET.get('page'))
+
     context = {
-        'total_books': total_books,
-        'available_books': available_books,
-        'borrowed_books': borrowed_books,
-        'returned_books': returned_books,
+        **book_stats,
+        **loan_stats,
         'lost_books': lost_books,
-        'users_with_books': users_with_books,
+        'page_obj': page_obj,
     }
     
     return render(request, 'libapp/status.html', context)
 
-def explore(request):
+@cache_catalog_page
+async def explore(request):
+    # Async so a search with no local results can wait on the free-book platforms without holding a thread
     search_query = request.GET.get('q')
     books = Book.objects.all()
     free_books_suggestions = None
+    has_books = True
     
     if search_query:
         books = books.filter(
@@ -107,19 +117,20 @@ def explore(request):
             Q(author__icontains=search_query) |
             Q(subject__icontains=search_query)
         )
+        has_books = await books.aexists()
         
         # If no books found, suggest free alternatives
-        if not books.exists():
+        if not has_books:
             from .free_books_service import free_books_service
-            free_books_suggestions = free_books_service.get_platform_suggestions(search_query)
+            free_books_suggestions = await free_books_service.aget_platform_suggestions(search_query)
     
     context = {
         'books': books,
         'search_query': search_query,
         'free_books_suggestions': free_books_suggestions,
-        'no_results': not books.exists() and search_query
+        'no_results': not has_books and search_query
     }
-    return render(request, 'libapp/explore.html', context)
+    return await sync_to_async(render)(request, 'libapp/explore.html', context)
 
 def explore_view(request):
     form = BookFilterForm(request.GET)
@@ -204,10 +215,12 @@ def return_book_view(request):
 
     return redirect('user_dashboard')
 
+@cache_catalog_page(personal=False)
 def get_subjects_view(request):
     subjects = Book.objects.values_list('subject', flat=True).distinct()
     return JsonResponse(list(subjects), safe=False)
 
+@cache_catalog_page(personal=False)
 def get_books_view(request):
     subject = request.GET.get('subject')
     if subject:
@@ -216,6 +229,7 @@ def get_books_view(request):
         return JsonResponse(books_data, safe=False)
     return JsonResponse([], safe=False)
 
+@cache_catalog_page
 def aboutus_view(request):
     return render(request, 'libapp/aboutus.html')
 
@@ -267,12 +281,148 @@ def save_new_book(request):
     
     return redirect('add_new_book')
 
+@login_required
+@user_passes_test(lambda u: u.is_librarian)
+def import_books_view(request):
+    """
+    Bulk import physical books from an uploaded CSV/XLSX sheet (plus optional covers ZIP).
+    Covers come from the ZIP or existing media files; URLs are left to the import_books command.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    sheet = request.FILES.get('file')
+    if not sheet:
+        return JsonResponse({'status': 'error', 'message': 'Please choose a CSV or XLSX file.'}, status=400)
+
+    try:
+        covers = CoverSource(directory=settings.MEDIA_ROOT, archive=request.FILES.get('covers'))
+    except Exception:
+        return JsonResponse({'status': 'error', 'message': 'The covers file is not a valid ZIP archive.'}, status=400)
+
+    try:
+        report = import_books(iter_book_rows(sheet.file, sheet.name), covers=covers)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    finally:
+        covers.close()
+
+    return JsonResponse({'status': 'success', **report.as_dict()})
+
+DASHBOARD_PAGE_SIZE = 25
+DASHBOARD_MAX_PAGE_SIZE = 100
+DASHBOARD_BOOK_SORTS = ('title', 'author', 'subject', 'department', 'quantity')
+DASHBOARD_USER_SORTS = ('username', 'email', 'date_joined')
+
 @login_required
 @user_passes_test(lambda u: u.is_librarian)
 def librarian_dashboard(request):
-    books = Book.objects.all()
-    users = CustomUser.objects.filter(is_librarian=False)
-    return render(request, 'libapp/librarian_dashboard.html', {'books': books, 'users': users})
+    # Tables are filled page by page from the JSON endpoints below, so this render stays constant-time
+    return render(request, 'libapp/librarian_dashboard.html', {
+        'librarian': request.user,
+        'book_sorts': DASHBOARD_BOOK_SORTS,
+        'user_sorts': DASHBOARD_USER_SORTS,
+        'page_size': DASHBOARD_PAGE_SIZE,
+    })
+
+def _dashboard_page(request, queryset, sorts, default_sort):
+    """Apply ?sort= and ?page=/?page_size= to a queryset; returns (page, sort)"""
+    sort = request.GET.get('sort', default_sort)
+    if sort.lstrip('-') not in sorts:
+        sort = default_sort
+    try:
+        page_size = min(max(int(request.GET.get('page_size', DASHBOARD_PAGE_SIZE)), 1), DASHBOARD_MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = DASHBOARD_PAGE_SIZE
+    # pk breaks ties so rows never repeat or vanish between pages
+    paginator = Paginator(queryset.order_by(sort, 'pk'), page_size)
+    return paginator.get_page(request.GET.get('page')), sort
+
+def _page_payload(page, sort, results):
+    return {
+        'results': results,
+        'page': page.number,
+        'num_pages': page.paginator.num_pages,
+        'count': page.paginator.count,
+        'sort': sort,
+        'has_next': page.has_next(),
+        'has_previous': page.has_previous(),
+    }
+
+@login_required
+@user_passes_test(lambda u: u.is_librarian)
+def dashboard_books_api(request):
+    """GET ?q=&subject=&department=&available=1|0&sort=&page=&page_size="""
+    def compute():
+        books = Book.objects.all()
+        q = request.GET.get('q', '').strip()
+        if q:
+            books = books.filter(Q(title__icontains=q) | Q(author__icontains=q) | Q(subject__icontains=q))
+        if request.GET.get('subject'):
+            books = books.filter(subject=request.GET['subject'])
+        if request.GET.get('department'):
+            books = books.filter(department=request.GET['department'])
+        available = request.GET.get('available')
+        if available == '1':
+            books = books.filter(quantity__gt=0)
+        elif available == '0':
+            books = books.filter(quantity=0)
+
+        books = books.values('id', 'title', 'author', 'subject', 'department', 'quantity')
+        page, sort = _dashboard_page(request, books, DASHBOARD_BOOK_SORTS, 'title')
+        return _page_payload(page, sort, list(page.object_list))
+
+    return JsonResponse(cached_value('dashboard_books', [Book], compute, vary=[normalize_query(request.GET)]))
+
+@login_required
+@user_passes_test(lambda u: u.is_librarian)
+def dashboard_users_api(request):
+    """GET ?q=&has_loans=1&sort=&page=&page_size=; loan detail is fetched per user on demand"""
+    cutoff = _overdue_cutoff()
+
+    def compute():
+        users = CustomUser.objects.filter(is_librarian=False)
+        q = request.GET.get('q', '').strip()
+        if q:
+            users = users.filter(
+                Q(username__icontains=q) | Q(email__icontains=q) |
+                Q(first_name__icontains=q) | Q(last_name__icontains=q) | Q(phone__icontains=q)
+            )
+        if request.GET.get('has_loans') == '1':
+            users = users.filter(Exists(Loan.objects.filter(user=OuterRef('pk'), returned_at__isnull=True)))
+
+        active = Q(loan_records__returned_at__isnull=True)
+        users = users.values('id', 'username', 'email', 'phone').annotate(
+            loans=Count('loan_records', filter=active),
+            overdue=Count('loan_records', filter=active & Q(loan_records__end_date__lt=cutoff)),
+        )
+        page, sort = _dashboard_page(request, users, DASHBOARD_USER_SORTS, 'username')
+        rows = list(page.object_list)
+        return _page_payload(page, sort, rows)
+
+    # Loan rows only change through their user's save (Loan.sync_for_user), which bumps CustomUser
+    return JsonResponse(cached_value(
+        'dashboard_users', [CustomUser], compute, vary=[normalize_query(request.GET), cutoff.isoformat()],
+    ))
+
+@login_required
+@user_passes_test(lambda u: u.is_librarian)
+def dashboard_user_loans_api(request, user_id):
+    user = get_object_or_404(CustomUser.objects.only('id', 'username'), pk=user_id)
+    loans = [
+        {
+            'id': loan['book_id'],
+            'title': loan['title'],
+            'start_date': timezone.localtime(loan['start_date']).date().isoformat(),
+            'end_date': timezone.localtime(loan['end_date']).date().isoformat(),
+            'is_returned': False,
+            'is_overdue': loan['is_overdue'],
+        }
+        for loan in _with_overdue_flag(
+            Loan.objects.filter(user=user, returned_at__isnull=True).order_by('end_date'), _overdue_cutoff()
+        ).values('book_id', 'title', 'start_date', 'end_date', 'is_overdue')
+    ]
+    return JsonResponse({'user_id': user.id, 'username': user.username, 'loans': loans})
 
 @login_required
 @user_passes_test(lambda u: u.is_librarian)
@@ -461,10 +611,11 @@ def ai_recommendations(request):
     recommended_books = Book.objects.all()[:5]  # Placeholder
     return render(request, 'libapp/ai_recommendations.html', {'recommended_books': recommended_books})
 
-@login_required
-def ai_search(request):
+@async_login_required
+async def ai_search(request):
     query = request.GET.get('q', '')
     free_books_suggestions = None
+    has_books = False
     
     if query:
         # AI search logic
@@ -473,23 +624,24 @@ def ai_search(request):
             Q(author__icontains=query) |
             Q(subject__icontains=query)
         )[:10]
+        has_books = await books.aexists()
         
         # If no books found, suggest free alternatives
-        if not books.exists():
+        if not has_books:
             from .free_books_service import free_books_service
-            free_books_suggestions = free_books_service.get_platform_suggestions(query)
+            free_books_suggestions = await free_books_service.aget_platform_suggestions(query)
     else:
         books = Book.objects.none()
     
-    return render(request, 'libapp/explore.html', {
+    return await sync_to_async(render)(request, 'libapp/explore.html', {
         'books': books, 
         'search_query': query,
         'free_books_suggestions': free_books_suggestions,
-        'no_results': not books.exists() and query
+        'no_results': not has_books and query
     })
 
-@login_required
-def free_books_suggestions(request):
+@async_login_required
+async def free_books_suggestions(request):
     """View to show free book suggestions for a specific search"""
     query = request.GET.get('q', '')
     subject = request.GET.get('subject', '')
@@ -500,12 +652,12 @@ def free_books_suggestions(request):
     from .free_books_service import free_books_service
     
     # Get free book suggestions
-    suggestions = free_books_service.get_platform_suggestions(query)
+    suggestions = await free_books_service.aget_platform_suggestions(query)
     
     # Get subject-specific platforms if subject is provided
     subject_platforms = []
     if subject:
-        subject_platforms = free_books_service.get_subject_specific_platforms(subject)
+        subject_platforms = free_books_service.get_subject_specific_platforms(subject, query)
     
     context = {
         'suggestions': suggestions,
@@ -514,7 +666,7 @@ def free_books_suggestions(request):
         'subject': subject
     }
     
-    return render(request, 'libapp/free_books_suggestions.html', context)
+    return await sync_to_async(render)(request, 'libapp/free_books_suggestions.html', context)
 
 @login_required
 def report_lost_book(request, book_id):
@@ -709,15 +861,16 @@ def update_user(request):
     
     return render(request, 'libapp/register.html', {'form': form})
 
-@login_required
-def test_email(request):
+@async_login_required
+async def test_email(request):
     if request.method == 'POST':
-        # Send test email
+        # Send test email; SMTP has no async API, so it runs on a worker thread outside the event loop
         try:
-            email_service.send_registration_email(request.user)
+            user = await sync_to_async(lambda: request.user)()
+            await sync_to_async(email_service.send_registration_email, thread_sensitive=False)(user)
             messages.success(request, 'Test email sent successfully! Check your registered email address.')
         except Exception as e:
             print(f"Email sending failed: {str(e)}")
             messages.error(request, f'Failed to send test email: {str(e)}')
     
-    return render(request, 'libapp/test_email.html')
+    return await sync_to_async(render)(request, 'libapp/test_email.html')
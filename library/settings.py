@@ -24,7 +24,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 AUTH_USER_MODEL='libapp.CustomUser'
 
 ALLOWED_HOSTS = []
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'libapp.db_router.PrimaryPinMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -71,9 +72,55 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'library.wsgi.application'
+ASGI_APPLICATION = 'library.asgi.application'
+
+# Cache tier: 'locmem' (default, per process), 'file' (shared by the processes of one host)
+# or 'redis' (shared across hosts; needs the redis package and REDIS_URL).
+# Signal-driven invalidation (cached pages, dashboard fragments, the API's
+# version counters) only reaches other workers through a shared tier: with
+# locmem, a write served by one worker or made by a management command is
+# invisible to the caches of every other process until their entries expire.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_KEY_PREFIX = config('CACHE_KEY_PREFIX', default='readops')
+
+if CACHE_BACKEND == 'redis':
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured('CACHE_BACKEND=redis needs the redis package (pip install redis)')
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'TIMEOUT': 300,
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'django_cache')),
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'readops-default',
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
 
-# Use DB-backed sessions by default for simplicity and reliability in small projects
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions are read from the cache and written through to the database,
+# so authenticated requests no longer query the session table every time
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 # Set session expiration time (in seconds) to 1 hour
 SESSION_COOKIE_AGE = 3600
 
@@ -89,11 +136,80 @@ LOGIN_URL = '/login'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: 'sqlite' (default) or 'postgres' (needs the psycopg package)
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+# Keep connections open between requests in production; development and the
+# test runner reopen per request unless DB_CONN_MAX_AGE is set
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=0 if DEBUG else 60, cast=int)
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='readops'),
+            'USER': config('DB_USER', default='readops'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='127.0.0.1'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # Behind pgbouncer in transaction pooling mode a named cursor cannot outlive
+    # its transaction, so exports fall back to client-side chunked fetching
+    if config('DB_PGBOUNCER', default=False, cast=bool):
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    # Django's built-in pool needs Django 5.1+; fail loudly rather than ignore the setting on 4.2
+    if config('DB_POOL', default=False, cast=bool):
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured('DB_POOL needs Django 5.1 or later; use DB_PGBOUNCER or persistent connections')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Optional read replica for analytics and export traffic (see libapp/db_router.py):
+# a PostgreSQL standby via DB_REPLICA_HOST, or a second SQLite file via DB_REPLICA_NAME
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+if (DB_ENGINE == 'postgres' and DB_REPLICA_HOST) or (DB_ENGINE != 'postgres' and DB_REPLICA_NAME):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        # Tests run against a single database; the replica alias reuses its connection
+        'TEST': {'MIRROR': 'default'},
     }
+    if DB_ENGINE == 'postgres':
+        DATABASES['replica']['HOST'] = DB_REPLICA_HOST
+        DATABASES['replica']['PORT'] = config('DB_REPLICA_PORT', default=DATABASES['default']['PORT'])
+    else:
+        DATABASES['replica']['NAME'] = DB_REPLICA_NAME
+
+DATABASE_ROUTERS = ['libapp.db_router.ReadReplicaRouter']
+# Seconds a client keeps reading from the primary after its own writes
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# SQLite profile: 'production' applies SQLITE_PRAGMAS to every new connection
+# (see libapp/sqlite_profile.py); 'default' leaves SQLite's own settings alone.
+# Off while DEBUG is on; set SQLITE_PROFILE=production to try it in development
+SQLITE_PROFILE = config('SQLITE_PROFILE', default='default' if DEBUG else 'production')
+SQLITE_PRAGMAS = {
+    # Readers no longer block on writers and vice versa
+    'journal_mode': 'WAL',
+    # Durable at checkpoints; safe with WAL and far fewer fsyncs than FULL
+    'synchronous': 'NORMAL',
+    # Wait for a competing writer instead of failing with "database is locked"
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Negative values are KiB: 64 MiB of page cache per connection
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': 'MEMORY',
 }
 
 
@@ -162,6 +278,18 @@ TEXTLOCAL_SENDER = config('TEXTLOCAL_SENDER', default='ReadOps')
 FAST2SMS_API_KEY = config('FAST2SMS_API_KEY', default='')
 
 
+# Free Books Platform Search
+# Open Library is queried when a search finds nothing locally; point it at a fake server for testing
+OPEN_LIBRARY_SEARCH_URL = config('OPEN_LIBRARY_SEARCH_URL', default='https://openlibrary.org/search.json')
+FREE_BOOKS_SEARCH_DEADLINE = config('FREE_BOOKS_SEARCH_DEADLINE', default=3.0, cast=float)  # seconds for all platforms together
+FREE_BOOKS_FRESH_SECONDS = 60 * 60  # cached results older than this are served stale and refreshed in the background
+
+
+# QR Code Configuration
+# Maximum age in seconds of signed user QR tokens; None keeps member cards valid indefinitely
+QR_TOKEN_MAX_AGE = None
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -177,6 +305,16 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Protected digital book files are streamed by Django after access checks.
+# Set to 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx) to let the web server send the bytes.
+FILE_SERVING_OFFLOAD = config('FILE_SERVING_OFFLOAD', default=None)
+# nginx internal location that aliases MEDIA_ROOT when using x-accel-redirect
+X_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Per-page text and image artifacts extracted by the online reader (page images need pypdfium2).
+# Kept outside MEDIA_ROOT so pages of paid books are only served through the access checks.
+READER_CACHE_DIR = config('READER_CACHE_DIR', default=os.path.join(BASE_DIR, 'reader_cache'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 